@@ -1,6 +1,7 @@
 from weathon.nlp.base.vocab import BaseVocab
 from weathon.nlp.base.tokenizer import BaseTokenizer
 from weathon.nlp.base.dataset import BaseDataset,TokenClassificationDataset
+from weathon.nlp.base.dataset import StreamingDataset, MemmapDataset
 from weathon.nlp.base.model import BaseModel
 from weathon.nlp.base.predictor import BasePredictor
 from weathon.nlp.base.task import BaseTask
@@ -8,12 +8,17 @@
 import json
 import copy
 import codecs
+import pickle
+import random
+import hashlib
+import numpy as np
 import pandas as pd
 from abc import abstractmethod, ABC
 from pathlib import Path
-from typing import Union, List
+from typing import Union, List, Dict, Iterable
 from collections import defaultdict
-from torch.utils.data import Dataset
+from concurrent.futures import ProcessPoolExecutor
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 from pandas.core.frame import DataFrame
 from weathon.utils import FileUtils
 
@@ -49,9 +54,11 @@ class BaseDataset(Dataset):
             if 'label' in data.columns:
                 data.loc[:]['label'] = data.loc[:]['label'].apply(lambda x: str(x))
 
+            self.data_path = None
             self.df = data if is_retain_df else None
             self.dataset = self._convert_to_dataset(data)
         else:
+            self.data_path = data
             self.dataset = self._load_dataset(data)
 
         self.retain_dataset = copy.deepcopy(self.dataset) if is_retain_dataset else None
@@ -123,12 +130,41 @@ class BaseDataset(Dataset):
                 # datasets.append({'text': tokens.strip(), 'label': label})
         return pd.DataFrame(datasets)
 
-    def convert_to_ids(self, tokenizer):
+    def convert_to_ids(self, tokenizer, num_workers: int = 1, cache_dir: Union[str, Path] = None):
         """
         将文本转化成id的形式
         Args:
             tokenizer: 编码器
+            num_workers (:obj:`int`, optional, defaults to 1): 并行处理的进程数，大于1时将数据集切分成num_workers份交由进程池处理
+            cache_dir (:obj:`string` or :obj:`Path`, optional, defaults to None):
+                特征缓存目录，以数据内容、编码器及其配置、max_seq_len和Dataset类型作为缓存key，命中缓存时直接加载特征
         """
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = Path(cache_dir) / f'{self.__class__.__name__}_{self._get_feature_cache_key(tokenizer)}.pkl'
+            if cache_path.exists():
+                with cache_path.open('rb') as f:
+                    cache = pickle.load(f)
+                self._set_converted_attributes(cache['attributes'], tokenizer)
+                self.dataset = cache['features']
+                return
+
+        if num_workers > 1 and len(self.dataset) > num_workers:
+            features, attributes = self._convert_to_ids_parallel(tokenizer, num_workers)
+            self._set_converted_attributes(attributes, tokenizer)
+        else:
+            features, attributes = self._convert_shard(self, tokenizer)
+
+        self.dataset = features
+
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix('.tmp')
+            with tmp_path.open('wb') as f:
+                pickle.dump({'features': features, 'attributes': attributes}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(cache_path)
+
+    def _convert_to_ids(self, tokenizer):
         if tokenizer.tokenizer_type == 'vanilla':
             features = self._convert_to_vanilla_ids(tokenizer)
         elif tokenizer.tokenizer_type == 'transformer':
@@ -138,7 +174,169 @@ class BaseDataset(Dataset):
         else:
             raise ValueError("The tokenizer type does not exist")
 
-        self.dataset = features
+        return features
+
+    # _convert_to_*_ids中会被赋值的属性名，由子类声明，
+    # 并行转化或命中缓存时据此将属性同步到当前dataset上
+    _converted_attributes = ()
+
+    # 影响id化结果的编码器配置项，依次从编码器和词典上读取，作为特征缓存key的一部分
+    _tokenizer_config_fields = (
+        'tokenizer_type',
+        'max_seq_len',
+        'do_lower_case',
+        'additional_special_tokens',
+        'split_token',
+        'additional_special_split_token',
+        'cls_num'
+    )
+
+    @staticmethod
+    def _convert_shard(dataset, tokenizer):
+        """
+        转化成id，同时取出dataset声明的_converted_attributes，属性值为编码器本身时只记录属性名
+
+        Returns:
+            (features, {'values': 属性 -> 属性值, 'tokenizer': 值为编码器的属性名列表})
+        """  # noqa: ignore flake8"
+
+        features = dataset._convert_to_ids(tokenizer)
+
+        attributes = {'values': {}, 'tokenizer': []}
+        for key_ in dataset._converted_attributes:
+            if not hasattr(dataset, key_):
+                continue
+            value_ = getattr(dataset, key_)
+            if value_ is tokenizer:
+                attributes['tokenizer'].append(key_)
+            else:
+                attributes['values'][key_] = value_
+
+        return features, attributes
+
+    def _merge_converted_attribute(self, key, values):
+        """
+        合并各分片中同一属性的值：列表按分片顺序拼接，字典和集合取并集，其他类型的值各分片须相同，
+        需要其他合并方式时由子类重写
+
+        Args:
+            key (:obj:`string`): 属性名
+            values (:obj:`list`): 各分片按顺序的属性值
+        """  # noqa: ignore flake8"
+
+        if isinstance(values[0], list):
+            return [item_ for value_ in values for item_ in value_]
+        if isinstance(values[0], dict):
+            merged = {}
+            for value_ in values:
+                merged.update(value_)
+            return merged
+        if isinstance(values[0], (set, frozenset)):
+            return values[0].union(*values[1:])
+        if any(value_ != values[0] for value_ in values[1:]):
+            raise ValueError(f"converted attribute '{key}' differs between shards, "
+                             f"override _merge_converted_attribute to merge it")
+        return values[0]
+
+    def _merge_converted_attributes(self, shard_attributes):
+        merged = {'values': {}, 'tokenizer': []}
+        for key_ in self._converted_attributes:
+            if any(key_ in attributes_['tokenizer'] for attributes_ in shard_attributes):
+                merged['tokenizer'].append(key_)
+                continue
+            values = [attributes_['values'][key_] for attributes_ in shard_attributes
+                      if key_ in attributes_['values']]
+            if values:
+                merged['values'][key_] = self._merge_converted_attribute(key_, values)
+
+        return merged
+
+    def _set_converted_attributes(self, attributes, tokenizer):
+        for key_, value_ in attributes['values'].items():
+            setattr(self, key_, value_)
+        for key_ in attributes['tokenizer']:
+            setattr(self, key_, tokenizer)
+
+    def _convert_to_ids_parallel(self, tokenizer, num_workers: int):
+        """
+        将数据集按顺序切分成num_workers份，在进程池中分别转化成id后按原顺序拼接
+
+        Args:
+            tokenizer: 编码器
+            num_workers (:obj:`int`): 进程数
+        Returns:
+            (features, 合并各分片后的_converted_attributes)
+        """  # noqa: ignore flake8"
+
+        shard_size = (len(self.dataset) + num_workers - 1) // num_workers
+
+        shards = []
+        for start_ in range(0, len(self.dataset), shard_size):
+            # 浅拷贝后替换dataset，避免将原始DataFrame等大对象传入子进程
+            shard_ = copy.copy(self)
+            shard_.df = None
+            shard_.retain_dataset = None
+            shard_.dataset = self.dataset[start_:start_ + shard_size]
+            shards.append(shard_)
+
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(BaseDataset._convert_shard, shards, [tokenizer] * len(shards)))
+            features = [feature_ for shard_features_, _ in results for feature_ in shard_features_]
+
+        return features, self._merge_converted_attributes([attributes_ for _, attributes_ in results])
+
+    def _get_feature_cache_key(self, tokenizer) -> str:
+        """
+        计算特征缓存的key，由数据文件(或数据内容)的md5、编码器类型及配置和Dataset类型共同决定
+
+        Args:
+            tokenizer: 编码器
+        """  # noqa: ignore flake8"
+
+        md5 = hashlib.md5()
+
+        data_path = Path(self.data_path) if self.data_path is not None else None
+        if data_path is not None and data_path.is_file():
+            with data_path.open('rb') as f:
+                for chunk_ in iter(lambda: f.read(1 << 20), b''):
+                    md5.update(chunk_)
+        else:
+            md5.update(pickle.dumps(self.dataset, protocol=pickle.HIGHEST_PROTOCOL))
+
+        md5.update(repr((
+            tokenizer.__class__.__name__,
+            self._get_tokenizer_config(tokenizer),
+            self.__class__.__module__,
+            self.__class__.__name__,
+            self.categories,
+            self.is_test
+        )).encode('utf-8'))
+
+        return md5.hexdigest()
+
+    def _get_tokenizer_config(self, tokenizer) -> List:
+        """
+        编码器中影响id化结果的配置：词表(含新增token)的md5及_tokenizer_config_fields中列出的配置项
+
+        Args:
+            tokenizer: 编码器
+        """  # noqa: ignore flake8"
+
+        vocab = tokenizer.vocab
+        if hasattr(vocab, 'get_vocab'):
+            token2id = vocab.get_vocab()
+        else:
+            token2id = getattr(vocab, 'token2id', None)
+        vocab_md5 = hashlib.md5(repr(sorted(token2id.items())).encode('utf-8')).hexdigest() if token2id else None
+
+        config = [('vocab', getattr(vocab, 'name_or_path', None) or vocab.__class__.__name__, vocab_md5)]
+        for field_ in self._tokenizer_config_fields:
+            value_ = getattr(tokenizer, field_, getattr(vocab, field_, None))
+            if isinstance(value_, (set, frozenset)):
+                value_ = sorted(value_)
+            config.append((field_, value_))
+
+        return config
 
     def _convert_to_transfomer_ids(self, bert_tokenizer):
         pass
@@ -207,3 +405,331 @@ class TokenClassificationDataset(BaseDataset, ABC):
             })
 
         return dataset
+
+
+class StreamingDataset(IterableDataset):
+    """
+    流式读取jsonl数据的Dataset：按chunk读取数据，借助dataset_class完成id化后逐条返回，内存中只保留一个chunk和打乱缓冲区的数据
+
+    Args:
+        data_path (:obj:`string` or :obj:`Path`): jsonl数据地址
+        dataset_class (:obj:`class`): 用于数据id化的Dataset类，例如BIONERDataset
+        categories (:obj:`list`): 数据类别，流式读取无法预先统计类别，需显式传入
+        tokenizer: 编码器
+        chunk_size (:obj:`int`, optional, defaults to 1024): 每次读取并id化的数据条数
+        shuffle_buffer_size (:obj:`int`, optional, defaults to 0): 打乱缓冲区大小，为0时按文件顺序返回
+        fields (:obj:`list` or :obj:`None`, optional, defaults to None): 需要从json中读取的键，默认读取全部
+        is_test (:obj:`bool`, optional, defaults to False): 数据集是否为测试集数据
+
+    Examples::
+
+        >>> train_data = StreamingDataset('train.jsonl', BIONERDataset, categories, tokenizer, shuffle_buffer_size=10000)
+        >>> MemmapDataset.build(train_data, './train_store')
+    """  # noqa: ignore flake8"
+
+    def __init__(self,
+                 data_path: Union[str, Path],
+                 dataset_class,
+                 categories: List[str],
+                 tokenizer,
+                 chunk_size: int = 1024,
+                 shuffle_buffer_size: int = 0,
+                 fields: List[str] = None,
+                 is_test: bool = False):
+
+        self.data_path = Path(data_path)
+        self.dataset_class = dataset_class
+        self.categories = categories
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.fields = fields
+        self.is_test = is_test
+
+        self.cat2id = dict(zip(self.categories, range(len(self.categories))))
+        self.id2cat = dict(zip(range(len(self.categories)), self.categories))
+        self.class_num = len(self.cat2id)
+
+        self._length = None
+        self._to_device_cols = None
+
+    def _convert_chunk(self, rows: List[Dict]) -> BaseDataset:
+        chunk_dataset = self.dataset_class(pd.DataFrame(rows), categories=self.categories, is_test=self.is_test)
+        chunk_dataset.convert_to_ids(self.tokenizer)
+        return chunk_dataset
+
+    def _iter_rows(self, worker_id: int = 0, num_workers: int = 1):
+        """
+        逐行读取jsonl数据，多个DataLoader worker按行号划分数据，在json解析之前过滤，每行只被一个worker解析；
+        空行跳过，指定fields时缺少任一字段的行被丢弃
+        """  # noqa: ignore flake8"
+
+        fields = set(self.fields) if self.fields else None
+        with self.data_path.open('r', encoding='utf-8') as f:
+            for idx_, line_ in enumerate(f):
+                if idx_ % num_workers != worker_id or not line_.strip():
+                    continue
+                row_ = json.loads(line_)
+                if fields is not None:
+                    row_ = {key_: value_ for key_, value_ in row_.items() if key_ in fields}
+                    if len(row_) < len(fields):
+                        continue
+                yield row_
+
+    def _iter_features(self):
+        worker_info = get_worker_info()
+        worker_id, num_workers = (worker_info.id, worker_info.num_workers) if worker_info else (0, 1)
+
+        rows = []
+        for row_ in self._iter_rows(worker_id, num_workers):
+            rows.append(row_)
+            if len(rows) == self.chunk_size:
+                yield from self._convert_chunk(rows).dataset
+                rows = []
+
+        if rows:
+            yield from self._convert_chunk(rows).dataset
+
+    def __iter__(self):
+        if self.shuffle_buffer_size <= 0:
+            yield from self._iter_features()
+            return
+
+        buffer = []
+        for feature_ in self._iter_features():
+            if len(buffer) < self.shuffle_buffer_size:
+                buffer.append(feature_)
+                continue
+            index_ = random.randrange(self.shuffle_buffer_size)
+            yield buffer[index_]
+            buffer[index_] = feature_
+
+        random.shuffle(buffer)
+        yield from buffer
+
+    @property
+    def to_device_cols(self) -> List[str]:
+        if self._to_device_cols is None:
+            rows = [next(self._iter_rows())]
+            self._to_device_cols = self._convert_chunk(rows).to_device_cols
+        return self._to_device_cols
+
+    def __len__(self):
+        # 与迭代时的过滤规则一致：未指定fields时按非空行计数，仅扫描字节不做json解析，否则需要解析以丢弃缺少字段的行
+        if self._length is None:
+            if self.fields:
+                self._length = sum(1 for _ in self._iter_rows())
+            else:
+                with self.data_path.open('rb') as f:
+                    self._length = sum(1 for line_ in f if line_.strip())
+        return self._length
+
+
+class MemmapDataset(Dataset):
+    """
+    基于内存映射的id化数据集：每个特征列存储为一个按行拼接的数组(整数列为int32，浮点列为float32)和一个int64的行偏移数组，
+    __getitem__通过偏移直接切片内存映射文件，数据不需要全部加载到内存
+
+    一维列的每个元素为一行；二维及以上的列(如GlobalPointer、Biaffine的(type, start, end)实体三元组)
+    第一维长度可变，其余维度(inner_shape)在所有样本中必须一致
+
+    存储目录结构：
+        meta.json: 特征列、需要补齐的列、标量列、各列的数据类型和inner_shape以及max_seq_len等信息
+        {col}.bin: 所有样本该列数据按行首尾拼接而成的数组
+        {col}.offsets.npy: 长度为样本数+1的行偏移数组，第i个样本的数据为bin[offsets[i]:offsets[i+1]]
+
+    Args:
+        store_dir (:obj:`string` or :obj:`Path`): 存储目录，由MemmapDataset.build生成
+        max_seq_len (:obj:`int` or :obj:`None`, optional, defaults to None):
+            序列特征补齐的长度，默认使用构建时的长度；为0时不补齐，直接返回内存映射的切片(零拷贝)
+    """  # noqa: ignore flake8"
+
+    def __init__(self, store_dir: Union[str, Path], max_seq_len: int = None):
+        self.store_dir = Path(store_dir)
+        self.meta = json.loads((self.store_dir / 'meta.json').read_text(encoding='utf-8'))
+
+        self.columns = self.meta['columns']
+        self.seq_columns = set(self.meta['seq_columns'])
+        self.scalar_columns = set(self.meta['scalar_columns'])
+        self.dtypes = self.meta['dtypes']
+        self.inner_shapes = {col_: tuple(shape_) for col_, shape_ in self.meta['inner_shapes'].items()}
+        self.max_seq_len = self.meta['max_seq_len'] if max_seq_len is None else max_seq_len
+
+        self.categories = self.meta.get('categories')
+        if self.categories is not None:
+            self.cat2id = dict(zip(self.categories, range(len(self.categories))))
+            self.id2cat = dict(zip(range(len(self.categories)), self.categories))
+            self.class_num = len(self.cat2id)
+
+        self._arrays = None
+
+    @classmethod
+    def build(cls,
+              features: Iterable[Dict],
+              store_dir: Union[str, Path],
+              columns: List[str] = None,
+              mask_col: str = 'attention_mask',
+              categories: List[str] = None):
+        """
+        将id化后的特征逐条写入存储目录，features可以是BaseDataset、StreamingDataset或任意特征字典的迭代器
+
+        Args:
+            features (:obj:`Iterable`): 特征字典的迭代器
+            store_dir (:obj:`string` or :obj:`Path`): 存储目录
+            columns (:obj:`list` or :obj:`None`, optional, defaults to None): 需要存储的列，默认存储第一条样本中所有的数值列，
+                整数列存储为int32，浮点列存储为float32，无法表示的值(非数值、长度不一的嵌套列表、inner_shape不一致)会抛出ValueError
+            mask_col (:obj:`string`, optional, defaults to 'attention_mask'): 用于确定有效长度的mask列，与其等长的列只存储有效部分
+            categories (:obj:`list` or :obj:`None`, optional, defaults to None): 数据类别，默认从features中获取
+        """  # noqa: ignore flake8"
+
+        store_dir = FileUtils.ensure_dir(store_dir)
+        if categories is None:
+            categories = getattr(features, 'categories', None)
+
+        writers = {}
+        offsets = {}
+        seq_columns = set()
+        scalar_columns = set()
+        # 数据类型和inner_shape由每列第一个非空的值确定，空值不写入数据
+        dtypes = {}
+        inner_shapes = {}
+        max_seq_len = 0
+        try:
+            for feature_ in features:
+                if columns is None:
+                    columns = [col_ for col_, value_ in feature_.items() if cls._is_storable(value_)]
+                if not writers:
+                    for col_ in columns:
+                        writers[col_] = (store_dir / f'{col_}.bin').open('wb')
+                        offsets[col_] = [0]
+                        if np.ndim(feature_[col_]) == 0:
+                            scalar_columns.add(col_)
+
+                seq_len, padded_len = None, None
+                if mask_col in feature_:
+                    mask_ = np.asarray(feature_[mask_col])
+                    seq_len, padded_len = int(np.count_nonzero(mask_)), len(mask_)
+                    max_seq_len = max(max_seq_len, padded_len)
+
+                for col_ in columns:
+                    value_ = cls._as_array(col_, feature_[col_])
+                    if (value_.ndim == 0) != (col_ in scalar_columns):
+                        raise ValueError(f'column {col_} mixes scalar and sequence values')
+
+                    value_ = value_.reshape((1,) if value_.ndim == 0 else value_.shape)
+                    if value_.size == 0:
+                        offsets[col_].append(offsets[col_][-1])
+                        continue
+
+                    if col_ not in dtypes:
+                        dtypes[col_] = cls._storage_dtype(col_, value_)
+                        inner_shapes[col_] = list(value_.shape[1:])
+                    elif cls._storage_dtype(col_, value_) != dtypes[col_] and dtypes[col_] == 'int32':
+                        raise ValueError(f'column {col_} mixes integer and float values')
+                    elif list(value_.shape[1:]) != inner_shapes[col_]:
+                        raise ValueError(f'column {col_} has inconsistent inner shape '
+                                         f'{list(value_.shape[1:])} and {inner_shapes[col_]}')
+
+                    if seq_len is not None and value_.ndim == 1 and len(value_) == padded_len:
+                        value_ = value_[:seq_len]
+                        seq_columns.add(col_)
+                    writers[col_].write(value_.astype(dtypes[col_]).tobytes())
+                    offsets[col_].append(offsets[col_][-1] + len(value_))
+        finally:
+            for writer_ in writers.values():
+                writer_.close()
+
+        for col_, offset_ in offsets.items():
+            np.save(store_dir / f'{col_}.offsets.npy', np.asarray(offset_, dtype=np.int64))
+
+        columns = columns or []
+        meta = {
+            'columns': columns,
+            'seq_columns': sorted(seq_columns),
+            'scalar_columns': sorted(scalar_columns),
+            'dtypes': {col_: dtypes.get(col_, 'int32') for col_ in columns},
+            'inner_shapes': {col_: inner_shapes.get(col_, []) for col_ in columns},
+            'max_seq_len': max_seq_len,
+            'sample_num': len(next(iter(offsets.values()))) - 1 if offsets else 0,
+            'categories': list(categories) if categories is not None else None
+        }
+        (store_dir / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+
+        return cls(store_dir)
+
+    @staticmethod
+    def _is_storable(value) -> bool:
+        try:
+            array = np.asarray(value)
+        except (ValueError, TypeError):
+            return False
+        return np.issubdtype(array.dtype, np.number) or array.dtype == np.bool_
+
+    @staticmethod
+    def _as_array(col, value) -> np.ndarray:
+        try:
+            array = np.asarray(value)
+        except (ValueError, TypeError):
+            raise ValueError(f'column {col} has a value that can not be stored as an array')
+        if array.size and not (np.issubdtype(array.dtype, np.number) or array.dtype == np.bool_):
+            raise ValueError(f'column {col} has unsupported dtype {array.dtype}, only integer and float are supported')
+        return array
+
+    @staticmethod
+    def _storage_dtype(col, array) -> str:
+        if np.issubdtype(array.dtype, np.integer) or array.dtype == np.bool_:
+            return 'int32'
+        if np.issubdtype(array.dtype, np.floating):
+            return 'float32'
+        raise ValueError(f'column {col} has unsupported dtype {array.dtype}, only integer and float are supported')
+
+    def _open(self):
+        # 延迟打开，DataLoader的每个worker进程各自映射文件
+        self._arrays = {}
+        for col_ in self.columns:
+            path_ = self.store_dir / f'{col_}.bin'
+            # 空文件无法建立内存映射
+            values_ = np.memmap(path_, dtype=self.dtypes[col_], mode='r') if path_.stat().st_size \
+                else np.zeros(0, dtype=self.dtypes[col_])
+            self._arrays[col_] = (
+                values_.reshape((-1,) + self.inner_shapes[col_]),
+                np.load(self.store_dir / f'{col_}.offsets.npy', mmap_mode='r')
+            )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __getitem__(self, index):
+        if self._arrays is None:
+            self._open()
+
+        feature = {}
+        for col_, (values_, offsets_) in self._arrays.items():
+            value_ = values_[offsets_[index]:offsets_[index + 1]]
+            dtype_ = np.int64 if self.dtypes[col_] == 'int32' else np.float32
+            if col_ in self.seq_columns and self.max_seq_len:
+                padded_ = np.zeros(self.max_seq_len, dtype=dtype_)
+                padded_[:len(value_)] = value_
+                value_ = padded_
+            elif self.max_seq_len:
+                value_ = value_.astype(dtype_)
+            feature[col_] = value_[0] if col_ in self.scalar_columns else value_
+
+        return feature
+
+    @property
+    def dataset_cols(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def to_device_cols(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def sample_num(self):
+        return self.meta['sample_num']
+
+    def __len__(self):
+        return self.meta['sample_num']
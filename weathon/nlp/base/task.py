@@ -8,12 +8,13 @@
 import time
 import torch
 import warnings
+from functools import partial
 from typing import List
 from numpy import inf
 from abc import abstractmethod
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, IterableDataset
 from torch.utils.data._utils.collate import default_collate
-from weathon.utils import EMA, ScheduleUtils
+from weathon.utils import EMA, ScheduleUtils, DataUtils, LengthBucketBatchSampler
 from weathon.nlp.base.dataset import BaseDataset
 
 
@@ -77,7 +78,9 @@ class BaseTask(object):
             epochs (:obj:`int`, optional, defaults to 1): 训练轮数
             gradient_accumulation_steps (:obj:`int`, optional, defaults to 1): 梯度累计数
             early_stop
-            **kwargs (optional): 其他可选参数
+            **kwargs (optional): 其他可选参数，例如：
+                dynamic_padding (:obj:`bool`, optional, defaults to False): 是否将batch截断到batch内最长的有效长度
+                length_bucketing (:obj:`bool`, optional, defaults to False): 是否按样本长度分桶组batch
         """  # noqa: ignore flake8"
 
         train_generator = self._train_begin(train_data, validation_data, batch_size,epochs=epochs, shuffle=True, **kwargs)
@@ -119,7 +122,9 @@ class BaseTask(object):
         Args:
             validation_data (:obj:`ark_nlp dataset`): 训练的batch文本
             evaluate_batch_size (:obj:`int`, optional, defaults to 32): 验证阶段batch大小
-            **kwargs (optional): 其他可选参数
+            **kwargs (optional): 其他可选参数，例如：
+                dynamic_padding (:obj:`bool`, optional, defaults to False): 是否将batch截断到batch内最长的有效长度
+                length_bucketing (:obj:`bool`, optional, defaults to False): 是否按样本长度分桶组batch
         """  # noqa: ignore flake8"
 
         self.evaluate_logs = dict()
@@ -147,9 +152,36 @@ class BaseTask(object):
         """
         return default_collate(batch)
 
+    @staticmethod
+    def _dynamic_padding_collate_fn(collate_fn, batch):
+        """动态padding
+        先将batch截断到batch内最长的有效长度，再交给原collate_fn转化成tensor
+        """
+        return collate_fn(DataUtils.dynamic_padding(batch))
+
+    def _get_generator(self, data: BaseDataset, batch_size: int, shuffle: bool, num_workers: int, collate_fn,
+                       dynamic_padding: bool = False, length_bucketing: bool = False):
+        """构造数据生成器
+        dynamic_padding: 是否使用动态padding
+        length_bucketing: 是否按长度分桶组batch，通常与dynamic_padding配合使用
+        """
+        if dynamic_padding:
+            collate_fn = partial(self._dynamic_padding_collate_fn, collate_fn)
+
+        if isinstance(data, IterableDataset):
+            # 流式数据集自行打乱(shuffle_buffer_size)，DataLoader不支持shuffle和batch_sampler
+            return DataLoader(data, batch_size=batch_size, num_workers=num_workers, collate_fn=collate_fn)
+
+        if length_bucketing:
+            batch_sampler = LengthBucketBatchSampler(data, batch_size=batch_size, shuffle=shuffle)
+            return DataLoader(data, batch_sampler=batch_sampler, num_workers=num_workers, collate_fn=collate_fn)
+
+        return DataLoader(data, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers, collate_fn=collate_fn)
+
     def _train_begin(self, train_data: BaseDataset, validation_data: BaseDataset, batch_size: int, epochs: int,
                      shuffle: bool = True, warmup_proportion: float = None,
-                     num_workers: int = 0, train_to_device_cols: List = None, **kwargs):
+                     num_workers: int = 0, train_to_device_cols: List = None,
+                     dynamic_padding: bool = False, length_bucketing: bool = False, **kwargs):
         """训练开始前的一些准备操作：
             1. 准备训练集数据标签和标签id的映射关系、标签数量
             2. tensor使用哪些列的特征数据
@@ -170,8 +202,8 @@ class BaseTask(object):
                 warnings.warn("The class_num is None.")
 
         self.train_to_device_cols = train_to_device_cols if train_to_device_cols else train_data.to_device_cols
-        train_generator = DataLoader(train_data, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
-                                     collate_fn=self._train_collate_fn)
+        train_generator = self._get_generator(train_data, batch_size, shuffle, num_workers, self._train_collate_fn,
+                                              dynamic_padding=dynamic_padding, length_bucketing=length_bucketing)
         self.train_generator_length = len(train_generator)
 
         self.scheduler = self._prepare_scheduler(self.train_generator_length, warmup_proportion,
@@ -185,12 +217,12 @@ class BaseTask(object):
         return train_generator
 
     def _evaluate_begin(self, validation_data, batch_size, shuffle, num_workers=0, evaluate_to_device_cols=None,
-                        **kwargs):
+                        dynamic_padding=False, length_bucketing=False, **kwargs):
         self.model.eval()
         self.evaluate_to_device_cols = evaluate_to_device_cols if evaluate_to_device_cols else validation_data.to_device_cols
-        evaluate_generator = DataLoader(validation_data, batch_size=batch_size, shuffle=shuffle,
-                                        num_workers=num_workers,
-                                        collate_fn=self._evaluate_collate_fn)
+        evaluate_generator = self._get_generator(validation_data, batch_size, shuffle, num_workers,
+                                                 self._evaluate_collate_fn, dynamic_padding=dynamic_padding,
+                                                 length_bucketing=length_bucketing)
 
         if self.ema_decay:
             self.ema.store(self.model.parameters())
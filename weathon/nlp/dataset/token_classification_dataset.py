@@ -25,8 +25,9 @@ class SpanNERDataset(TokenClassificationDataset):
     def _convert_to_transfomer_ids(self, bert_tokenizer):
         features = []
         for (index_, row_) in enumerate(self.dataset):
-            tokens = bert_tokenizer.tokenize(row_['text'])[:bert_tokenizer.max_seq_len - 2]
-            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens)
+            tokens, encoding = bert_tokenizer.tokenize_with_encoding(row_['text'])
+            tokens = tokens[:bert_tokenizer.max_seq_len - 2]
+            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens, encoding=encoding)
 
             start_mapping = {j[0]: i for i, j in enumerate(token_mapping) if j}
             end_mapping = {j[-1]: i for i, j in enumerate(token_mapping) if j}
@@ -83,8 +84,9 @@ class GlobalPointerNERDataset(TokenClassificationDataset):
 
         features = []
         for (index_, row_) in enumerate(self.dataset):
-            tokens = bert_tokenizer.tokenize(row_['text'])[:bert_tokenizer.max_seq_len - 2]
-            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens)
+            tokens, encoding = bert_tokenizer.tokenize_with_encoding(row_['text'])
+            tokens = tokens[:bert_tokenizer.max_seq_len - 2]
+            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens, encoding=encoding)
 
             start_mapping = {j[0]: i for i, j in enumerate(token_mapping) if j}
             end_mapping = {j[-1]: i for i, j in enumerate(token_mapping) if j}
@@ -93,27 +95,21 @@ class GlobalPointerNERDataset(TokenClassificationDataset):
 
             input_ids, input_mask, segment_ids = input_ids
 
-            global_label = torch.zeros((
-                self.class_num,
-                bert_tokenizer.max_seq_len,
-                bert_tokenizer.max_seq_len)
-            )
-
+            # 只保存(type, start, end)三元组，稠密的标签网格在collate_fn中按batch长度构造
+            global_label = set()
             for info_ in row_['label']:
                 if info_['start_idx'] in start_mapping and info_['end_idx'] in end_mapping:
                     start_idx = start_mapping[info_['start_idx']]
                     end_idx = end_mapping[info_['end_idx']]
                     if start_idx > end_idx or info_['entity'] == '':
                         continue
-                    global_label[self.cat2id[info_['type']], start_idx + 1, end_idx + 1] = 1
-
-            global_label = global_label.to_sparse()
+                    global_label.add((self.cat2id[info_['type']], start_idx + 1, end_idx + 1))
 
             features.append({
                 'input_ids': input_ids,
                 'attention_mask': input_mask,
                 'token_type_ids': segment_ids,
-                'label_ids': global_label
+                'label_ids': sorted(global_label)
             })
 
         return features
@@ -139,26 +135,36 @@ class BIONERDataset(TokenClassificationDataset):
         categories.insert(0, 'O')
         return categories
 
+    @staticmethod
+    def _encode_text(bert_tokenizer, text):
+        tokens, encoding = bert_tokenizer.tokenize_with_encoding(text)
+        tokens = tokens[:bert_tokenizer.max_seq_len - 2]
+        token_mapping = bert_tokenizer.get_token_mapping(text, tokens, encoding=encoding)
+
+        input_ids, input_mask, segment_ids = bert_tokenizer.sequence_to_ids(tokens)
+
+        return input_ids, input_mask, segment_ids, len(tokens), token_mapping
+
     def _convert_to_transfomer_ids(self, bert_tokenizer):
 
+        texts = [row_['text'] for row_ in self.dataset]
+        if hasattr(bert_tokenizer, 'encode_batch'):
+            # 字符级分词器直接批量生成id数组
+            encodings = zip(*bert_tokenizer.encode_batch(texts, return_token_mapping=True))
+        else:
+            encodings = (self._encode_text(bert_tokenizer, text_) for text_ in texts)
+
         features = []
-        for (index_, row_) in enumerate(self.dataset):
-            tokens = bert_tokenizer.tokenize(row_['text'])[:bert_tokenizer.max_seq_len - 2]
-            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens)
+        for row_, (input_ids, input_mask, segment_ids, input_length, token_mapping) in zip(self.dataset, encodings):
 
             start_mapping = {j[0]: i for i, j in enumerate(token_mapping) if j}
             end_mapping = {j[-1]: i for i, j in enumerate(token_mapping) if j}
 
-            input_ids = bert_tokenizer.sequence_to_ids(tokens)
-
-            input_ids, input_mask, segment_ids = input_ids
-            input_length = len(tokens)
-
             feature = {
                 'input_ids': input_ids,
                 'attention_mask': input_mask,
                 'token_type_ids': segment_ids,
-                'input_lengths': input_length
+                'input_lengths': int(input_length)
             }
 
             if not self.is_test:
@@ -197,8 +203,9 @@ class BiaffineNERDataset(TokenClassificationDataset):
 
         features = []
         for (index_, row_) in enumerate(self.dataset):
-            tokens = bert_tokenizer.tokenize(row_['text'])[:bert_tokenizer.max_seq_len-2]
-            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens)
+            tokens, encoding = bert_tokenizer.tokenize_with_encoding(row_['text'])
+            tokens = tokens[:bert_tokenizer.max_seq_len - 2]
+            token_mapping = bert_tokenizer.get_token_mapping(row_['text'], tokens, encoding=encoding)
 
             start_mapping = {j[0]: i for i, j in enumerate(token_mapping) if j}
             end_mapping = {j[-1]: i for i, j in enumerate(token_mapping) if j}
@@ -207,16 +214,8 @@ class BiaffineNERDataset(TokenClassificationDataset):
 
             input_ids, input_mask, segment_ids = input_ids
 
-            zero = [0 for i in range(bert_tokenizer.max_seq_len)]
-            span_mask = [input_mask for _ in range(sum(input_mask))]
-            span_mask.extend([zero for _ in range(sum(input_mask),
-                                                  bert_tokenizer.max_seq_len)])
-            span_mask = np.array(span_mask)
-
-            span_label = [0 for _ in range(bert_tokenizer.max_seq_len)]
-            span_label = [span_label for _ in range(bert_tokenizer.max_seq_len)]
-            span_label = np.array(span_label)
-
+            # 只保存(type, start, end)三元组，span_label和span_mask在collate_fn和计算损失时按batch长度构造
+            span_label = set()
             for info_ in row_['label']:
                 if info_['start_idx'] in start_mapping and info_['end_idx'] in end_mapping:
                     start_idx = start_mapping[info_['start_idx']]
@@ -224,14 +223,13 @@ class BiaffineNERDataset(TokenClassificationDataset):
                     if start_idx > end_idx or info_['entity'] == '':
                         continue
 
-                    span_label[start_idx+1, end_idx+1] = self.cat2id[info_['type']]
+                    span_label.add((self.cat2id[info_['type']], start_idx+1, end_idx+1))
 
             features.append({
                 'input_ids': input_ids,
                 'attention_mask': input_mask,
                 'token_type_ids': segment_ids,
-                'label_ids': span_label,
-                'span_mask': span_mask
+                'label_ids': sorted(span_label)
             })
 
         return features
@@ -1,4 +1,7 @@
 import torch
+import numpy as np
+from typing import List, Union
+from weathon.utils.data_utils import DataUtils
 from weathon.nlp.model.ie.prompt_uie.utils import get_span, get_bool_ids_greater_than
 
 
@@ -18,11 +21,20 @@ class PromptUIEPredictor(object):
         self.tokenizer = tokernizer
         self.device = list(self.module.parameters())[0].device
 
-    def _convert_to_transfomer_ids(self, text, prompt):
-        tokens = self.tokenizer.tokenize(text)
-        token_mapping = self.tokenizer.get_token_mapping(text, tokens)
+        # schema中的prompt数量有限且反复使用，缓存其分词结果
+        self._prompt_tokens_cache = {}
 
-        prompt_tokens = self.tokenizer.tokenize(prompt)
+    def _tokenize_prompt(self, prompt):
+        if prompt not in self._prompt_tokens_cache:
+            self._prompt_tokens_cache[prompt] = self.tokenizer.tokenize(prompt)
+        return self._prompt_tokens_cache[prompt]
+
+    def _convert_to_transfomer_ids(self, text, prompt, tokens=None, token_mapping=None):
+        if tokens is None:
+            tokens = self.tokenizer.tokenize(text)
+            token_mapping = self.tokenizer.get_token_mapping(text, tokens)
+
+        prompt_tokens = self._tokenize_prompt(prompt)
 
         input_ids = self.tokenizer.sequence_to_ids(prompt_tokens, tokens, truncation_method='last')
         input_ids, input_mask, segment_ids = input_ids
@@ -36,7 +48,7 @@ class PromptUIEPredictor(object):
         return features, token_mapping
 
     def _get_input_ids(self, text, prompt):
-        if self.tokenizer.tokenizer_type == 'transfomer':
+        if self.tokenizer.tokenizer_type == 'transformer':
             return self._convert_to_transfomer_ids(text, prompt)
         else:
             raise ValueError("The tokenizer type does not exist")
@@ -67,12 +79,13 @@ class PromptUIEPredictor(object):
             inputs = self._get_module_one_sample_inputs(features)
             start_logits, end_logits = self.module(**inputs)
 
-            start_scores = start_logits[0].cpu().numpy()[2 + len(self.tokenizer.tokenize(prompt)):]
-            end_scores = end_logits[0].cpu().numpy()[2 + len(self.tokenizer.tokenize(prompt)):]
+            prompt_length = len(self._tokenize_prompt(prompt))
+            start_scores = get_bool_ids_greater_than(start_logits[0].cpu().numpy()[2 + prompt_length:])
+            end_scores = get_bool_ids_greater_than(end_logits[0].cpu().numpy()[2 + prompt_length:])
 
-            start_scores = get_bool_ids_greater_than(start_scores)
-            end_scores = get_bool_ids_greater_than(end_scores)
+        return self._get_entities(text, prompt, start_scores, end_scores, token_mapping)
 
+    def _get_entities(self, text, prompt, start_scores, end_scores, token_mapping):
         entities = []
         for span in get_span(start_scores, end_scores):
 
@@ -88,3 +101,72 @@ class PromptUIEPredictor(object):
             entities.append(entitie_)
 
         return entities
+
+    def predict(
+            self,
+            text: Union[str, List[str]],
+            schema: List[str],
+            batch_size: int = 32,
+            limit: float = 0.5
+    ):
+        """
+        按schema抽取：将每条文本与schema中的所有prompt组合，跨文本拼成batch后统一前向计算
+
+        Args:
+            text (:obj:`string` or :obj:`list`): 输入文本或文本列表
+            schema (:obj:`list`): 需要抽取的类型(prompt)列表，例如["人名", "地名"]
+            batch_size (:obj:`int`, optional, defaults to 32): 前向计算的batch大小
+            limit (:obj:`float`, optional, defaults to 0.5): span首尾概率阈值
+
+        Returns:
+            输入为单条文本时返回实体列表，输入为文本列表时返回每条文本的实体列表
+        """  # noqa: ignore flake8"
+
+        if self.tokenizer.tokenizer_type != 'transformer':
+            raise ValueError("The tokenizer type does not exist")
+
+        is_single = isinstance(text, str)
+        texts = [text] if is_single else list(text)
+
+        # 文本只分词一次，与schema中的每个prompt组合
+        encodings = []
+        for text_ in texts:
+            tokens_ = self.tokenizer.tokenize(text_)
+            encodings.append((tokens_, self.tokenizer.get_token_mapping(text_, tokens_)))
+
+        pairs = [(text_index_, prompt_) for text_index_ in range(len(texts)) for prompt_ in schema]
+
+        results = [[] for _ in texts]
+
+        self.module.eval()
+
+        with torch.no_grad():
+            for batch_start_ in range(0, len(pairs), batch_size):
+                batch_pairs_ = pairs[batch_start_:batch_start_ + batch_size]
+
+                features_ = [
+                    self._convert_to_transfomer_ids(texts[text_index_], prompt_, *encodings[text_index_])[0]
+                    for text_index_, prompt_ in batch_pairs_
+                ]
+                features_ = DataUtils.dynamic_padding(features_)
+                inputs_ = {
+                    col_: torch.from_numpy(np.stack([feature_[col_] for feature_ in features_]))
+                    .type(torch.long).to(self.device)
+                    for col_ in features_[0]
+                }
+
+                start_probs_, end_probs_ = self.module(**inputs_)
+                start_flags_ = (start_probs_ > limit).cpu().numpy()
+                end_flags_ = (end_probs_ > limit).cpu().numpy()
+
+                for row_, (text_index_, prompt_) in enumerate(batch_pairs_):
+                    offset_ = 2 + len(self._tokenize_prompt(prompt_))
+                    start_scores_ = np.flatnonzero(start_flags_[row_, offset_:]).tolist()
+                    end_scores_ = np.flatnonzero(end_flags_[row_, offset_:]).tolist()
+
+                    results[text_index_].extend(
+                        self._get_entities(texts[text_index_], prompt_, start_scores_, end_scores_,
+                                           encodings[text_index_][1])
+                    )
+
+        return results[0] if is_single else results
@@ -85,8 +85,8 @@ class PromptUIETask(TokenClassificationTask):
         start_logits = logits[0]
         end_logits = logits[1]
 
-        start_pred = start_logits.cpu().numpy().tolist()
-        end_pred = end_logits.cpu().numpy().tolist()
+        start_pred = start_logits.cpu().numpy()
+        end_pred = end_logits.cpu().numpy()
 
         start_score_list = get_bool_ids_greater_than(start_pred)
         end_score_list = get_bool_ids_greater_than(end_pred)
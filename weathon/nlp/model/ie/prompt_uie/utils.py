@@ -77,22 +77,14 @@ def get_bool_ids_greater_than(probs, limit=0.5, return_prob=False):
     Reference:
         [1] https://github.com/PaddlePaddle/PaddleNLP/blob/develop/paddlenlp/utils/tools.py
     """
-    probs = np.array(probs)
-    dim_len = len(probs.shape)
-    if dim_len > 1:
-        result = []
-        for p in probs:
-            result.append(get_bool_ids_greater_than(p, limit, return_prob))
-        return result
-    else:
-        result = []
-        for i, p in enumerate(probs):
-            if p > limit:
-                if return_prob:
-                    result.append((i, p))
-                else:
-                    result.append(i)
-        return result
+    probs = np.asarray(probs)
+    if probs.ndim > 1:
+        return [get_bool_ids_greater_than(p, limit, return_prob) for p in probs]
+
+    ids = np.flatnonzero(probs > limit)
+    if return_prob:
+        return list(zip(ids.tolist(), probs[ids]))
+    return ids.tolist()
 
 
 def get_span(start_ids, end_ids, with_prob=False):
@@ -113,43 +105,24 @@ def get_span(start_ids, end_ids, with_prob=False):
     if with_prob:
         start_ids = sorted(start_ids, key=lambda x: x[0])
         end_ids = sorted(end_ids, key=lambda x: x[0])
+        start_positions = np.asarray([x[0] for x in start_ids], dtype=np.int64)
+        end_positions = np.asarray([x[0] for x in end_ids], dtype=np.int64)
     else:
         start_ids = sorted(start_ids)
         end_ids = sorted(end_ids)
+        start_positions = np.asarray(start_ids, dtype=np.int64)
+        end_positions = np.asarray(end_ids, dtype=np.int64)
 
-    start_pointer = 0
-    end_pointer = 0
-    len_start = len(start_ids)
-    len_end = len(end_ids)
-    couple_dict = {}
-    while start_pointer < len_start and end_pointer < len_end:
-        if with_prob:
-            if start_ids[start_pointer][0] == end_ids[end_pointer][0]:
-                couple_dict[end_ids[end_pointer]] = start_ids[start_pointer]
-                start_pointer += 1
-                end_pointer += 1
-                continue
-            if start_ids[start_pointer][0] < end_ids[end_pointer][0]:
-                couple_dict[end_ids[end_pointer]] = start_ids[start_pointer]
-                start_pointer += 1
-                continue
-            if start_ids[start_pointer][0] > end_ids[end_pointer][0]:
-                end_pointer += 1
-                continue
-        else:
-            if start_ids[start_pointer] == end_ids[end_pointer]:
-                couple_dict[end_ids[end_pointer]] = start_ids[start_pointer]
-                start_pointer += 1
-                end_pointer += 1
-                continue
-            if start_ids[start_pointer] < end_ids[end_pointer]:
-                couple_dict[end_ids[end_pointer]] = start_ids[start_pointer]
-                start_pointer += 1
-                continue
-            if start_ids[start_pointer] > end_ids[end_pointer]:
-                end_pointer += 1
-                continue
-    result = [(couple_dict[end], end) for end in couple_dict]
-    result = set(result)
+    if len(start_positions) == 0 or len(end_positions) == 0:
+        return set()
+
+    # 每个end与不超过它的最近start配对，且该start需位于上一个end之后(等于上一个end的start已被其占用)
+    start_index = np.searchsorted(start_positions, end_positions, side='right') - 1
+    prev_end = np.concatenate(([-1], end_positions[:-1]))
+    valid = start_index >= 0
+    valid[valid] = start_positions[start_index[valid]] > prev_end[valid]
+
+    result = set((start_ids[s], end_ids[e]) for e, s in zip(np.flatnonzero(valid).tolist(),
+                                                               start_index[valid].tolist()))
 
     return result
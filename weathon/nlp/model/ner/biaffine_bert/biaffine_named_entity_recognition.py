@@ -2,7 +2,9 @@
 
 import torch
 from weathon.nlp.factory.metric import BiaffineSpanMetrics
+from weathon.utils.data_utils import DataUtils
 from weathon.nlp.task import TokenClassificationTask
+from weathon.nlp.task.named_entity_recognition import span_label_collate_fn
 
 
 class BiaffineNERTask(TokenClassificationTask):
@@ -30,18 +32,25 @@ class BiaffineNERTask(TokenClassificationTask):
         **kwargs
     ):
 
-        span_label = inputs['label_ids'].view(size=(-1,))
+        span_label = inputs['label_ids'].to_dense().view(size=(-1,))
         span_logits = logits.view(size=(-1, self.class_num))
 
         span_loss = self.loss_function(span_logits, span_label.long())
 
-        span_mask = inputs['span_mask'].view(size=(-1,))
+        # span_mask[b, i, j] = attention_mask[b, i] * attention_mask[b, j]
+        span_mask = inputs['attention_mask'].unsqueeze(-1) * inputs['attention_mask'].unsqueeze(-2)
 
-        span_loss *= span_mask
-        loss = torch.sum(span_loss) / inputs['span_mask'].size()[0]
+        span_loss *= span_mask.view(size=(-1,))
+        loss = torch.sum(span_loss) / span_mask.size()[0]
 
         return loss
 
+    def _train_collate_fn(self, batch):
+        return span_label_collate_fn(batch)
+
+    def _evaluate_collate_fn(self, batch):
+        return span_label_collate_fn(batch)
+
     def _evaluate_step_end(self, inputs, outputs, **kwargs):
 
         with torch.no_grad():
@@ -50,10 +59,10 @@ class BiaffineNERTask(TokenClassificationTask):
             logits = torch.nn.functional.softmax(logits, dim=-1)
             self.evaluate_logs['eval_loss'] += loss.item()
 
-        self.evaluate_logs['labels'].append(inputs['label_ids'].cpu())
+        self.evaluate_logs['labels'].append(inputs['label_ids'].to_dense().cpu())
         self.evaluate_logs['logits'].append(logits.cpu())
 
-        self.evaluate_logs['eval_example'] += len(inputs['label_ids'])
+        self.evaluate_logs['eval_example'] += len(inputs['input_ids'])
         self.evaluate_logs['eval_step'] += 1
 
     def _on_evaluate_epoch_end(
@@ -70,8 +79,8 @@ class BiaffineNERTask(TokenClassificationTask):
 
         biaffine_metric = BiaffineSpanMetrics()
 
-        preds_ = torch.cat(self.evaluate_logs['logits'], dim=0)
-        labels_ = torch.cat(self.evaluate_logs['labels'], dim=0)
+        preds_ = DataUtils.pad_and_concat(self.evaluate_logs['logits'])
+        labels_ = DataUtils.pad_and_concat(self.evaluate_logs['labels'])
 
         with torch.no_grad():
             recall, precise, span_f1 = biaffine_metric(preds_, labels_)
@@ -2,6 +2,7 @@
 import torch
 from weathon.utils.conlleval import global_pointer_f1_score
 from weathon.nlp.task import TokenClassificationTask
+from weathon.nlp.task.named_entity_recognition import span_label_collate_fn
 
 
 class GlobalPointerNERTask(TokenClassificationTask):
@@ -32,6 +33,12 @@ class GlobalPointerNERTask(TokenClassificationTask):
 
         return loss
 
+    def _train_collate_fn(self, batch):
+        return span_label_collate_fn(batch, self.class_num)
+
+    def _evaluate_collate_fn(self, batch):
+        return span_label_collate_fn(batch, self.class_num)
+
     def _evaluate_begin_record(self, **kwargs):
 
         self.evaluate_logs['eval_loss'] = 0
@@ -52,14 +59,14 @@ class GlobalPointerNERTask(TokenClassificationTask):
             # compute loss
             logits, loss = self._get_evaluate_loss(inputs, outputs, **kwargs)
 
-            numerate, denominator = conlleval.global_pointer_f1_score(
+            numerate, denominator = global_pointer_f1_score(
                 inputs['label_ids'].to_dense().cpu(),
                 logits.cpu()
             )
             self.evaluate_logs['numerate'] += numerate
             self.evaluate_logs['denominator'] += denominator
 
-        self.evaluate_logs['eval_example'] += len(inputs['label_ids'])
+        self.evaluate_logs['eval_example'] += len(inputs['input_ids'])
         self.evaluate_logs['eval_step'] += 1
         self.evaluate_logs['eval_loss'] += loss.item()
 
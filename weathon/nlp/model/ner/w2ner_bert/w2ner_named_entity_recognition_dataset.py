@@ -5,6 +5,130 @@ import numpy as np
 from weathon.nlp.dataset import TokenClassificationDataset
 
 
+# 相对距离到距离embedding编号的映射表
+# https://github.com/ljynlp/W2NER/issues/17
+DIS2IDX = np.zeros((1000), dtype=np.int8)
+DIS2IDX[1] = 1
+DIS2IDX[2:] = 2
+DIS2IDX[4:] = 3
+DIS2IDX[8:] = 4
+DIS2IDX[16:] = 5
+DIS2IDX[32:] = 6
+DIS2IDX[64:] = 7
+DIS2IDX[128:] = 8
+DIS2IDX[256:] = 9
+
+
+def get_grid_inputs(input_length):
+    """
+    构造W2NER实际长度下的二维网格特征
+
+    Args:
+        input_length (:obj:`int`): 文本token数
+
+    Returns:
+        grid_mask2d (bool, [l, l]), dist_inputs (int8, [l, l]), pieces2word (bool, [l, l + 2])
+    """  # noqa: ignore flake8"
+
+    grid_mask2d = np.ones((input_length, input_length), dtype=np.bool_)
+
+    # dist_inputs[i, j] = i - j，按距离分桶，j在i之后的桶编号加9，对角线单独编号为19
+    positions = np.arange(input_length)
+    dist = positions[:, None] - positions[None, :]
+    dist_inputs = DIS2IDX[np.minimum(np.abs(dist), len(DIS2IDX) - 1)] + 9 * (dist < 0)
+    dist_inputs[dist == 0] = 19
+    dist_inputs = dist_inputs.astype(np.int8)
+
+    # 字符级分词，每个word只对应一个piece，piece位置需跳过[CLS]
+    pieces2word = np.zeros((input_length, input_length + 2), dtype=np.bool_)
+    pieces2word[positions, positions + 1] = True
+
+    return grid_mask2d, dist_inputs, pieces2word
+
+
+def pad_grid_inputs(grids, shape):
+    """
+    将实际长度的二维网格特征填充成batch内统一大小的tensor
+
+    Args:
+        grids (:obj:`list`): 二维numpy数组组成的列表
+        shape (:obj:`tuple`): 填充后的二维大小
+    """  # noqa: ignore flake8"
+
+    padded = torch.zeros((len(grids),) + tuple(shape), dtype=torch.long)
+    for index_, grid_ in enumerate(grids):
+        grid_ = torch.as_tensor(np.asarray(grid_))
+        padded[index_, :grid_.shape[0], :grid_.shape[1]] = grid_
+    return padded
+
+
+def decode_grid_entities(outputs, lengths):
+    """
+    将预测的标签网格解码成实体：<suc>边(上三角中值为1的位置)与head-tail(下三角及对角线中值大于1的位置)均通过np.nonzero批量获取，
+    <suc>边按起点组织成CSR形式的邻接表，再从每个head出发迭代地枚举到达其tail的路径
+
+    Args:
+        outputs (:obj:`np.ndarray`): 预测的标签网格，shape为(batch_size, l, l)
+        lengths (:obj:`list` or :obj:`np.ndarray`): 每个样本的实际长度
+    Returns:
+        每个样本的实体列表，实体为(index列表, 类型id)
+    """  # noqa: ignore flake8"
+
+    outputs = np.asarray(outputs)
+    lengths = np.asarray(lengths, dtype=np.int64).reshape(-1)
+    batch_size, grid_length = outputs.shape[:2]
+
+    positions = np.arange(grid_length)
+    valid = (positions[None, :, None] < lengths[:, None, None]) & (positions[None, None, :] < lengths[:, None, None])
+    upper = positions[:, None] < positions[None, :]
+
+    suc_samples, suc_heads, suc_tails = np.nonzero((outputs == 1) & upper & valid)
+    # 下三角及对角线outputs[b, j, i]表示以i为首、j为尾的实体类型
+    ht_samples, ht_tails, ht_heads = np.nonzero((outputs > 1) & ~upper & valid)
+    ht_types = outputs[ht_samples, ht_tails, ht_heads]
+
+    suc_bounds = np.searchsorted(suc_samples, np.arange(batch_size + 1))
+    ht_bounds = np.searchsorted(ht_samples, np.arange(batch_size + 1))
+
+    results = []
+    for index_ in range(batch_size):
+        length_ = int(lengths[index_])
+
+        # CSR邻接表：indices[indptr[i]:indptr[i + 1]]为i的后继，升序排列
+        heads_ = suc_heads[suc_bounds[index_]:suc_bounds[index_ + 1]]
+        indices = suc_tails[suc_bounds[index_]:suc_bounds[index_ + 1]].tolist()
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(heads_, minlength=length_)))).tolist()
+
+        head_dict = {}
+        ht_type_dict = {}
+        ht_slice_ = slice(ht_bounds[index_], ht_bounds[index_ + 1])
+        for head_, tail_, type_ in zip(ht_heads[ht_slice_].tolist(), ht_tails[ht_slice_].tolist(),
+                                       ht_types[ht_slice_].tolist()):
+            head_dict.setdefault(head_, set()).add(tail_)
+            ht_type_dict[(head_, tail_)] = type_
+
+        entities = []
+        for head_ in sorted(head_dict):
+            tails_ = head_dict[head_]
+            max_tail_ = max(tails_)
+
+            # 显式栈的先序遍历，与递归版本的枚举顺序一致；超过最远tail的后继不可能到达tail，直接剪枝
+            path = []
+            stack = [(head_, 0)]
+            while stack:
+                node_, depth_ = stack.pop()
+                del path[depth_:]
+                path.append(node_)
+                if node_ in tails_:
+                    entities.append((list(path), ht_type_dict[(head_, node_)]))
+                successors_ = [k for k in indices[indptr[node_]:indptr[node_ + 1]] if k <= max_tail_]
+                stack.extend((k, depth_ + 1) for k in reversed(successors_))
+
+        results.append(entities)
+
+    return results
+
+
 class W2NERDataset(TokenClassificationDataset):
     """
     W2NER的Dataset
@@ -41,79 +165,21 @@ class W2NERDataset(TokenClassificationDataset):
 
             # input_length 对应源码 sent_length
             input_length = len(tokens)
-            _grid_mask2d = np.ones((input_length, input_length), dtype=np.bool)
-            _dist_inputs = np.zeros((input_length, input_length), dtype=np.int)
-            _pieces2word = np.zeros((input_length, input_length+2), dtype=np.bool)
-
-            # pieces2word 类似于token_mapping
-            start = 0
-            for i, pieces in enumerate(tokens):
-                # 对齐源码
-                pieces = [pieces]
-                if len(pieces) == 0:
-                    continue
-                pieces = list(range(start, start + len(pieces)))
-                _pieces2word[i, pieces[0] + 1:pieces[-1] + 2] = 1
-                start += len(pieces)
-
-            # dist_inputs
-            # https://github.com/ljynlp/W2NER/issues/17
-            dis2idx = np.zeros((1000), dtype='int64')
-            dis2idx[1] = 1
-            dis2idx[2:] = 2
-            dis2idx[4:] = 3
-            dis2idx[8:] = 4
-            dis2idx[16:] = 5
-            dis2idx[32:] = 6
-            dis2idx[64:] = 7
-            dis2idx[128:] = 8
-            dis2idx[256:] = 9
-
-            for k in range(input_length):
-                _dist_inputs[k, :] += k
-                _dist_inputs[:, k] -= k
-
-            for i in range(input_length):
-                for j in range(input_length):
-                    if _dist_inputs[i, j] < 0:
-                        _dist_inputs[i, j] = dis2idx[-_dist_inputs[i, j]] + 9
-                    else:
-                        _dist_inputs[i, j] = dis2idx[_dist_inputs[i, j]]
-            _dist_inputs[_dist_inputs == 0] = 19
-
-            _grid_labels = np.zeros((
-                bert_tokenizer.max_seq_len,
-                bert_tokenizer.max_seq_len,)
-            )
+            _grid_mask2d, _dist_inputs, _pieces2word = get_grid_inputs(input_length)
+
+            _grid_labels = np.zeros((input_length, input_length), dtype=np.int16)
 
             for info_ in row_["label"]:
                 index = info_['idx']
 
-                if len(index) > 0 and index[-1] < bert_tokenizer.max_seq_len:
-
-                    for i in range(len(index)):
-                        if i + 1 >= len(index):
-                            break
-                        _grid_labels[index[i], index[i + 1]] = self.cat2id['<suc>']
+                if len(index) > 0 and index[-1] < input_length:
+                    _grid_labels[index[:-1], index[1:]] = self.cat2id['<suc>']
                     _grid_labels[index[-1], index[0]] = self.cat2id[info_["type"]]
 
-            # 源码中 collate_fn 中处理成 max_lenth * max_lenth 矩阵代码
-            def fill(data, new_data):
-                new_data[:data.shape[0], :data.shape[1]] = torch.tensor(data, dtype=torch.long)
-                return new_data
-
-            mask2d_mat = torch.zeros((bert_tokenizer.max_seq_len, bert_tokenizer.max_seq_len), dtype=torch.long)
-            _grid_mask2d = fill(_grid_mask2d, mask2d_mat)
-            dis_mat = torch.zeros((bert_tokenizer.max_seq_len, bert_tokenizer.max_seq_len), dtype=torch.long)
-            _dist_inputs = fill(_dist_inputs, dis_mat)
-            sub_mat = torch.zeros((bert_tokenizer.max_seq_len, bert_tokenizer.max_seq_len), dtype=torch.long)
-            _pieces2word = fill(_pieces2word, sub_mat)
-            labels_mat = torch.zeros((bert_tokenizer.max_seq_len, bert_tokenizer.max_seq_len), dtype=torch.long)
-            _grid_labels = fill(_grid_labels, labels_mat)
-
             _entity_text = list(set([W2NERDataset.convert_index_to_text(info_['idx'],
                                 self.cat2id[info_["type"]]) for info_ in row_['label']]))
 
+            # 二维网格特征只保留实际长度，填充交由collate_fn按batch完成
             feature = {
                 'input_ids': input_ids,
                 'attention_mask': input_mask,
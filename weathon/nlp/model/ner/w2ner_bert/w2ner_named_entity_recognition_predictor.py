@@ -2,6 +2,10 @@
 import torch
 import numpy as np
 
+from weathon.nlp.model.ner.w2ner_bert.w2ner_named_entity_recognition_dataset import get_grid_inputs
+from weathon.nlp.model.ner.w2ner_bert.w2ner_named_entity_recognition_dataset import pad_grid_inputs
+from weathon.nlp.model.ner.w2ner_bert.w2ner_named_entity_recognition_dataset import decode_grid_entities
+
 
 class W2NERPredictor(object):
     """
@@ -42,57 +46,12 @@ class W2NERPredictor(object):
 
         # input_length 对应源码 sent_length
         input_length = len(tokens)
-        _grid_mask2d = np.ones((input_length, input_length), dtype=np.bool)
-        _dist_inputs = np.zeros((input_length, input_length), dtype=np.int)
-        _pieces2word = np.zeros((input_length, input_length + 2), dtype=np.bool)
-
-        # pieces2word 类似于token_mapping
-        start = 0
-        for i, pieces in enumerate(tokens):
-            # 对齐源码
-            pieces = [pieces]
-            if len(pieces) == 0:
-                continue
-            pieces = list(range(start, start + len(pieces)))
-            _pieces2word[i, pieces[0] + 1:pieces[-1] + 2] = 1
-            start += len(pieces)
-
-        # dist_inputs
-        # https://github.com/ljynlp/W2NER/issues/17
-        dis2idx = np.zeros((1000), dtype='int64')
-        dis2idx[1] = 1
-        dis2idx[2:] = 2
-        dis2idx[4:] = 3
-        dis2idx[8:] = 4
-        dis2idx[16:] = 5
-        dis2idx[32:] = 6
-        dis2idx[64:] = 7
-        dis2idx[128:] = 8
-        dis2idx[256:] = 9
-
-        for k in range(input_length):
-            _dist_inputs[k, :] += k
-            _dist_inputs[:, k] -= k
-
-        for i in range(input_length):
-            for j in range(input_length):
-                if _dist_inputs[i, j] < 0:
-                    _dist_inputs[i, j] = dis2idx[-_dist_inputs[i, j]] + 9
-                else:
-                    _dist_inputs[i, j] = dis2idx[_dist_inputs[i, j]]
-        _dist_inputs[_dist_inputs == 0] = 19
-
-        # 源码中 collate_fn 中处理成 max_lenth * max_lenth 矩阵代码
-        def fill(data, new_data):
-            new_data[:data.shape[0], :data.shape[1]] = torch.tensor(data, dtype=torch.long)
-            return new_data
-
-        mask2d_mat = torch.zeros((self.tokenizer.max_seq_len, self.tokenizer.max_seq_len))
-        _grid_mask2d = fill(_grid_mask2d, mask2d_mat)
-        dis_mat = torch.zeros((self.tokenizer.max_seq_len, self.tokenizer.max_seq_len))
-        _dist_inputs = fill(_dist_inputs, dis_mat)
-        sub_mat = torch.zeros((self.tokenizer.max_seq_len, self.tokenizer.max_seq_len))
-        _pieces2word = fill(_pieces2word, sub_mat)
+        _grid_mask2d, _dist_inputs, _pieces2word = get_grid_inputs(input_length)
+
+        # 单样本预测无需填充，input_ids等截断到实际长度即可与网格特征对齐
+        input_ids = input_ids[:input_length + 2]
+        input_mask = input_mask[:input_length + 2]
+        segment_ids = segment_ids[:input_length + 2]
 
         features = {
             'input_ids': input_ids,
@@ -112,7 +71,7 @@ class W2NERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -151,54 +110,64 @@ class W2NERPredictor(object):
             inputs = self._get_module_one_sample_inputs(features)
             logit = self.module(**inputs)
 
-        preds = torch.argmax(logit, -1)
-
-        instance, l = preds.cpu().numpy()[0], int(inputs['input_lengths'].cpu().numpy()[0])
-
-        forward_dict = {}
-        head_dict = {}
-        ht_type_dict = {}
-        for i in range(l):
-            for j in range(i + 1, l):
-                if instance[i, j] == 1:
-                    if i not in forward_dict:
-                        forward_dict[i] = [j]
-                    else:
-                        forward_dict[i].append(j)
-        for i in range(l):
-            for j in range(i, l):
-                if instance[j, i] > 1:
-                    ht_type_dict[(i, j)] = instance[j, i]
-                    if i not in head_dict:
-                        head_dict[i] = {j}
-                    else:
-                        head_dict[i].add(j)
-
-        predicts = []
-
-        def find_entity(key, entity, tails):
-            entity.append(key)
-            if key not in forward_dict:
-                if key in tails:
-                    predicts.append(entity.copy())
-                entity.pop()
-                return
-            else:
-                if key in tails:
-                    predicts.append(entity.copy())
-            for k in forward_dict[key]:
-                find_entity(k, entity, tails)
-            entity.pop()
+        preds = torch.argmax(logit, -1).cpu().numpy()
 
-        for head in head_dict:
-            find_entity(head, [], head_dict[head])
+        return self._get_entities(text, decode_grid_entities(preds, [features['input_lengths']])[0])
 
+    def _get_entities(self, text, predicts):
         entities = []
-        for entity_ in predicts:
+        for entity_, type_ in predicts:
             entities.append({
                 "idx": entity_,
                 "entity": ''.join([text[i] for i in entity_]),
-                "type": self.id2cat[ht_type_dict[(entity_[0], entity_[-1])]]
+                "type": self.id2cat[type_]
             })
 
         return entities
+
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32
+    ):
+        """
+        批量预测，batch内的网格特征按最长文本填充后一次前向计算并批量解码
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        results = []
+        for start_ in range(0, len(texts), batch_size):
+            batch_texts = texts[start_:start_ + batch_size]
+            features = [self._get_input_ids(text) for text in batch_texts]
+
+            input_lengths = [f['input_lengths'] for f in features]
+            word_length = max(input_lengths)
+            piece_length = word_length + 2
+
+            inputs = {
+                col: pad_grid_inputs([f[col].reshape(1, -1) for f in features], (1, piece_length))
+                .squeeze(1).to(self.device)
+                for col in ['input_ids', 'attention_mask', 'token_type_ids']
+            }
+            inputs['grid_mask2d'] = pad_grid_inputs([f['grid_mask2d'] for f in features],
+                                                    (word_length, word_length)).to(self.device)
+            inputs['dist_inputs'] = pad_grid_inputs([f['dist_inputs'] for f in features],
+                                                    (word_length, word_length)).to(self.device)
+            inputs['pieces2word'] = pad_grid_inputs([f['pieces2word'] for f in features],
+                                                    (word_length, piece_length)).to(self.device)
+            inputs['input_lengths'] = torch.tensor(input_lengths)
+
+            with torch.no_grad():
+                logit = self.module(**inputs)
+
+            preds = torch.argmax(logit, -1).cpu().numpy()
+
+            for text, predicts in zip(batch_texts, decode_grid_entities(preds, input_lengths)):
+                results.append(self._get_entities(text, predicts))
+
+        return results
@@ -4,6 +4,8 @@ from collections import Counter
 from weathon.utils import conlleval
 from weathon.nlp.task import TokenClassificationTask
 from torch.utils.data._utils.collate import default_collate
+from weathon.nlp.model.ner.w2ner_bert.w2ner_named_entity_recognition_dataset import pad_grid_inputs
+from weathon.nlp.model.ner.w2ner_bert.w2ner_named_entity_recognition_dataset import decode_grid_entities
 
 
 def convert_index_to_text(index, type):
@@ -14,46 +16,9 @@ def convert_index_to_text(index, type):
 
 def decode(outputs, entities, length):
     ent_r, ent_p, ent_c = [], [], []
-    for index, (instance, ent_set, l) in enumerate(zip(outputs, entities, length)):
-        forward_dict = {}
-        head_dict = {}
-        ht_type_dict = {}
-        for i in range(l):
-            for j in range(i + 1, l):
-                if instance[i, j] == 1:
-                    if i not in forward_dict:
-                        forward_dict[i] = [j]
-                    else:
-                        forward_dict[i].append(j)
-        for i in range(l):
-            for j in range(i, l):
-                if instance[j, i] > 1:
-                    ht_type_dict[(i, j)] = instance[j, i]
-                    if i not in head_dict:
-                        head_dict[i] = {j}
-                    else:
-                        head_dict[i].add(j)
-
-        predicts = []
-
-        def find_entity(key, entity, tails):
-            entity.append(key)
-            if key not in forward_dict:
-                if key in tails:
-                    predicts.append(entity.copy())
-                entity.pop()
-                return
-            else:
-                if key in tails:
-                    predicts.append(entity.copy())
-            for k in forward_dict[key]:
-                find_entity(k, entity, tails)
-            entity.pop()
-
-        for head in head_dict:
-            find_entity(head, [], head_dict[head])
-
-        predicts = set([convert_index_to_text(x, ht_type_dict[(x[0], x[-1])]) for x in predicts])
+    for ent_set, predicts in zip(entities, decode_grid_entities(outputs, length)):
+
+        predicts = set([convert_index_to_text(x, type_) for x, type_ in predicts])
 
         ent_r.extend(ent_set)
         ent_p.extend(predicts)
@@ -142,13 +107,17 @@ class W2NERTask(TokenClassificationTask):
         input_ids = default_collate([f['input_ids'] for f in batch])
         attention_mask = default_collate([f['attention_mask'] for f in batch])
         token_type_ids = default_collate([f['token_type_ids'] for f in batch])
-        grid_mask2d = default_collate([f['grid_mask2d'] for f in batch])
-        dist_inputs = default_collate([f['dist_inputs'] for f in batch])
-        pieces2word = default_collate([f['pieces2word'] for f in batch])
-        label_ids = default_collate([f['label_ids'] for f in batch])
         input_lengths = default_collate([f['input_lengths'] for f in batch])
         entity_text = [f['entity_text'] for f in batch]
 
+        # 二维网格特征按batch内最长文本填充，pieces2word的第二维与input_ids长度对齐
+        word_length = int(input_lengths.max())
+        piece_length = input_ids.size(1)
+        grid_mask2d = pad_grid_inputs([f['grid_mask2d'] for f in batch], (word_length, word_length))
+        dist_inputs = pad_grid_inputs([f['dist_inputs'] for f in batch], (word_length, word_length))
+        pieces2word = pad_grid_inputs([f['pieces2word'] for f in batch], (word_length, piece_length))
+        label_ids = pad_grid_inputs([f['label_ids'] for f in batch], (word_length, word_length))
+
         tensors = {
             'input_ids': input_ids,
             'attention_mask': attention_mask,
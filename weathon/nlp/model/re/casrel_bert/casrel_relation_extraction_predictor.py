@@ -1,6 +1,8 @@
 
 import torch
 import numpy as np
+from weathon.utils.data_utils import DataUtils
+from weathon.nlp.model.re.casrel_bert.utils import get_batch_triples
 
 
 class CasRelREPredictor(object):
@@ -51,7 +53,7 @@ class CasRelREPredictor(object):
         self,
         text
     ):
-        if self.tokenizer.tokenizer_type == 'transfomer':
+        if self.tokenizer.tokenizer_type == 'transformer':
             return self._convert_to_transfomer_ids(text)
         else:
             raise ValueError("The tokenizer type does not exist")
@@ -81,58 +83,51 @@ class CasRelREPredictor(object):
 
         with torch.no_grad():
             inputs = self._get_module_one_sample_inputs(features)
-            encoded_text = self.module.bert(inputs['input_ids'], inputs['attention_mask'])[0]
-
-            pred_sub_heads, pred_sub_tails = self.module.get_subs(encoded_text)
-            sub_heads, sub_tails = np.where(pred_sub_heads.cpu()[0] > h_bar)[0], np.where(pred_sub_tails.cpu()[0] > t_bar)[0]
-
-            token_mapping = inputs['token_mapping']
-
-            subjects = []
-            for sub_head in sub_heads:
-                sub_tail = sub_tails[sub_tails >= sub_head]
-                if len(sub_tail) > 0:
-                    sub_tail = sub_tail[0]
-                    subject = ''.join([token_mapping[index_] if index_ < len(token_mapping) else '' for index_ in range(sub_head-1, sub_tail)])
-                    subjects.append((subject, sub_head, sub_tail))
-
-            if subjects:
-                triple_list = []
-                repeated_encoded_text = encoded_text.repeat(len(subjects), 1, 1)
-                sub_head_mapping = torch.Tensor(len(subjects), 1, encoded_text.size(1)).zero_()
-                sub_tail_mapping = torch.Tensor(len(subjects), 1, encoded_text.size(1)).zero_()
-                for subject_idx, subject in enumerate(subjects):
-                    sub_head_mapping[subject_idx][0][subject[1]] = 1
-                    sub_tail_mapping[subject_idx][0][subject[2]] = 1
-                sub_tail_mapping = sub_tail_mapping.to(repeated_encoded_text)
-                sub_head_mapping = sub_head_mapping.to(repeated_encoded_text)
-
-                pred_obj_heads, pred_obj_tails = self.module.get_objs_for_specific_sub(
-                    sub_head_mapping,
-                    sub_tail_mapping,
-                    repeated_encoded_text
-                )
-
-                for subject_idx, subject in enumerate(subjects):
-                    sub = subject[0]
-
-                    obj_heads, obj_tails = np.where(pred_obj_heads.cpu()[subject_idx] > h_bar), np.where(pred_obj_tails.cpu()[subject_idx] > t_bar)
-                    for obj_head, rel_head in zip(*obj_heads):
-                        for obj_tail, rel_tail in zip(*obj_tails):
-                            if obj_head <= obj_tail and rel_head == rel_tail:
-                                rel = self.id2cat[int(rel_head)]
-                                obj = ''.join([token_mapping[index_] if index_ < len(token_mapping) else '' for index_ in range(obj_head-1, obj_tail)])
-                                triple_list.append((sub, rel, obj))
-                                break
-                triple_set = set()
-                for s, r, o in triple_list:
-                    if o == '' or s == '':
-                        continue
-                    triple_set.add((s, r, o))
-                pred_list = list(triple_set)
-            else:
-                pred_list = []
-
-        pred_triples = set(pred_list)
+            pred_triples = get_batch_triples(
+                self.module,
+                inputs['input_ids'],
+                inputs['attention_mask'],
+                [inputs['token_mapping']],
+                self.id2cat,
+                h_bar=h_bar,
+                t_bar=t_bar
+            )[0]
 
         return pred_triples
+
+    def predict_batch(
+        self,
+        texts,
+        batch_size=32,
+        h_bar=0.5,
+        t_bar=0.5
+    ):
+        """
+        批量预测，batch内的subject堆叠后一次性预测object
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+            h_bar (:obj:`float`, optional, defaults to 0.5): head阈值
+            t_bar (:obj:`float`, optional, defaults to 0.5): tail阈值
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        results = []
+        with torch.no_grad():
+            for start_ in range(0, len(texts), batch_size):
+                features = [self._get_input_ids(text) for text in texts[start_:start_ + batch_size]]
+                features = DataUtils.dynamic_padding(features)
+
+                results.extend(get_batch_triples(
+                    self.module,
+                    torch.from_numpy(np.stack([f['input_ids'] for f in features])).type(torch.long).to(self.device),
+                    torch.from_numpy(np.stack([f['attention_mask'] for f in features])).type(torch.long).to(self.device),
+                    [f['token_mapping'] for f in features],
+                    self.id2cat,
+                    h_bar=h_bar,
+                    t_bar=t_bar
+                ))
+
+        return results
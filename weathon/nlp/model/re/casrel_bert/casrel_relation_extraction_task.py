@@ -1,8 +1,8 @@
 import torch
-import numpy as np
 
 from torch.utils.data import DataLoader
 from weathon.nlp.task import SequenceClassificationTask
+from weathon.nlp.model.re.casrel_bert.utils import DataPreFetcher, get_batch_triples
 
 
 def to_tup(triple_list):
@@ -12,31 +12,6 @@ def to_tup(triple_list):
     return ret
 
 
-class DataPreFetcher(object):
-    def __init__(self, loader, device):
-        self.loader = iter(loader)
-        self.stream = torch.cuda.Stream()
-        self.device = device
-        self.preload()
-
-    def preload(self):
-        try:
-            self.next_data = next(self.loader)
-        except StopIteration:
-            self.next_data = None
-            return
-        with torch.cuda.stream(self.stream):
-            for k, v in self.next_data.items():
-                if isinstance(v, torch.Tensor):
-                    self.next_data[k] = self.next_data[k].to(self.device, non_blocking=True)
-
-    def next(self):
-        torch.cuda.current_stream().wait_stream(self.stream)
-        data = self.next_data
-        self.preload()
-        return data
-
-
 class CasRelRETask(SequenceClassificationTask):
     """
     基于CasRel Bert的联合关系抽取任务的Task
@@ -210,7 +185,7 @@ class CasRelRETask(SequenceClassificationTask):
     def evaluate(
             self,
             validation_data,
-            evaluate_batch_size=1,
+            evaluate_batch_size=16,
             h_bar=0.5,
             t_bar=0.5,
             **kwargs
@@ -232,83 +207,30 @@ class CasRelRETask(SequenceClassificationTask):
         with torch.no_grad():
             while inputs is not None:
 
-                step_ += 1
-
-                token_ids = inputs['input_ids']
-                token_mapping = inputs['token_mapping'][0]
-                mask = inputs['attention_mask']
-
-                encoded_text = self.model.bert(token_ids, mask)[0]
-
-                pred_sub_heads, pred_sub_tails = self.model.get_subs(encoded_text)
-                sub_heads, sub_tails = np.where(pred_sub_heads.cpu()[0] > h_bar)[0], \
-                                       np.where(pred_sub_tails.cpu()[0] > t_bar)[0]
-
-                subjects = []
-                for sub_head in sub_heads:
-                    sub_tail = sub_tails[sub_tails >= sub_head]
-                    if len(sub_tail) > 0:
-
-                        sub_tail = sub_tail[0]
-                        subject = ''.join([token_mapping[index_] if index_ < len(token_mapping) else '' for index_ in
-                                           range(sub_head - 1, sub_tail)])
-
-                        if subject == '':
-                            continue
-                        subjects.append((subject, sub_head, sub_tail))
-
-                if subjects:
-                    triple_list = []
-                    repeated_encoded_text = encoded_text.repeat(len(subjects), 1, 1)
-                    sub_head_mapping = torch.Tensor(len(subjects), 1, encoded_text.size(1)).zero_()
-                    sub_tail_mapping = torch.Tensor(len(subjects), 1, encoded_text.size(1)).zero_()
-                    for subject_idx, subject in enumerate(subjects):
-                        sub_head_mapping[subject_idx][0][subject[1]] = 1
-                        sub_tail_mapping[subject_idx][0][subject[2]] = 1
-                    sub_tail_mapping = sub_tail_mapping.to(repeated_encoded_text)
-                    sub_head_mapping = sub_head_mapping.to(repeated_encoded_text)
-
-                    pred_obj_heads, pred_obj_tails = self.model.get_objs_for_specific_sub(
-                        sub_head_mapping,
-                        sub_tail_mapping,
-                        repeated_encoded_text
-                    )
-                    for subject_idx, subject in enumerate(subjects):
-                        sub = subject[0]
-
-                        obj_heads, obj_tails = np.where(pred_obj_heads.cpu()[subject_idx] > h_bar), np.where(
-                            pred_obj_tails.cpu()[subject_idx] > t_bar)
-                        for obj_head, rel_head in zip(*obj_heads):
-                            for obj_tail, rel_tail in zip(*obj_tails):
-                                if obj_head <= obj_tail and rel_head == rel_tail:
-                                    rel = self.id2cat[int(rel_head)]
-                                    obj = ''.join(
-                                        [token_mapping[index_] if index_ < len(token_mapping) else '' for index_ in
-                                         range(obj_head - 1, obj_tail)])
-
-                                    triple_list.append((sub, rel, obj))
-                                    break
-                    triple_set = set()
-                    for s, r, o in triple_list:
-                        if o == '' or s == '':
-                            continue
-                        triple_set.add((s, r, o))
-                    pred_list = list(triple_set)
-                else:
-                    pred_list = []
-
-                pred_triples = set(pred_list)
-
-                gold_triples = set(to_tup(inputs['label_ids'][0]))
-
-                correct_num += len(pred_triples & gold_triples)
-
-                if step_ < 11:
-                    print('pred_triples: ', pred_triples)
-                    print('gold_triples: ', gold_triples)
-
-                predict_num += len(pred_triples)
-                gold_num += len(gold_triples)
+                batch_pred_triples = get_batch_triples(
+                    self.model,
+                    inputs['input_ids'],
+                    inputs['attention_mask'],
+                    inputs['token_mapping'],
+                    self.id2cat,
+                    h_bar=h_bar,
+                    t_bar=t_bar
+                )
+
+                for pred_triples, label_ids in zip(batch_pred_triples, inputs['label_ids']):
+
+                    step_ += 1
+
+                    gold_triples = set(to_tup(label_ids))
+
+                    correct_num += len(pred_triples & gold_triples)
+
+                    if step_ < 11:
+                        print('pred_triples: ', pred_triples)
+                        print('gold_triples: ', gold_triples)
+
+                    predict_num += len(pred_triples)
+                    gold_num += len(gold_triples)
 
                 inputs = test_data_prefetcher.next()
 
@@ -0,0 +1,178 @@
+import queue
+import threading
+
+import torch
+import numpy as np
+
+
+class DataPreFetcher(object):
+    """
+    数据预取器：目标设备为GPU时在独立的cuda stream上异步拷贝下一个batch，
+    否则使用后台线程提前从DataLoader中取出batch，与模型计算重叠
+
+    Args:
+        loader: DataLoader
+        device: 模型所在设备
+        queue_size (:obj:`int`, optional, defaults to 2): 后台线程预取的batch数
+    """  # noqa: ignore flake8"
+
+    def __init__(self, loader, device, queue_size=2):
+        self.loader = iter(loader)
+        self.device = torch.device(device)
+        self.use_cuda_stream = self.device.type == 'cuda' and torch.cuda.is_available()
+
+        if self.use_cuda_stream:
+            self.stream = torch.cuda.Stream()
+            self.preload()
+        else:
+            self.queue = queue.Queue(maxsize=queue_size)
+            self.thread = threading.Thread(target=self._prefetch, daemon=True)
+            self.thread.start()
+
+    def _to_device(self, data, non_blocking=False):
+        for k, v in data.items():
+            if isinstance(v, torch.Tensor):
+                data[k] = v.to(self.device, non_blocking=non_blocking)
+        return data
+
+    def _prefetch(self):
+        try:
+            for data in self.loader:
+                self.queue.put(self._to_device(data))
+        except Exception as e:
+            self.queue.put(e)
+        self.queue.put(None)
+
+    def preload(self):
+        try:
+            self.next_data = next(self.loader)
+        except StopIteration:
+            self.next_data = None
+            return
+        with torch.cuda.stream(self.stream):
+            for k, v in self.next_data.items():
+                if isinstance(v, torch.Tensor):
+                    self.next_data[k] = v.pin_memory().to(self.device, non_blocking=True)
+
+    def next(self):
+        if not self.use_cuda_stream:
+            data = self.queue.get()
+            if isinstance(data, Exception):
+                raise data
+            return data
+
+        torch.cuda.current_stream().wait_stream(self.stream)
+        data = self.next_data
+        self.preload()
+        return data
+
+
+def _span_text(token_mapping, start, end):
+    return ''.join([token_mapping[index_] if index_ < len(token_mapping) else '' for index_ in range(start - 1, end)])
+
+
+def _match_tails(heads, tails):
+    """
+    为每个head匹配不早于它的第一个tail
+
+    Args:
+        heads (:obj:`np.ndarray`): 升序排列的head编码
+        tails (:obj:`np.ndarray`): 升序排列的tail编码
+    Returns:
+        每个head对应的tail下标，无匹配时为len(tails)
+    """  # noqa: ignore flake8"
+    return np.searchsorted(tails, heads, side='left')
+
+
+def get_batch_triples(module, input_ids, attention_mask, token_mappings, id2cat, h_bar=0.5, t_bar=0.5):
+    """
+    批量解码CasRel三元组：先批量预测所有样本的subject，再将所有样本的subject堆叠后一次性预测object和关系
+
+    Args:
+        module: CasRel模型
+        input_ids (:obj:`torch.Tensor`): 输入id，shape为(batch_size, seq_len)
+        attention_mask (:obj:`torch.Tensor`): mask，shape为(batch_size, seq_len)
+        token_mappings (:obj:`list`): 每个样本的token到文本的映射
+        id2cat (:obj:`dict`): 关系id到关系名称的映射
+        h_bar (:obj:`float`, optional, defaults to 0.5): head阈值
+        t_bar (:obj:`float`, optional, defaults to 0.5): tail阈值
+    Returns:
+        每个样本预测的三元组集合
+    """  # noqa: ignore flake8"
+
+    batch_size, seq_len = input_ids.shape
+    triples = [set() for _ in range(batch_size)]
+
+    encoded_text = module.bert(input_ids, attention_mask)[0]
+    mask = attention_mask.bool()
+
+    pred_sub_heads, pred_sub_tails = module.get_subs(encoded_text)
+    sub_heads = ((pred_sub_heads.squeeze(-1) > h_bar) & mask).cpu().numpy()
+    sub_tails = ((pred_sub_tails.squeeze(-1) > t_bar) & mask).cpu().numpy()
+
+    # subject：以 sample_idx * seq_len + position 编码，在同一样本内为每个head匹配最近的tail
+    head_samples, head_positions = np.nonzero(sub_heads)
+    tail_samples, tail_positions = np.nonzero(sub_tails)
+    head_keys = head_samples * seq_len + head_positions
+    tail_keys = tail_samples * seq_len + tail_positions
+
+    tail_index = _match_tails(head_keys, tail_keys)
+    valid = tail_index < len(tail_keys)
+    valid[valid] = tail_samples[tail_index[valid]] == head_samples[valid]
+
+    subjects = []
+    for sample_, head_, tail_ in zip(head_samples[valid].tolist(),
+                                     head_positions[valid].tolist(),
+                                     tail_positions[tail_index[valid]].tolist()):
+        subject_ = _span_text(token_mappings[sample_], head_, tail_)
+        if subject_ == '':
+            continue
+        subjects.append((sample_, subject_, head_, tail_))
+
+    if not subjects:
+        return triples
+
+    subject_samples = torch.tensor([subject_[0] for subject_ in subjects], device=encoded_text.device)
+    subject_heads = torch.tensor([subject_[2] for subject_ in subjects], device=encoded_text.device)
+    subject_tails = torch.tensor([subject_[3] for subject_ in subjects], device=encoded_text.device)
+
+    sub_head_mapping = encoded_text.new_zeros((len(subjects), 1, seq_len))
+    sub_tail_mapping = encoded_text.new_zeros((len(subjects), 1, seq_len))
+    sub_head_mapping.scatter_(2, subject_heads.view(-1, 1, 1), 1)
+    sub_tail_mapping.scatter_(2, subject_tails.view(-1, 1, 1), 1)
+
+    pred_obj_heads, pred_obj_tails = module.get_objs_for_specific_sub(
+        sub_head_mapping,
+        sub_tail_mapping,
+        encoded_text.index_select(0, subject_samples)
+    )
+
+    subject_mask = mask.index_select(0, subject_samples).unsqueeze(-1)
+    obj_heads = ((pred_obj_heads > h_bar) & subject_mask).cpu().numpy()
+    obj_tails = ((pred_obj_tails > t_bar) & subject_mask).cpu().numpy()
+
+    # object：以 (subject_idx, relation, position) 编码，同一subject、同一关系下为每个head匹配最近的tail
+    rel_num = obj_heads.shape[-1]
+    head_subjects, head_positions, head_rels = np.nonzero(obj_heads)
+    tail_subjects, tail_positions, tail_rels = np.nonzero(obj_tails)
+    head_keys = (head_subjects * rel_num + head_rels) * seq_len + head_positions
+    tail_keys = (tail_subjects * rel_num + tail_rels) * seq_len + tail_positions
+    tail_order = np.argsort(tail_keys, kind='stable')
+    tail_keys = tail_keys[tail_order]
+    tail_positions = tail_positions[tail_order]
+
+    tail_index = _match_tails(head_keys, tail_keys)
+    valid = tail_index < len(tail_keys)
+    valid[valid] = tail_keys[tail_index[valid]] // seq_len == head_keys[valid] // seq_len
+
+    for subject_idx_, rel_, head_, tail_ in zip(head_subjects[valid].tolist(),
+                                                head_rels[valid].tolist(),
+                                                head_positions[valid].tolist(),
+                                                tail_positions[tail_index[valid]].tolist()):
+        sample_, subject_ = subjects[subject_idx_][:2]
+        object_ = _span_text(token_mappings[sample_], head_, tail_)
+        if object_ == '':
+            continue
+        triples[sample_].add((subject_, id2cat[rel_], object_))
+
+    return triples
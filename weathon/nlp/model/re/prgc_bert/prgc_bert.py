@@ -3,7 +3,6 @@ import torch
 from torch import nn
 from transformers import BertModel
 from transformers import BertPreTrainedModel
-from collections import Counter
 
 
 class MultiNonLinearClassifier(nn.Module):
@@ -22,6 +21,46 @@ class MultiNonLinearClassifier(nn.Module):
         return features_output
 
 
+class FactorizedCorresClassifier(nn.Module):
+    """
+    分解形式的global correspondence分类器，与对拼接向量使用MultiNonLinearClassifier等价：
+    W[a;b] = W₁a + W₂b，主体和客体各自投影一次后在隐层空间广播成(bs, s, s, h)，
+    不再构造(bs, s, s, 2h)的拼接张量
+
+    参数形状与MultiNonLinearClassifier(hidden_size * 2, ...)一致(第一层2h -> h，第二层h -> tag_size)，
+    可直接加载其权重，加载时将第一层linear的权重按列切分
+    """  # noqa: ignore flake8"
+
+    def __init__(self, hidden_size, tag_size, dropout_rate):
+        super(FactorizedCorresClassifier, self).__init__()
+        self.tag_size = tag_size
+        self.sub_linear = nn.Linear(hidden_size, hidden_size)
+        self.obj_linear = nn.Linear(hidden_size, hidden_size, bias=False)
+        self.hidden2tag = nn.Linear(hidden_size, self.tag_size)
+        self.dropout = nn.Dropout(dropout_rate)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # 兼容拼接模式的checkpoint：linear.weight的shape为(h, 2h)，前h列作用于主体，后h列作用于客体
+        weight_key = prefix + 'linear.weight'
+        if weight_key in state_dict:
+            sub_weight, obj_weight = state_dict.pop(weight_key).chunk(2, dim=1)
+            state_dict[prefix + 'sub_linear.weight'] = sub_weight
+            state_dict[prefix + 'obj_linear.weight'] = obj_weight
+        bias_key = prefix + 'linear.bias'
+        if bias_key in state_dict:
+            state_dict[prefix + 'sub_linear.bias'] = state_dict.pop(bias_key)
+
+        super(FactorizedCorresClassifier, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def forward(self, sequence_output):
+        # (bs, s, 1, h) + (bs, 1, s, h) -> (bs, s, s, h)
+        features_tmp = self.sub_linear(sequence_output).unsqueeze(2) + self.obj_linear(sequence_output).unsqueeze(1)
+        features_tmp = nn.ReLU()(features_tmp)
+        features_tmp = self.dropout(features_tmp)
+        features_output = self.hidden2tag(features_tmp)
+        return features_output
+
+
 class SequenceLabelForSO(nn.Module):
     def __init__(self, hidden_size, tag_size, dropout_rate):
         super(SequenceLabelForSO, self).__init__()
@@ -51,6 +90,7 @@ class PRGCBert(BertPreTrainedModel):
         emb_fusion (:obj:`string`, optional, defaults to `concat`): 关系嵌入与bert输出向量的融合方式，concat是拼接，sum是加和
         corres_mode (:obj:`string` or :obj:`string`, optional, defaults to None): 生成global correspondence矩阵的方式，
                                                                                   biaffine是使用biaffine交叉主体和客体向量进行生成，比较节约显存，
+                                                                                  factorized是将拼接后的全连接层分解为主体、客体各自的投影，结果与None等价且显存占用更小，可直接加载None模式训练的权重，
                                                                                   None则是原论文方式，通过拼接向量再使用全连接层生成
         biaffine_hidden_size (:obj:`int`, optional, defaults to 128): 若使用biaffine生成global correspondence矩阵时，biaffine的隐层size
 
@@ -118,6 +158,13 @@ class PRGCBert(BertPreTrainedModel):
                                 out_features=biaffine_hidden_size),
                 torch.nn.ReLU()
             )
+        elif self.corres_mode == 'factorized':
+            # global correspondence
+            self.global_corres = FactorizedCorresClassifier(
+                config.hidden_size,
+                1,
+                drop_prob
+            )
         else:
             # global correspondence
             self.global_corres = MultiNonLinearClassifier(
@@ -175,6 +222,9 @@ class PRGCBert(BertPreTrainedModel):
             obj_extend = self.end_encoder(sequence_output)
 
             corres_pred = torch.einsum('bxi,ioj,byj->bxyo', sub_extend, self.U, obj_extend).squeeze(-1)
+        elif self.corres_mode == 'factorized':
+            # (bs, seq_len, seq_len)
+            corres_pred = self.global_corres(sequence_output).squeeze(-1)
         else:
             sub_extend = sequence_output.unsqueeze(2).expand(-1, -1, seq_len, -1)  # (bs, s, s, h)
             obj_extend = sequence_output.unsqueeze(1).expand(-1, seq_len, -1, -1)  # (bs, s, s, h)
@@ -192,33 +242,20 @@ class PRGCBert(BertPreTrainedModel):
                                           torch.zeros(rel_pred.size(), device=rel_pred.device))
 
             # if potential relation is null
-            for idx, sample in enumerate(rel_pred_onehot):
-                if 1 not in sample:
-                    # (rel_num,)
-                    max_index = torch.argmax(rel_pred[idx])
-                    sample[max_index] = 1
-                    rel_pred_onehot[idx] = sample
+            empty_idxs = torch.nonzero(rel_pred_onehot.sum(dim=-1) == 0, as_tuple=True)[0]
+            rel_pred_onehot[empty_idxs, torch.argmax(rel_pred[empty_idxs], dim=-1)] = 1
 
             # 2*(sum(x_i),)
             bs_idxs, pred_rels = torch.nonzero(rel_pred_onehot, as_tuple=True)
             # get x_i
-            xi_dict = Counter(bs_idxs.tolist())
-            xi = [xi_dict[idx] for idx in range(bs)]
-
-            pos_seq_output = []
-            pos_potential_rel = []
-            pos_attention_mask = []
-            for bs_idx, rel_idx in zip(bs_idxs, pred_rels):
-                # (seq_len, h)
-                pos_seq_output.append(sequence_output[bs_idx])
-                pos_attention_mask.append(attention_mask[bs_idx])
-                pos_potential_rel.append(rel_idx)
+            xi = torch.bincount(bs_idxs, minlength=bs).tolist()
+
             # (sum(x_i), seq_len, h)
-            sequence_output = torch.stack(pos_seq_output, dim=0)
+            sequence_output = sequence_output.index_select(0, bs_idxs)
             # (sum(x_i), seq_len)
-            attention_mask = torch.stack(pos_attention_mask, dim=0)
+            attention_mask = attention_mask.index_select(0, bs_idxs)
             # (sum(x_i),)
-            potential_rels = torch.stack(pos_potential_rel, dim=0)
+            potential_rels = pred_rels
 
         # (bs/sum(x_i), h)
         rel_emb = self.rel_embedding(potential_rels)
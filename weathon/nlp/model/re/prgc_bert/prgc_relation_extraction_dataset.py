@@ -21,6 +21,8 @@ class PRGCREDataset(BaseDataset):
         is_test (:obj:`bool`, optional, defaults to False): 数据集是否为测试集数据
     """  # noqa: ignore flake8"
 
+    _converted_attributes = ('tokenizer',)
+
     def __init__(self, *args, **kwargs):
         super(PRGCREDataset, self).__init__(*args, **kwargs)
         self.sublabel2id = {"B-H": 1, "I-H": 2, "O": 0}
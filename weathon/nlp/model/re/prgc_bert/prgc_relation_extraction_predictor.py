@@ -1,99 +1,7 @@
 import torch
 import numpy as np
-
-
-def get_chunk_type(tok, idx_to_tag):
-    """
-    Args:
-        tok: id of token, ex 4
-        idx_to_tag: dictionary {4: "B-PER", ...}
-    Returns:
-        tuple: "B", "PER"
-    """
-    tag_name = idx_to_tag[tok]
-    content = tag_name.split('-')
-    tag_class = content[0]
-    if len(content) == 1:
-        return tag_class
-    ht = content[-1]
-    return tag_class, ht
-
-
-def get_chunks(seq, tags):
-    """Given a sequence of tags, group entities and their position
-    Args:
-        seq: np.array[4, 4, 0, 0, ...] sequence of labels
-        tags: dict["O"] = 4
-    Returns:
-        list of (chunk_type, chunk_start, chunk_end)
-    Example:
-        seq = [4, 5, 0, 3]
-        tags = {"B-PER": 4, "I-PER": 5, "B-LOC": 3}
-        result = [("PER", 0, 2), ("LOC", 3, 4)]
-    """
-    default1 = tags['O']
-    idx_to_tag = {idx: tag for tag, idx in tags.items()}
-    chunks = []
-    chunk_type, chunk_start = None, None
-    for i, tok in enumerate(seq):
-        # End of a chunk 1
-        if tok == default1 and chunk_type is not None:
-            # Add a chunk.
-            chunk = (chunk_type, chunk_start, i)
-            chunks.append(chunk)
-            chunk_type, chunk_start = None, None
-
-        # End of a chunk + start of a chunk!
-        elif tok != default1:
-            res = get_chunk_type(tok, idx_to_tag)
-            if len(res) == 1:
-                continue
-            tok_chunk_class, ht = get_chunk_type(tok, idx_to_tag)
-            tok_chunk_type = ht
-            if chunk_type is None:
-                chunk_type, chunk_start = tok_chunk_type, i
-            elif tok_chunk_type != chunk_type or tok_chunk_class == "B":
-                chunk = (chunk_type, chunk_start, i)
-                chunks.append(chunk)
-                chunk_type, chunk_start = tok_chunk_type, i
-        else:
-            pass
-
-    # end condition
-    if chunk_type is not None:
-        chunk = (chunk_type, chunk_start, len(seq))
-        chunks.append(chunk)
-
-    return chunks
-
-
-def tag_mapping_corres(predict_tags, pre_corres, pre_rels=None, label2idx_sub=None, label2idx_obj=None):
-    """
-    Args:
-        predict_tags: np.array, (xi, 2, max_sen_len)
-        pre_corres: (seq_len, seq_len)
-        pre_rels: (xi,)
-    """
-    rel_num = predict_tags.shape[0]
-    pre_triples = []
-    for idx in range(rel_num):
-        heads, tails = [], []
-        pred_chunks_sub = get_chunks(predict_tags[idx][0], label2idx_sub)
-        pred_chunks_obj = get_chunks(predict_tags[idx][1], label2idx_obj)
-        pred_chunks = pred_chunks_sub + pred_chunks_obj
-        for ch in pred_chunks:
-            if ch[0] == 'H':
-                heads.append(ch)
-            elif ch[0] == 'T':
-                tails.append(ch)
-        retain_hts = [(h, t) for h in heads for t in tails if pre_corres[h[1]][t[1]] == 1]
-        for h_t in retain_hts:
-            if pre_rels is not None:
-                triple = list(h_t) + [pre_rels[idx]]
-            else:
-                triple = list(h_t) + [idx]
-            pre_triples.append(tuple(triple))
-    return pre_triples
+from weathon.utils.data_utils import DataUtils
+from weathon.nlp.model.re.prgc_bert.utils import tag_mapping_corres
 
 
 class PRGCREPredictor(object):
@@ -158,7 +66,7 @@ class PRGCREPredictor(object):
         self,
         text
     ):
-        if self.tokenizer.tokenizer_type == 'transfomer':
+        if self.tokenizer.tokenizer_type == 'transformer':
             return self._convert_to_transfomer_ids(text)
         else:
             raise ValueError("The tokenizer type does not exist")
@@ -176,6 +84,48 @@ class PRGCREPredictor(object):
 
         return inputs
 
+    def _get_triples(self, inputs, logits, token_mappings):
+        output_sub, output_obj, corres_pred, pred_rels, xi = logits
+
+        pred_seq_sub = torch.argmax(output_sub, dim=-1)
+        pred_seq_obj = torch.argmax(output_obj, dim=-1)
+        pred_seqs = torch.stack([pred_seq_sub, pred_seq_obj], dim=1)
+
+        mask_tmp1 = inputs['attention_mask'].unsqueeze(-1)
+        mask_tmp2 = inputs['attention_mask'].unsqueeze(1)
+        corres_mask = mask_tmp1 * mask_tmp2
+
+        pre_corres = (torch.sigmoid(corres_pred) * corres_mask > self.corres_threshold).long()
+
+        pred_seqs = pred_seqs.detach().cpu().numpy()
+        pre_corres = pre_corres.detach().cpu().numpy()
+        pred_rels = pred_rels.detach().cpu().numpy()
+
+        # 按每个样本预测出的关系数xi切分结果
+        xi_index = np.concatenate(([0], np.cumsum(xi)))
+
+        results = []
+        for idx, token_mapping in enumerate(token_mappings):
+            pre_triples = tag_mapping_corres(
+                predict_tags=pred_seqs[xi_index[idx]:xi_index[idx + 1]],
+                pre_corres=pre_corres[idx],
+                pre_rels=pred_rels[xi_index[idx]:xi_index[idx + 1]],
+                label2idx_sub=self.sublabel2id,
+                label2idx_obj=self.oblabel2id
+            )
+
+            triple_set = set()
+            for _pre_triple in pre_triples:
+                sub = ''.join([token_mapping[index_] for index_ in range(_pre_triple[0][1]-1, _pre_triple[0][2]-1)])
+                obj = ''.join([token_mapping[index_] for index_ in range(_pre_triple[1][1]-1, _pre_triple[1][2]-1)])
+                rel = self.id2cat[_pre_triple[2]]
+
+                triple_set.add((sub, rel, obj))
+
+            results.append(list(triple_set))
+
+        return results
+
     def predict_one_sample(
         self,
         text='',
@@ -189,47 +139,36 @@ class PRGCREPredictor(object):
 
             logits = self.module(**inputs)
 
-            token_mapping = inputs['token_mapping']
+            return self._get_triples(inputs, logits, [inputs['token_mapping']])[0]
 
-            output_sub, output_obj, corres_pred, pred_rels, xi = logits
-
-            pred_seq_sub = torch.argmax(torch.softmax(output_sub, dim=-1), dim=-1)
-            pred_seq_obj = torch.argmax(torch.softmax(output_obj, dim=-1), dim=-1)
-            pred_seqs = torch.cat([pred_seq_sub.unsqueeze(1), pred_seq_obj.unsqueeze(1)], dim=1)
-
-            mask_tmp1 = inputs['attention_mask'].unsqueeze(-1)
-            mask_tmp2 = inputs['attention_mask'].unsqueeze(1)
-            corres_mask = mask_tmp1 * mask_tmp2
+    def predict_batch(
+        self,
+        texts,
+        batch_size=32
+    ):
+        """
+        批量预测，每个batch只进行一次编码，再根据模型返回的xi将各关系的解码结果切分回对应的样本
 
-            corres_pred = torch.sigmoid(corres_pred) * corres_mask
-            pre_corres = torch.where(
-                corres_pred > self.corres_threshold,
-                torch.ones(corres_pred.size(), device=corres_pred.device),
-                torch.zeros(corres_pred.size(), device=corres_pred.device)
-            )
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
 
-            pred_seqs = pred_seqs.detach().cpu().numpy()
-            pre_corres = pre_corres.detach().cpu().numpy()
+        self.module.eval()
 
-            xi = np.array(xi)
-            pred_rels = pred_rels.detach().cpu().numpy()
-            xi_index = np.cumsum(xi).tolist()
-            xi_index.insert(0, 0)
+        results = []
+        with torch.no_grad():
+            for start_ in range(0, len(texts), batch_size):
+                features = [self._get_input_ids(text) for text in texts[start_:start_ + batch_size]]
+                features = DataUtils.dynamic_padding(features)
 
-            pre_triples = tag_mapping_corres(
-                predict_tags=pred_seqs[xi_index[0]:xi_index[1]],
-                pre_corres=pre_corres[0],
-                pre_rels=pred_rels[xi_index[0]:xi_index[1]],
-                label2idx_sub=self.sublabel2id,
-                label2idx_obj=self.oblabel2id
-            )
+                inputs = {
+                    col: torch.from_numpy(np.stack([f[col] for f in features])).type(torch.long).to(self.device)
+                    for col in ['input_ids', 'attention_mask']
+                }
 
-            triple_set = set()
-            for _pre_triple in pre_triples:
-                sub = ''.join([token_mapping[index_] for index_ in range(_pre_triple[0][1]-1, _pre_triple[0][2]-1)])
-                obj = ''.join([token_mapping[index_] for index_ in range(_pre_triple[1][1]-1, _pre_triple[1][2]-1)])
-                rel = self.id2cat[_pre_triple[2]]
+                logits = self.module(**inputs)
 
-                triple_set.add((sub, rel, obj))
+                results.extend(self._get_triples(inputs, logits, [f['token_mapping'] for f in features]))
 
-        return list(triple_set)
+        return results
@@ -0,0 +1,165 @@
+import numpy as np
+
+from functools import lru_cache
+
+
+def get_chunk_type(tok, idx_to_tag):
+    """
+    Args:
+        tok: id of token, ex 4
+        idx_to_tag: dictionary {4: "B-PER", ...}
+    Returns:
+        tuple: "B", "PER"
+    """
+    tag_name = idx_to_tag[tok]
+    content = tag_name.split('-')
+    tag_class = content[0]
+    if len(content) == 1:
+        return tag_class
+    ht = content[-1]
+    return tag_class, ht
+
+
+@lru_cache(maxsize=None)
+def _get_tag_tables(tag_items):
+    """
+    将标签字典转换为查表数组，按标签字典缓存，避免每次解码重建idx_to_tag
+
+    Returns:
+        chunk_types: 实体类型名称列表
+        type_table: 标签id -> 实体类型下标，O为-1，无法解析类型的标签为-2
+        begin_table: 标签id -> 是否为B标签
+    """
+    tags = dict(tag_items)
+    idx_to_tag = {idx: tag for tag, idx in tags.items()}
+    size = max(idx_to_tag) + 1
+
+    chunk_types = []
+    type_table = np.full(size, -2, dtype=np.int64)
+    begin_table = np.zeros(size, dtype=bool)
+    for idx, tag in idx_to_tag.items():
+        if idx == tags['O']:
+            type_table[idx] = -1
+            continue
+        res = get_chunk_type(idx, idx_to_tag)
+        if len(res) == 1:
+            continue
+        tag_class, chunk_type = res
+        if chunk_type not in chunk_types:
+            chunk_types.append(chunk_type)
+        type_table[idx] = chunk_types.index(chunk_type)
+        begin_table[idx] = tag_class == 'B'
+
+    return chunk_types, type_table, begin_table
+
+
+def get_chunk_spans(seqs, tags):
+    """
+    批量提取BIO chunk：在每行标签序列上通过前后类型比较找到chunk的起点和终点
+
+    Args:
+        seqs: np.array, (n, seq_len)
+        tags: dict["O"] = 4
+    Returns:
+        rows, chunk_type_ids, starts, ends: 每个chunk所在的行、类型下标、起点和终点(不含)
+        chunk_types: 类型下标对应的类型名称
+    """
+    chunk_types, type_table, begin_table = _get_tag_tables(tuple(sorted(tags.items())))
+
+    seqs = np.asarray(seqs)
+    n, seq_len = seqs.shape
+
+    types = type_table[seqs].ravel()
+    begins = begin_table[seqs].ravel()
+    positions = np.tile(np.arange(seq_len), n)
+    rows = np.repeat(np.arange(n), seq_len)
+
+    # 无法解析类型的标签既不开始也不结束chunk，直接跳过
+    keep = types != -2
+    types, begins, positions, rows = types[keep], begins[keep], positions[keep], rows[keep]
+
+    row_begin = np.ones(len(types), dtype=bool)
+    row_begin[1:] = rows[1:] != rows[:-1]
+
+    prev_types = np.empty_like(types)
+    prev_types[0:1] = -1
+    prev_types[1:] = types[:-1]
+    prev_types[row_begin] = -1
+
+    is_start = (types >= 0) & (begins | (types != prev_types))
+    # 遇到O或新chunk的起点时，前一个chunk结束
+    is_break = (types == -1) | is_start
+
+    start_index = np.flatnonzero(is_start)
+    break_index = np.flatnonzero(is_break)
+
+    next_break = np.searchsorted(break_index, start_index, side='right')
+    ends = np.full(len(start_index), seq_len, dtype=np.int64)
+    has_break = next_break < len(break_index)
+    next_break_index = break_index[next_break[has_break]]
+    # 下一个断点需要在同一行内，否则chunk延续到行尾
+    same_row = rows[next_break_index] == rows[start_index[has_break]]
+    ends[np.flatnonzero(has_break)[same_row]] = positions[next_break_index[same_row]]
+
+    return rows[start_index], types[start_index], positions[start_index], ends, chunk_types
+
+
+def get_chunks(seq, tags):
+    """Given a sequence of tags, group entities and their position
+    Args:
+        seq: np.array[4, 4, 0, 0, ...] sequence of labels
+        tags: dict["O"] = 4
+    Returns:
+        list of (chunk_type, chunk_start, chunk_end)
+    Example:
+        seq = [4, 5, 0, 3]
+        tags = {"B-PER": 4, "I-PER": 5, "B-LOC": 3}
+        result = [("PER", 0, 2), ("LOC", 3, 4)]
+    """
+    _, type_ids, starts, ends, chunk_types = get_chunk_spans(np.asarray(seq).reshape(1, -1), tags)
+    return [(chunk_types[type_id], start, end)
+            for type_id, start, end in zip(type_ids.tolist(), starts.tolist(), ends.tolist())]
+
+
+def tag_mapping_corres(predict_tags, pre_corres, pre_rels=None, label2idx_sub=None, label2idx_obj=None):
+    """
+    Args:
+        predict_tags: np.array, (xi, 2, max_sen_len)
+        pre_corres: (seq_len, seq_len)
+        pre_rels: (xi,)
+    """
+    rel_num = predict_tags.shape[0]
+    if rel_num == 0:
+        return []
+
+    # 主体序列和客体序列的chunk合并后按行排序，行内保持主体在前、客体在后
+    sub_spans = get_chunk_spans(predict_tags[:, 0], label2idx_sub)
+    obj_spans = get_chunk_spans(predict_tags[:, 1], label2idx_obj)
+
+    chunks = []
+    for rows, type_ids, starts, ends, chunk_types in (sub_spans, obj_spans):
+        names = np.asarray(chunk_types + [''], dtype=object)[type_ids]
+        chunks.append((rows, names, starts, ends))
+    rows, names, starts, ends = (np.concatenate(column) for column in zip(*chunks))
+    order = np.argsort(rows, kind='stable')
+    rows, names, starts, ends = rows[order], names[order], starts[order], ends[order]
+
+    is_head = names == 'H'
+    is_tail = names == 'T'
+    row_bounds = np.searchsorted(rows, np.arange(rel_num + 1))
+
+    pre_triples = []
+    for idx in range(rel_num):
+        row_slice = slice(row_bounds[idx], row_bounds[idx + 1])
+        head_index = np.flatnonzero(is_head[row_slice]) + row_bounds[idx]
+        tail_index = np.flatnonzero(is_tail[row_slice]) + row_bounds[idx]
+        if len(head_index) == 0 or len(tail_index) == 0:
+            continue
+
+        # 在主体起点和客体起点交叉得到的correspondence子矩阵上取非零位置
+        pair_heads, pair_tails = np.nonzero(pre_corres[np.ix_(starts[head_index], starts[tail_index])] == 1)
+        rel = pre_rels[idx] if pre_rels is not None else idx
+        for h, t in zip(head_index[pair_heads].tolist(), tail_index[pair_tails].tolist()):
+            pre_triples.append((('H', int(starts[h]), int(ends[h])), ('T', int(starts[t]), int(ends[t])), rel))
+
+    return pre_triples
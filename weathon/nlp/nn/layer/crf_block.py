@@ -6,6 +6,132 @@ import torch.nn as nn
 from typing import List, Optional
 
 
+@torch.jit.script
+def crf_log_partition(emissions: torch.Tensor,
+                      mask: torch.Tensor,
+                      start_transitions: torch.Tensor,
+                      end_transitions: torch.Tensor,
+                      transitions: torch.Tensor) -> torch.Tensor:
+    """Forward algorithm compiled with TorchScript.
+    Args:
+        emissions: ``(seq_length, batch_size, num_tags)``
+        mask: bool tensor of size ``(seq_length, batch_size)``
+    Returns:
+        log partition of size ``(batch_size,)``
+    """
+    # shape: (batch_size, num_tags)
+    score = start_transitions + emissions[0]
+    for i in range(1, emissions.size(0)):
+        # shape: (batch_size, num_tags)
+        next_score = torch.logsumexp(score.unsqueeze(2) + transitions + emissions[i].unsqueeze(1), dim=1)
+        score = torch.where(mask[i].unsqueeze(1), next_score, score)
+
+    return torch.logsumexp(score + end_transitions, dim=1)
+
+
+@torch.jit.script
+def crf_viterbi_decode(emissions: torch.Tensor,
+                       mask: torch.Tensor,
+                       start_transitions: torch.Tensor,
+                       end_transitions: torch.Tensor,
+                       transitions: torch.Tensor,
+                       pad_tag: int) -> torch.Tensor:
+    """Viterbi algorithm compiled with TorchScript.
+    Args:
+        emissions: ``(seq_length, batch_size, num_tags)``
+        mask: bool tensor of size ``(seq_length, batch_size)``
+    Returns:
+        best tag sequence of size ``(seq_length, batch_size)``
+    """
+    seq_length = emissions.size(0)
+
+    # shape: (batch_size, num_tags)
+    score = start_transitions + emissions[0]
+    # history[i] stores the best previous tag for every tag at timestep i
+    history = torch.zeros(emissions.shape, dtype=torch.long, device=emissions.device)
+    for i in range(1, seq_length):
+        next_score, indices = (score.unsqueeze(2) + transitions + emissions[i].unsqueeze(1)).max(dim=1)
+        score = torch.where(mask[i].unsqueeze(1), next_score, score)
+        history[i] = indices
+
+    # shape: (batch_size,)
+    end_tag = (score + end_transitions).argmax(dim=1)
+    seq_ends = mask.long().sum(dim=0) - 1
+
+    # trace back from the last timestep; samples shorter than the current timestep keep
+    # their end tag until the backtrace reaches their last valid position
+    best_tags = torch.empty((seq_length, emissions.size(1)), dtype=torch.long, device=emissions.device)
+    cur_tag = end_tag
+    best_tags[seq_length - 1] = cur_tag
+    for i in range(seq_length - 1, 0, -1):
+        prev_tag = history[i].gather(1, cur_tag.unsqueeze(1)).squeeze(1)
+        cur_tag = torch.where(seq_ends >= i, prev_tag, end_tag)
+        best_tags[i - 1] = cur_tag
+
+    return torch.where(mask, best_tags, torch.full_like(best_tags, pad_tag))
+
+
+@torch.jit.script
+def crf_viterbi_decode_nbest(emissions: torch.Tensor,
+                             mask: torch.Tensor,
+                             start_transitions: torch.Tensor,
+                             end_transitions: torch.Tensor,
+                             transitions: torch.Tensor,
+                             nbest: int,
+                             pad_tag: int) -> torch.Tensor:
+    """N-best Viterbi algorithm compiled with TorchScript.
+    Args:
+        emissions: ``(seq_length, batch_size, num_tags)``
+        mask: bool tensor of size ``(seq_length, batch_size)``
+    Returns:
+        n-best tag sequences of size ``(nbest, batch_size, seq_length)``
+    """
+    seq_length, batch_size, num_tags = emissions.size(0), emissions.size(1), emissions.size(2)
+    device = emissions.device
+
+    # shape: (batch_size, num_tags, nbest)
+    score = (start_transitions + emissions[0]).unsqueeze(-1).expand(-1, -1, nbest)
+    history_idx = torch.zeros((seq_length, batch_size, num_tags, nbest), dtype=torch.long, device=device)
+    oor_idx = torch.zeros((batch_size, num_tags, nbest), dtype=torch.long, device=device)
+
+    for i in range(1, seq_length):
+        if i == 1:
+            # shape: (batch_size, num_tags, num_tags)
+            next_score = score[:, :, 0].unsqueeze(-1) + transitions + emissions[i].unsqueeze(1)
+        else:
+            # shape: (batch_size, num_tags, nbest, num_tags)
+            next_score = score.unsqueeze(-1) + transitions.unsqueeze(1) + emissions[i].unsqueeze(1).unsqueeze(2)
+
+        # shape: (batch_size, nbest, num_tags)
+        next_score, indices = next_score.reshape(batch_size, -1, num_tags).topk(nbest, dim=1)
+        if i == 1:
+            indices = indices * nbest
+
+        step_mask = mask[i].unsqueeze(-1).unsqueeze(-1)
+        score = torch.where(step_mask, next_score.transpose(2, 1), score)
+        history_idx[i - 1] = torch.where(step_mask, indices.transpose(2, 1), oor_idx)
+
+    # shape: (batch_size, nbest)
+    end_score = score + end_transitions.unsqueeze(-1)
+    _, end_tag = end_score.reshape(batch_size, -1).topk(nbest, dim=1)
+
+    # insert the best tags at each sequence end (last position with mask == 1)
+    seq_ends = mask.long().sum(dim=0) - 1
+    history_idx = history_idx.transpose(1, 0).contiguous()
+    history_idx.scatter_(1, seq_ends.view(-1, 1, 1, 1).expand(-1, 1, num_tags, nbest),
+                         end_tag.view(-1, 1, 1, nbest).expand(-1, 1, num_tags, nbest))
+    history_idx = history_idx.transpose(1, 0).contiguous()
+
+    best_tags_arr = torch.zeros((seq_length, batch_size, nbest), dtype=torch.long, device=device)
+    best_tags = torch.arange(nbest, dtype=torch.long, device=device).view(1, -1).expand(batch_size, -1)
+    for idx in range(seq_length - 1, -1, -1):
+        best_tags = torch.gather(history_idx[idx].view(batch_size, -1), 1, best_tags)
+        best_tags_arr[idx] = best_tags.view(batch_size, -1) // nbest
+
+    oor_tag = torch.full_like(best_tags_arr, pad_tag)
+    return torch.where(mask.unsqueeze(-1), best_tags_arr, oor_tag).permute(2, 1, 0)
+
+
 class CRF(nn.Module):
     """Conditional random field.
     This module implements a conditional random field [LMP01]_. The forward computation
@@ -175,245 +301,84 @@ class CRF(nn.Module):
         # emissions: (seq_length, batch_size, num_tags)
         # tags: (seq_length, batch_size)
         # mask: (seq_length, batch_size)
-        seq_length, batch_size = tags.shape
+        batch_size = tags.size(1)
         mask = mask.float()
 
-        # Start transition score and first emission
-        # shape: (batch_size,)
-        score = self.start_transitions[tags[0]]
-        score += emissions[0, torch.arange(batch_size), tags[0]]
+        # Emission score of every gold tag
+        # shape: (seq_length, batch_size)
+        emission_scores = emissions.gather(2, tags.unsqueeze(2)).squeeze(2)
 
-        for i in range(1, seq_length):
-            # Transition score to next tag, only added if next timestep is valid (mask == 1)
-            # shape: (batch_size,)
-            score += self.transitions[tags[i - 1], tags[i]] * mask[i]
+        # Transition score between consecutive gold tags
+        # shape: (seq_length - 1, batch_size)
+        transition_scores = self.transitions[tags[:-1], tags[1:]]
 
-            # Emission score for next tag, only added if next timestep is valid (mask == 1)
-            # shape: (batch_size,)
-            score += emissions[i, torch.arange(batch_size), tags[i]] * mask[i]
+        # Start transition score and first emission, then transitions and emissions of
+        # the following timesteps, only added if the timestep is valid (mask == 1)
+        # shape: (batch_size,)
+        score = self.start_transitions[tags[0]] + emission_scores[0]
+        score = score + ((transition_scores + emission_scores[1:]) * mask[1:]).sum(dim=0)
 
         # End transition score
         # shape: (batch_size,)
         seq_ends = mask.long().sum(dim=0) - 1
-        # shape: (batch_size,)
-        last_tags = tags[seq_ends, torch.arange(batch_size)]
-        # shape: (batch_size,)
-        score += self.end_transitions[last_tags]
+        last_tags = tags[seq_ends, torch.arange(batch_size, device=tags.device)]
+        score = score + self.end_transitions[last_tags]
 
         return score
 
+    @staticmethod
+    def _truncate(emissions: torch.Tensor, mask: torch.ByteTensor):
+        # Drop the trailing timesteps that are padding for every sequence in the batch
+        # emissions: (seq_length, batch_size, num_tags)
+        # mask: (seq_length, batch_size)
+        max_length = int(mask.long().sum(dim=0).max())
+        return emissions[:max_length], mask[:max_length].bool()
+
     def _compute_normalizer(self, emissions: torch.Tensor,
                             mask: torch.ByteTensor) -> torch.Tensor:
         # emissions: (seq_length, batch_size, num_tags)
         # mask: (seq_length, batch_size)
-        seq_length = emissions.size(0)
-
-        # Start transition score and first emission; score has size of
-        # (batch_size, num_tags) where for each batch, the j-th column stores
-        # the score that the first timestep has tag j
-        # shape: (batch_size, num_tags)
-        score = self.start_transitions + emissions[0]
-
-        for i in range(1, seq_length):
-            # Broadcast score for every possible next tag
-            # shape: (batch_size, num_tags, 1)
-            broadcast_score = score.unsqueeze(2)
-
-            # Broadcast emission score for every possible current tag
-            # shape: (batch_size, 1, num_tags)
-            broadcast_emissions = emissions[i].unsqueeze(1)
-
-            # Compute the score tensor of size (batch_size, num_tags, num_tags) where
-            # for each sample, entry at row i and column j stores the sum of scores of all
-            # possible tag sequences so far that end with transitioning from tag i to tag j
-            # and emitting
-            # shape: (batch_size, num_tags, num_tags)
-            next_score = broadcast_score + self.transitions + broadcast_emissions
-
-            # Sum over all possible current tags, but we're in score space, so a sum
-            # becomes a log-sum-exp: for each sample, entry i stores the sum of scores of
-            # all possible tag sequences so far, that end in tag i
-            # shape: (batch_size, num_tags)
-            next_score = torch.logsumexp(next_score, dim=1)
-
-            # Set score to the next score if this timestep is valid (mask == 1)
-            # shape: (batch_size, num_tags)
-            score = torch.where(mask[i].unsqueeze(1), next_score, score)
-
-        # End transition score
-        # shape: (batch_size, num_tags)
-        score += self.end_transitions
-
-        # Sum (log-sum-exp) over all possible tags
-        # shape: (batch_size,)
-        return torch.logsumexp(score, dim=1)
+        emissions, mask = self._truncate(emissions, mask)
+        return crf_log_partition(emissions, mask, self.start_transitions,
+                                 self.end_transitions, self.transitions)
 
     def _viterbi_decode(self, emissions: torch.FloatTensor,
                         mask: torch.ByteTensor,
-                        pad_tag: Optional[int] = None) -> List[List[int]]:
+                        pad_tag: Optional[int] = None) -> torch.Tensor:
         # emissions: (seq_length, batch_size, num_tags)
         # mask: (seq_length, batch_size)
         # return: (batch_size, seq_length)
         if pad_tag is None:
             pad_tag = 0
 
-        device = emissions.device
         seq_length, batch_size = mask.shape
+        emissions, mask = self._truncate(emissions, mask)
+        best_tags = crf_viterbi_decode(emissions, mask, self.start_transitions,
+                                       self.end_transitions, self.transitions, pad_tag)
 
-        # Start transition and first emission
-        # shape: (batch_size, num_tags)
-        score = self.start_transitions + emissions[0]
-        history_idx = torch.zeros((seq_length, batch_size, self.num_tags),
-                                  dtype=torch.long, device=device)
-        oor_idx = torch.zeros((batch_size, self.num_tags),
-                              dtype=torch.long, device=device)
-        oor_tag = torch.full((seq_length, batch_size), pad_tag,
-                             dtype=torch.long, device=device)
-
-        # - score is a tensor of size (batch_size, num_tags) where for every batch,
-        #   value at column j stores the score of the best tag sequence so far that ends
-        #   with tag j
-        # - history_idx saves where the best tags candidate transitioned from; this is used
-        #   when we trace back the best tag sequence
-        # - oor_idx saves the best tags candidate transitioned from at the positions
-        #   where mask is 0, i.e. out of range (oor)
-
-        # Viterbi algorithm recursive case: we compute the score of the best tag sequence
-        # for every possible next tag
-        for i in range(1, seq_length):
-            # Broadcast viterbi score for every possible next tag
-            # shape: (batch_size, num_tags, 1)
-            broadcast_score = score.unsqueeze(2)
-
-            # Broadcast emission score for every possible current tag
-            # shape: (batch_size, 1, num_tags)
-            broadcast_emission = emissions[i].unsqueeze(1)
-
-            # Compute the score tensor of size (batch_size, num_tags, num_tags) where
-            # for each sample, entry at row i and column j stores the score of the best
-            # tag sequence so far that ends with transitioning from tag i to tag j and emitting
-            # shape: (batch_size, num_tags, num_tags)
-            next_score = broadcast_score + self.transitions + broadcast_emission
-
-            # Find the maximum score over all possible current tag
-            # shape: (batch_size, num_tags)
-            next_score, indices = next_score.max(dim=1)
-
-            # Set score to the next score if this timestep is valid (mask == 1)
-            # and save the index that produces the next score
-            # shape: (batch_size, num_tags)
-            score = torch.where(mask[i].unsqueeze(-1), next_score, score)
-            indices = torch.where(mask[i].unsqueeze(-1), indices, oor_idx)
-            history_idx[i - 1] = indices
-
-        # End transition score
-        # shape: (batch_size, num_tags)
-        end_score = score + self.end_transitions
-        _, end_tag = end_score.max(dim=1)
-
-        # shape: (batch_size,)
-        seq_ends = mask.long().sum(dim=0) - 1
-
-        # insert the best tag at each sequence end (last position with mask == 1)
-        history_idx = history_idx.transpose(1, 0).contiguous()
-        history_idx.scatter_(1, seq_ends.view(-1, 1, 1).expand(-1, 1, self.num_tags),
-                             end_tag.view(-1, 1, 1).expand(-1, 1, self.num_tags))
-        history_idx = history_idx.transpose(1, 0).contiguous()
+        # pad back to the original sequence length
+        best_tags_arr = best_tags.new_full((seq_length, batch_size), pad_tag)
+        best_tags_arr[:best_tags.size(0)] = best_tags
 
-        # The most probable path for each sequence
-        best_tags_arr = torch.zeros((seq_length, batch_size),
-                                    dtype=torch.long, device=device)
-        best_tags = torch.zeros(batch_size, 1, dtype=torch.long, device=device)
-        for idx in range(seq_length - 1, -1, -1):
-            best_tags = torch.gather(history_idx[idx], 1, best_tags)
-            best_tags_arr[idx] = best_tags.data.view(batch_size)
-
-        return torch.where(mask, best_tags_arr, oor_tag).transpose(0, 1)
+        return best_tags_arr.transpose(0, 1)
 
     def _viterbi_decode_nbest(self, emissions: torch.FloatTensor,
                               mask: torch.ByteTensor,
                               nbest: int,
-                              pad_tag: Optional[int] = None) -> List[List[List[int]]]:
+                              pad_tag: Optional[int] = None) -> torch.Tensor:
         # emissions: (seq_length, batch_size, num_tags)
         # mask: (seq_length, batch_size)
         # return: (nbest, batch_size, seq_length)
         if pad_tag is None:
             pad_tag = 0
 
-        device = emissions.device
         seq_length, batch_size = mask.shape
+        emissions, mask = self._truncate(emissions, mask)
+        best_tags = crf_viterbi_decode_nbest(emissions, mask, self.start_transitions,
+                                             self.end_transitions, self.transitions, nbest, pad_tag)
 
-        # Start transition and first emission
-        # shape: (batch_size, num_tags)
-        score = self.start_transitions + emissions[0]
-        history_idx = torch.zeros((seq_length, batch_size, self.num_tags, nbest),
-                                  dtype=torch.long, device=device)
-        oor_idx = torch.zeros((batch_size, self.num_tags, nbest),
-                              dtype=torch.long, device=device)
-        oor_tag = torch.full((seq_length, batch_size, nbest), pad_tag,
-                             dtype=torch.long, device=device)
-
-        # + score is a tensor of size (batch_size, num_tags) where for every batch,
-        #   value at column j stores the score of the best tag sequence so far that ends
-        #   with tag j
-        # + history_idx saves where the best tags candidate transitioned from; this is used
-        #   when we trace back the best tag sequence
-        # - oor_idx saves the best tags candidate transitioned from at the positions
-        #   where mask is 0, i.e. out of range (oor)
-
-        # Viterbi algorithm recursive case: we compute the score of the best tag sequence
-        # for every possible next tag
-        for i in range(1, seq_length):
-            if i == 1:
-                broadcast_score = score.unsqueeze(-1)
-                broadcast_emission = emissions[i].unsqueeze(1)
-                # shape: (batch_size, num_tags, num_tags)
-                next_score = broadcast_score + self.transitions + broadcast_emission
-            else:
-                broadcast_score = score.unsqueeze(-1)
-                broadcast_emission = emissions[i].unsqueeze(1).unsqueeze(2)
-                # shape: (batch_size, num_tags, nbest, num_tags)
-                next_score = broadcast_score + self.transitions.unsqueeze(1) + broadcast_emission
-
-            # Find the top `nbest` maximum score over all possible current tag
-            # shape: (batch_size, nbest, num_tags)
-            next_score, indices = next_score.view(batch_size, -1, self.num_tags).topk(nbest, dim=1)
-
-            if i == 1:
-                score = score.unsqueeze(-1).expand(-1, -1, nbest)
-                indices = indices * nbest
-
-            # convert to shape: (batch_size, num_tags, nbest)
-            next_score = next_score.transpose(2, 1)
-            indices = indices.transpose(2, 1)
-
-            # Set score to the next score if this timestep is valid (mask == 1)
-            # and save the index that produces the next score
-            # shape: (batch_size, num_tags, nbest)
-            score = torch.where(mask[i].unsqueeze(-1).unsqueeze(-1), next_score, score)
-            indices = torch.where(mask[i].unsqueeze(-1).unsqueeze(-1), indices, oor_idx)
-            history_idx[i - 1] = indices
-
-        # End transition score shape: (batch_size, num_tags, nbest)
-        end_score = score + self.end_transitions.unsqueeze(-1)
-        _, end_tag = end_score.view(batch_size, -1).topk(nbest, dim=1)
-
-        # shape: (batch_size,)
-        seq_ends = mask.long().sum(dim=0) - 1
+        # pad back to the original sequence length
+        best_tags_arr = best_tags.new_full((nbest, batch_size, seq_length), pad_tag)
+        best_tags_arr[:, :, :best_tags.size(2)] = best_tags
 
-        # insert the best tag at each sequence end (last position with mask == 1)
-        history_idx = history_idx.transpose(1, 0).contiguous()
-        history_idx.scatter_(1, seq_ends.view(-1, 1, 1, 1).expand(-1, 1, self.num_tags, nbest),
-                             end_tag.view(-1, 1, 1, nbest).expand(-1, 1, self.num_tags, nbest))
-        history_idx = history_idx.transpose(1, 0).contiguous()
-
-        # The most probable path for each sequence
-        best_tags_arr = torch.zeros((seq_length, batch_size, nbest),
-                                    dtype=torch.long, device=device)
-        best_tags = torch.arange(nbest, dtype=torch.long, device=device) \
-            .view(1, -1).expand(batch_size, -1)
-        for idx in range(seq_length - 1, -1, -1):
-            best_tags = torch.gather(history_idx[idx].view(batch_size, -1), 1, best_tags)
-            best_tags_arr[idx] = best_tags.data.view(batch_size, -1) // nbest
-
-        return torch.where(mask.unsqueeze(-1), best_tags_arr, oor_tag).permute(2, 1, 0)
\ No newline at end of file
+        return best_tags_arr
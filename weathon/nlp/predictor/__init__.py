@@ -1,3 +1,3 @@
 from weathon.nlp.predictor.sequence_classification import SequenceClassificationPredictor, TCPredictor, TMPredictor
 from weathon.nlp.predictor.token_classification import BiaffineNERPredictor, BIONERPredictor, CRFNERPredictor, \
-    PromptMLMPredictor, GlobalPointerNERPredictor, SpanNERPredictor, TokenClassificationPredictor
+    PromptMLMPredictor, GlobalPointerNERPredictor, SpanNERPredictor, TokenClassificationPredictor, DictionaryNERPredictor
@@ -6,13 +6,35 @@
 # @Description:
 
 
+import json
 import torch
+import multiprocessing
 import numpy as np
+from pathlib import Path
 from weathon.utils.ner_utils import NERUtils
+from weathon.utils.dictionary import Dictionary
+from weathon.utils.aho_corasick import CompiledAhoCorasick
+from weathon.utils.data_utils import DataUtils
 from weathon.nlp.base import BasePredictor
 from weathon.nlp.predictor.sequence_classification import SequenceClassificationPredictor
 
 
+def _get_module_batch_inputs(features, device):
+    """
+    将多个样本的特征拼接成一个batch，并把序列特征截断到batch内最长的有效长度
+
+    Args:
+        features (:obj:`list`): 单样本特征字典组成的列表
+        device: 模型所在设备
+    """  # noqa: ignore flake8"
+
+    features = DataUtils.dynamic_padding(features)
+
+    return {
+        col: torch.from_numpy(np.stack([np.asarray(feature_[col]) for feature_ in features])).type(torch.long).to(device)
+        for col in features[0]
+    }
+
 
 class TokenClassificationPredictor(SequenceClassificationPredictor):
     """
@@ -109,16 +131,10 @@ class BiaffineNERPredictor(object):
         input_ids = self.tokenizer.sequence_to_ids(tokens)
         input_ids, input_mask, segment_ids = input_ids
 
-        zero = [0 for i in range(self.tokenizer.max_seq_len)]
-        span_mask = [input_mask for i in range(sum(input_mask))]
-        span_mask.extend([zero for i in range(sum(input_mask), self.tokenizer.max_seq_len)])
-        span_mask = np.array(span_mask)
-
         features = {
             'input_ids': input_ids,
             'attention_mask': input_mask,
-            'token_type_ids': segment_ids,
-            'span_mask': span_mask
+            'token_type_ids': segment_ids
         }
 
         return features, token_mapping
@@ -129,7 +145,7 @@ class BiaffineNERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -160,6 +176,43 @@ class BiaffineNERPredictor(object):
             inputs = self._get_module_one_sample_inputs(features)
             scores = torch.argmax(self.module(**inputs), dim=-1)[0].to(torch.device('cpu')).numpy().tolist()
 
+        return self._get_entities(text, scores, token_mapping)
+
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32
+    ):
+        """
+        batch样本预测，每个batch只进行一次前向计算
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        entities = []
+        for index_ in range(0, len(texts), batch_size):
+            batch_texts = texts[index_: index_ + batch_size]
+            features, token_mappings = zip(*[self._get_input_ids(text_) for text_ in batch_texts])
+
+            with torch.no_grad():
+                inputs = _get_module_batch_inputs(features, self.device)
+                batch_scores = torch.argmax(self.module(**inputs), dim=-1).to(torch.device('cpu')).numpy().tolist()
+
+            for text_, scores_, token_mapping_ in zip(batch_texts, batch_scores, token_mappings):
+                entities.append(self._get_entities(text_, scores_, token_mapping_))
+
+        return entities
+
+    def _get_entities(
+            self,
+            text,
+            scores,
+            token_mapping
+    ):
         entities = []
         for start in range(len(scores)):
             for end in range(start, len(scores[start])):
@@ -246,7 +299,7 @@ class BIONERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -282,12 +335,44 @@ class BIONERPredictor(object):
         preds = preds[0][1:]
         preds = preds[:len(text)]
 
-        # tags = [self.id2cat[x] for x in preds]
-        label_entities = NERUtils.get_entities(preds, self.id2cat)
+        return self._get_entities(text, preds)
 
-        entities = set()
-        for entity_ in label_entities:
-            entities.add(text[entity_[1]: entity_[2] + 1] + '-' + entity_[0])
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32
+    ):
+        """
+        batch样本预测，每个batch只进行一次前向计算
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        entities = []
+        for index_ in range(0, len(texts), batch_size):
+            batch_texts = texts[index_: index_ + batch_size]
+            features = [self._get_input_ids(text_) for text_ in batch_texts]
+
+            with torch.no_grad():
+                inputs = _get_module_batch_inputs(features, self.device)
+                logits = self.module(**inputs)
+
+            batch_preds = np.argmax(logits.detach().cpu().numpy(), axis=2).tolist()
+            for text_, preds_ in zip(batch_texts, batch_preds):
+                entities.append(self._get_entities(text_, preds_[1:][:len(text_)]))
+
+        return entities
+
+    def _get_entities(
+            self,
+            text,
+            preds
+    ):
+        label_entities = NERUtils.get_entities(preds, self.id2cat)
 
         entities = []
         for entity_ in label_entities:
@@ -365,7 +450,7 @@ class CRFNERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -403,12 +488,46 @@ class CRFNERPredictor(object):
         preds = preds[0][1:]
         preds = preds[:len(text)]
 
-        tags = [self.id2cat[x] for x in preds]
-        label_entities = NERUtils.get_entities(preds, self.id2cat)
+        return self._get_entities(text, preds)
 
-        entities = set()
-        for entity_ in label_entities:
-            entities.add(text[entity_[1]: entity_[2] + 1] + '-' + entity_[0])
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32
+    ):
+        """
+        batch样本预测，每个batch只进行一次前向计算和一次CRF解码
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        entities = []
+        for index_ in range(0, len(texts), batch_size):
+            batch_texts = texts[index_: index_ + batch_size]
+            features = [self._get_input_ids(text_) for text_ in batch_texts]
+
+            with torch.no_grad():
+                inputs = _get_module_batch_inputs(features, self.device)
+                logits = self.module(**inputs)
+                tags = self.module.crf.decode(logits, inputs['attention_mask'])
+                tags = tags.squeeze(0)
+
+            batch_preds = tags.detach().cpu().numpy().tolist()
+            for text_, preds_ in zip(batch_texts, batch_preds):
+                entities.append(self._get_entities(text_, preds_[1:][:len(text_)]))
+
+        return entities
+
+    def _get_entities(
+            self,
+            text,
+            preds
+    ):
+        label_entities = NERUtils.get_entities(preds, self.id2cat)
 
         entities = []
         for entity_ in label_entities:
@@ -474,7 +593,7 @@ class GlobalPointerNERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -507,6 +626,46 @@ class GlobalPointerNERPredictor(object):
             inputs = self._get_module_one_sample_inputs(features)
             scores = self.module(**inputs)[0].cpu()
 
+        return self._get_entities(text, scores, token_mapping, threshold)
+
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32,
+            threshold=0
+    ):
+        """
+        batch样本预测，每个batch只进行一次前向计算
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+            threshold (:obj:`float`, optional, defaults to 0): 预测的阈值
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        entities = []
+        for index_ in range(0, len(texts), batch_size):
+            batch_texts = texts[index_: index_ + batch_size]
+            features, token_mappings = zip(*[self._get_input_ids(text_) for text_ in batch_texts])
+
+            with torch.no_grad():
+                inputs = _get_module_batch_inputs(features, self.device)
+                batch_scores = self.module(**inputs).cpu()
+
+            for text_, scores_, token_mapping_ in zip(batch_texts, batch_scores, token_mappings):
+                entities.append(self._get_entities(text_, scores_, token_mapping_, threshold))
+
+        return entities
+
+    def _get_entities(
+            self,
+            text,
+            scores,
+            token_mapping,
+            threshold=0
+    ):
         scores[:, [0, -1]] -= np.inf
         scores[:, :, [0, -1]] -= np.inf
 
@@ -581,7 +740,7 @@ class SpanNERPredictor(object):
     ):
         if self.tokenizer.tokenizer_type == 'vanilla':
             return self._convert_to_vanilla_ids(text)
-        elif self.tokenizer.tokenizer_type == 'transfomer':
+        elif self.tokenizer.tokenizer_type in ('transformer', 'transfomer'):
             return self._convert_to_transfomer_ids(text)
         elif self.tokenizer.tokenizer_type == 'customized':
             return self._convert_to_customized_ids(text)
@@ -614,6 +773,47 @@ class SpanNERPredictor(object):
             start_scores = torch.argmax(start_logits[0].cpu(), -1).numpy()[1:]
             end_scores = torch.argmax(end_logits[0].cpu(), -1).numpy()[1:]
 
+        return self._get_entities(text, start_scores, end_scores, token_mapping)
+
+    def predict_batch(
+            self,
+            texts,
+            batch_size=32
+    ):
+        """
+        batch样本预测，每个batch只进行一次前向计算
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            batch_size (:obj:`int`, optional, defaults to 32): batch大小
+        """  # noqa: ignore flake8"
+
+        self.module.eval()
+
+        entities = []
+        for index_ in range(0, len(texts), batch_size):
+            batch_texts = texts[index_: index_ + batch_size]
+            features, token_mappings = zip(*[self._get_input_ids(text_) for text_ in batch_texts])
+
+            with torch.no_grad():
+                inputs = _get_module_batch_inputs(features, self.device)
+                start_logits, end_logits = self.module(**inputs)
+                batch_start_scores = torch.argmax(start_logits.cpu(), -1).numpy()[:, 1:]
+                batch_end_scores = torch.argmax(end_logits.cpu(), -1).numpy()[:, 1:]
+
+            for text_, start_scores_, end_scores_, token_mapping_ in zip(
+                    batch_texts, batch_start_scores, batch_end_scores, token_mappings):
+                entities.append(self._get_entities(text_, start_scores_, end_scores_, token_mapping_))
+
+        return entities
+
+    def _get_entities(
+            self,
+            text,
+            start_scores,
+            end_scores,
+            token_mapping
+    ):
         entities = []
         for index_, s_l in enumerate(start_scores):
             if s_l == 0:
@@ -735,3 +935,208 @@ class PromptMLMPredictor(BasePredictor):
             return list(zip(preds, probas))
 
         return preds
+
+
+# predict_batch在子进程中使用的预测器，fork时由子进程直接继承，不需要序列化
+_SHARED_DICTIONARY_PREDICTOR = None
+
+
+def _init_shared_dictionary_predictor(predictor):
+    global _SHARED_DICTIONARY_PREDICTOR
+    _SHARED_DICTIONARY_PREDICTOR = predictor
+
+
+def _predict_shared(text):
+    return _SHARED_DICTIONARY_PREDICTOR.predict_one_sample(text)
+
+
+class DictionaryNERPredictor(object):
+    """
+    基于词典(Gazetteer)的命名实体识别预测器，将多个词库编译为一个AC自动机，每个词带有实体类型和词频，
+    输出格式与BIONERPredictor一致
+
+    Args:
+        lexicons (:obj:`list` or :obj:`dict`):
+            词库，list时为Dictionary中的词库名称(如'place_name'、'car')，实体类型即为词库名称；
+            dict时为 实体类型 -> 词库名称或 词:词频 字典
+        strategy (:obj:`string`, optional, defaults to 'leftmost_longest'):
+            重叠实体的消解策略，可选'leftmost_longest'(最左最长)、'longest'(全局最长优先)、'frequency'(词频最高优先)、'all'(不消解)
+        min_length (:obj:`int`, optional, defaults to 1): 参与匹配的最短词长
+
+    Examples::
+
+        >>> predictor = DictionaryNERPredictor(['place_name', 'food'], strategy='longest')
+        >>> predictor.predict_one_sample('在北京吃土豆')
+        >>> predictor.save('./dictionary_ner')
+        >>> predictor = DictionaryNERPredictor.load('./dictionary_ner')
+    """  # noqa: ignore flake8"
+
+    strategies = ('leftmost_longest', 'longest', 'frequency', 'all')
+
+    def __init__(
+            self,
+            lexicons,
+            strategy='leftmost_longest',
+            min_length=1
+    ):
+        self.strategy = strategy
+        self._check_strategy()
+
+        if isinstance(lexicons, (list, tuple)):
+            lexicons = {name_: name_ for name_ in lexicons}
+
+        # 同一个词出现在多个词库中时，保留词频最高的类型，词频相同时保留先出现的词库
+        word2type = {}
+        for type_, lexicon_ in lexicons.items():
+            if isinstance(lexicon_, str):
+                lexicon_ = getattr(Dictionary, lexicon_)()
+            for word_, freq_ in lexicon_.items():
+                if len(word_) < min_length:
+                    continue
+                freq_ = self._to_frequency(freq_)
+                if word_ not in word2type or word2type[word_][1] < freq_:
+                    word2type[word_] = (type_, freq_)
+
+        self.types = list(lexicons.keys())
+        self.automaton = CompiledAhoCorasick(*word2type.keys())
+
+        # 自动机的词编号 -> 类型编号、词频
+        type2id = {type_: idx_ for idx_, type_ in enumerate(self.types)}
+        self.word_types = np.zeros(len(self.automaton), dtype=np.int64)
+        self.word_freqs = np.zeros(len(self.automaton), dtype=np.int64)
+        for word_id_ in range(len(self.automaton)):
+            type_, freq_ = word2type[self.automaton.word(word_id_)]
+            self.word_types[word_id_] = type2id[type_]
+            self.word_freqs[word_id_] = freq_
+
+    def _check_strategy(self):
+        if self.strategy not in self.strategies:
+            raise ValueError("The strategy does not exist")
+
+    @staticmethod
+    def _to_frequency(freq):
+        try:
+            return int(freq)
+        except (TypeError, ValueError):
+            return 0
+
+    def _get_matches(
+            self,
+            text
+    ):
+        if self.strategy == 'leftmost_longest':
+            return list(self.automaton.finditer(text, overlap=False, longest=True))
+
+        matches = list(self.automaton.finditer(text))
+        if self.strategy == 'all':
+            return sorted(matches)
+
+        if self.strategy == 'longest':
+            priority = [(-(end_ - start_), start_) for start_, end_, _ in matches]
+        else:
+            priority = [(-int(self.word_freqs[word_id_]), -(end_ - start_), start_) for start_, end_, word_id_ in matches]
+
+        # 按优先级贪心选择互不重叠的匹配
+        occupied = np.zeros(len(text), dtype=bool)
+        selected = []
+        for index_ in sorted(range(len(matches)), key=priority.__getitem__):
+            start_, end_, word_id_ = matches[index_]
+            if occupied[start_:end_].any():
+                continue
+            occupied[start_:end_] = True
+            selected.append(matches[index_])
+
+        return sorted(selected)
+
+    def _get_entities(
+            self,
+            text,
+            matches
+    ):
+        entities = []
+        for start_, end_, word_id_ in matches:
+            entities.append({
+                "start_idx": start_,
+                "end_idx": end_ - 1,
+                "entity": text[start_: end_],
+                "type": self.types[self.word_types[word_id_]]
+            })
+
+        return entities
+
+    def predict_one_sample(
+            self,
+            text=''
+    ):
+        """
+        单样本预测
+
+        Args:
+            text (:obj:`string`): 输入文本
+        """  # noqa: ignore flake8"
+
+        return self._get_entities(text, self._get_matches(text))
+
+    def predict_batch(
+            self,
+            texts,
+            n_jobs=1,
+            chunksize=1000
+    ):
+        """
+        batch样本预测
+
+        Args:
+            texts (:obj:`list`): 输入文本列表
+            n_jobs (:obj:`int`, optional, defaults to 1): 进程数，大于1时使用进程池，支持fork的系统上子进程直接共享已编译的词典
+            chunksize (:obj:`int`, optional, defaults to 1000): 每次分发给子进程的文本数
+        """  # noqa: ignore flake8"
+
+        if n_jobs <= 1:
+            return [self.predict_one_sample(text_) for text_ in texts]
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _init_shared_dictionary_predictor(self)
+            try:
+                with multiprocessing.get_context('fork').Pool(n_jobs) as pool:
+                    return pool.map(_predict_shared, texts, chunksize=chunksize)
+            finally:
+                _init_shared_dictionary_predictor(None)
+
+        with multiprocessing.Pool(n_jobs, initializer=_init_shared_dictionary_predictor, initargs=(self,)) as pool:
+            return pool.map(_predict_shared, texts, chunksize=chunksize)
+
+    def save(self, path):
+        """
+        保存编译后的词典，避免每次重新读取词库构建自动机
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存目录
+        """  # noqa: ignore flake8"
+
+        path = Path(path)
+        self.automaton.save(path / 'automaton')
+        np.save(path / 'word_types.npy', self.word_types)
+        np.save(path / 'word_freqs.npy', self.word_freqs)
+        (path / 'types.json').write_text(json.dumps(self.types, ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path, strategy='leftmost_longest', mmap=True):
+        """
+        加载编译后的词典
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存目录
+            strategy (:obj:`string`, optional, defaults to 'leftmost_longest'): 重叠实体的消解策略
+            mmap (:obj:`bool`, optional, defaults to True): 是否以内存映射的方式加载数组
+        """  # noqa: ignore flake8"
+
+        path = Path(path)
+        predictor = cls.__new__(cls)
+        predictor.strategy = strategy
+        predictor._check_strategy()
+        predictor.automaton = CompiledAhoCorasick.load(path / 'automaton', mmap=mmap)
+        predictor.word_types = np.load(path / 'word_types.npy', mmap_mode='r' if mmap else None)
+        predictor.word_freqs = np.load(path / 'word_freqs.npy', mmap_mode='r' if mmap else None)
+        predictor.types = json.loads((path / 'types.json').read_text(encoding='utf-8'))
+        return predictor
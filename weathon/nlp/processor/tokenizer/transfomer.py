@@ -4,10 +4,9 @@ import transformers
 import numpy as np
 import unicodedata
 from typing import List, Union, Tuple
-from copy import deepcopy
 from weathon.nlp.base import BaseVocab, BaseTokenizer
 from weathon.utils import StringUtils, TransformerUtils
-from transformers import BertTokenizer, AutoTokenizer
+from transformers import BertTokenizer, AutoTokenizer, PreTrainedTokenizerFast
 from huggingface_hub.utils._validators import HFValidationError
 
 
@@ -34,23 +33,81 @@ class TransfomerTokenizer(BaseTokenizer):
         self.max_seq_len = max_seq_len
         self.additional_special_tokens = set()
 
-    def get_token_mapping(self, text, tokens, is_mapping_index=True) -> List[str]:
-        """给出原始的text和tokenize后的tokens的映射关系"""
-        raw_text = deepcopy(text)
+    def tokenize_with_encoding(self, text):
+        """
+        分词并返回产生该分词结果的encoding，
+        仅当词典为PreTrainedTokenizerFast且未重写tokenize时encoding不为None，可直接传给get_token_mapping
+
+        Args:
+            text (:obj:`string`): 原始文本
+        """  # noqa: ignore flake8"
+        if isinstance(self.vocab, PreTrainedTokenizerFast) and type(self).tokenize is BaseTokenizer.tokenize:
+            encoding = self.vocab(text, add_special_tokens=False, return_offsets_mapping=True)
+            return encoding.tokens(), encoding
+
+        return self.tokenize(text), None
+
+    def get_token_mapping(self, text, tokens, is_mapping_index=True, encoding=None) -> List[str]:
+        """给出原始的text和tokenize后的tokens的映射关系
+
+        Args:
+            text (:obj:`string`): 原始文本
+            tokens (:obj:`list`): text分词后的tokens，允许是截断后的结果
+            is_mapping_index (:obj:`bool`, optional, defaults to True): 返回字符位置列表，否则返回原始文本片段
+            encoding (:obj:`BatchEncoding` or :obj:`None`, optional, defaults to None):
+                产生tokens的那次分词调用返回的encoding(需带offset_mapping，见tokenize_with_encoding)，
+                提供时直接使用offset_mapping，否则逐个对齐tokens
+        """  # noqa: ignore flake8"
+        if encoding is not None:
+            token_mapping = self._get_token_mapping_by_offsets(text, tokens, encoding, is_mapping_index)
+            if token_mapping is not None:
+                return token_mapping
+
+        return self._get_token_mapping_by_alignment(text, tokens, is_mapping_index)
+
+    def _get_token_mapping_by_offsets(self, text, tokens, encoding, is_mapping_index=True):
+        """使用encoding的offset_mapping，tokens不是该encoding的分词结果时返回None"""
+        if encoding.tokens()[:len(tokens)] != list(tokens):
+            return None
+
+        token_mapping = []
+        for token, (start, end) in zip(tokens, encoding['offset_mapping']):
+            if token.lower() == '[unk]' or token in self.additional_special_tokens:
+                # 与对齐方式一致，未知字符只映射到起始的单个字符
+                end = start + 1
+            elif start == end and StringUtils.is_special(token):
+                token_mapping.append([])
+                continue
+
+            if is_mapping_index:
+                token_mapping.append(list(range(start, end)))
+            else:
+                token_mapping.append(text[start:end])
+
+        return token_mapping
+
+    def _get_token_mapping_by_alignment(self, text, tokens, is_mapping_index=True):
+        """单次遍历文本，将tokens依次对齐到归一化后的文本上"""
+        raw_text = text
         text = text.lower()
 
-        normalized_text, char_mapping = '', []
+        normalized_chars, char_mapping = [], []
         for i, ch in enumerate(text):
+            # 可打印的ASCII字符归一化后保持不变
+            if ' ' <= ch <= '~':
+                normalized_chars.append(ch)
+                char_mapping.append(i)
+                continue
             ch = unicodedata.normalize('NFD', ch)
             ch = ''.join([c for c in ch if unicodedata.category(c) != 'Mn'])
             ch = ''.join([
                 c for c in ch
                 if not (ord(c) == 0 or ord(c) == 0xfffd or StringUtils.is_control(c))
             ])
-            normalized_text += ch
+            normalized_chars.append(ch)
             char_mapping.extend([i] * len(ch))
 
-        text, token_mapping, offset = normalized_text, [], 0
+        text, token_mapping, offset = ''.join(normalized_chars), [], 0
         for token in tokens:
             token = token.lower()
             if token == '[unk]' or token in self.additional_special_tokens:
@@ -63,7 +120,8 @@ class TransfomerTokenizer(BaseTokenizer):
                 token_mapping.append([])
             else:
                 token = TransformerUtils.recover_bert_token(token)
-                start = text[offset:].index(token) + offset
+                # 从offset处直接查找，避免每个token都复制一次剩余文本
+                start = text.index(token, offset)
                 end = start + len(token)
                 if is_mapping_index:
                     token_mapping.append(char_mapping[start:end])
@@ -170,14 +228,69 @@ class TokenTokenizer(TransfomerTokenizer):
         max_seq_len (:obj:`int`): 预设的文本最大长度
     """  # noqa: ignore flake8"
 
+    def __init__(self, vocab: Union[BaseVocab, str], max_seq_len: int):
+        super(TokenTokenizer, self).__init__(vocab, max_seq_len)
+        # 字符 -> (tokens, token_ids) 的缓存，每个字符只经过一次词典的分词流程
+        self._char_cache = {}
+
+    def _tokenize_char(self, char):
+        cached = self._char_cache.get(char)
+        if cached is None:
+            tokens = [char] if char == ' ' else []
+            tokens.extend(self.vocab.tokenize(char))
+            cached = (tokens, self.vocab.convert_tokens_to_ids(tokens))
+            self._char_cache[char] = cached
+        return cached
+
     def tokenize(self, text, **kwargs):
         tokens = []
-        for token in text:
-            if token == ' ':
-                tokens.extend([token])
-            tokens.extend(self.vocab.tokenize(token))
+        for char in text:
+            tokens.extend(self._tokenize_char(char)[0])
         return tokens
 
+    def encode_batch(self, texts: List[str], return_token_mapping: bool = False) -> Tuple:
+        """
+        批量将文本直接转化成id数组，不生成中间的token字符串
+
+        Args:
+            texts (:obj:`list`): 文本列表
+            return_token_mapping (:obj:`bool`, optional, defaults to False): 是否同时返回每个token对应的字符位置
+
+        Returns:
+            input_ids, attention_mask, token_type_ids ([len(texts), max_seq_len]的int64数组)，
+            input_lengths (截断后的token数)，以及可选的token_mappings
+        """  # noqa: ignore flake8"
+        max_token_num = self.max_seq_len - 2
+        cls_id, sep_id = self.vocab.convert_tokens_to_ids(['[CLS]', '[SEP]'])
+
+        input_ids = np.zeros((len(texts), self.max_seq_len), dtype='int64')
+        attention_mask = np.zeros((len(texts), self.max_seq_len), dtype='int64')
+        token_type_ids = np.zeros((len(texts), self.max_seq_len), dtype='int64')
+        input_lengths = np.zeros(len(texts), dtype='int64')
+        token_mappings = []
+
+        for index_, text in enumerate(texts):
+            ids, token_mapping = [], []
+            for char_index, char in enumerate(text):
+                if len(ids) >= max_token_num:
+                    break
+                char_ids = self._tokenize_char(char)[1]
+                ids.extend(char_ids)
+                if return_token_mapping:
+                    token_mapping.extend([[char_index] for _ in char_ids])
+
+            ids = ids[:max_token_num]
+            input_ids[index_, 0] = cls_id
+            input_ids[index_, 1:len(ids) + 1] = ids
+            input_ids[index_, len(ids) + 1] = sep_id
+            attention_mask[index_, :len(ids) + 2] = 1
+            input_lengths[index_] = len(ids)
+            token_mappings.append(token_mapping[:max_token_num])
+
+        if return_token_mapping:
+            return input_ids, attention_mask, token_type_ids, input_lengths, token_mappings
+        return input_ids, attention_mask, token_type_ids, input_lengths
+
 
 class SpanTokenizer(TransfomerTokenizer):
     """
@@ -2,11 +2,56 @@
 
 import torch
 
+from torch.utils.data._utils.collate import default_collate
 from weathon.utils import conlleval
+from weathon.utils.data_utils import DataUtils
 from weathon.nlp.factory.metric import SpanMetrics,BiaffineSpanMetrics
 from weathon.nlp.task.token_classification import TokenClassificationTask
 
 
+def span_label_collate_fn(batch, class_num=None):
+    """
+    将样本中(type, start, end)形式的实体标签构造成batch padding长度下的稀疏标签tensor，
+    稠密的标签网格在设备上计算损失时再通过to_dense()生成，内存占用只与实体数有关
+
+    Args:
+        batch (:obj:`list`): 样本特征字典组成的batch
+        class_num (:obj:`int` or :obj:`None`, optional, defaults to None):
+            标签数目，为None时生成[batch, seq_len, seq_len]、值为实体类型的标签(Biaffine)，
+            否则生成[batch, class_num, seq_len, seq_len]、值为1的标签(GlobalPointer)
+    """  # noqa: ignore flake8"
+
+    tensors = default_collate([{col: f[col] for col in f if col != 'label_ids'} for f in batch])
+
+    batch_size, seq_len = tensors['input_ids'].shape
+
+    # 稀疏tensor对重复坐标求和，这里按稠密赋值label[start, end] = type的语义去重：
+    # Biaffine同一位置保留最后一个类型，GlobalPointer同一位置只记一次
+    entities = {}
+    for index_, f in enumerate(batch):
+        for type_, start_, end_ in f['label_ids']:
+            if end_ < seq_len:
+                key_ = (index_, start_, end_) if class_num is None else (index_, type_, start_, end_)
+                entities.pop(key_, None)
+                entities[key_] = (index_, type_, start_, end_)
+    indices = torch.tensor(list(entities.values()), dtype=torch.long).view(-1, 4).t()
+
+    if class_num is None:
+        tensors['label_ids'] = torch.sparse_coo_tensor(
+            indices[[0, 2, 3]],
+            indices[1],
+            (batch_size, seq_len, seq_len)
+        )
+    else:
+        tensors['label_ids'] = torch.sparse_coo_tensor(
+            indices,
+            torch.ones(indices.size(1)),
+            (batch_size, class_num, seq_len, seq_len)
+        )
+
+    return tensors
+
+
 class BIONERTask(TokenClassificationTask):
     """
     BIO序列分类任务的Task
@@ -56,8 +101,8 @@ class BIONERTask(TokenClassificationTask):
             id2cat = self.id2cat
 
         self.ner_metric = conlleval.SeqEntityScore(id2cat, markup=markup)
-        preds_ = torch.argmax(torch.cat(self.evaluate_logs['logits'], dim=0), -1).numpy().tolist()
-        labels_ = torch.cat(self.evaluate_logs['labels'], dim=0).numpy().tolist()
+        preds_ = torch.argmax(DataUtils.pad_and_concat(self.evaluate_logs['logits']), -1).numpy().tolist()
+        labels_ = DataUtils.pad_and_concat(self.evaluate_logs['labels']).numpy().tolist()
         input_lens_ = torch.cat(self.evaluate_logs['input_lengths'], dim=0).numpy()
 
         for index_, label_ in enumerate(labels_):
@@ -151,8 +196,8 @@ class CRFNERTask(TokenClassificationTask):
 
         self.ner_metric = conlleval.SeqEntityScore(id2cat, markup=markup)
 
-        preds_ = torch.cat(self.evaluate_logs['logits'], dim=0).numpy().tolist()
-        labels_ = torch.cat(self.evaluate_logs['labels'], dim=0).numpy().tolist()
+        preds_ = DataUtils.pad_and_concat(self.evaluate_logs['logits']).numpy().tolist()
+        labels_ = DataUtils.pad_and_concat(self.evaluate_logs['labels']).numpy().tolist()
         input_lens_ = torch.cat(self.evaluate_logs['input_lengths'], dim=0).numpy()
 
         for index_, label_ in enumerate(labels_):
@@ -207,18 +252,25 @@ class BiaffineNERTask(TokenClassificationTask):
         **kwargs
     ):
 
-        span_label = inputs['label_ids'].view(size=(-1,))
+        span_label = inputs['label_ids'].to_dense().view(size=(-1,))
         span_logits = logits.view(size=(-1, self.class_num))
 
         span_loss = self.loss_function(span_logits, span_label.long())
 
-        span_mask = inputs['span_mask'].view(size=(-1,))
+        # span_mask[b, i, j] = attention_mask[b, i] * attention_mask[b, j]
+        span_mask = inputs['attention_mask'].unsqueeze(-1) * inputs['attention_mask'].unsqueeze(-2)
 
-        span_loss *= span_mask
-        loss = torch.sum(span_loss) / inputs['span_mask'].size()[0]
+        span_loss *= span_mask.view(size=(-1,))
+        loss = torch.sum(span_loss) / span_mask.size()[0]
 
         return loss
 
+    def _train_collate_fn(self, batch):
+        return span_label_collate_fn(batch)
+
+    def _evaluate_collate_fn(self, batch):
+        return span_label_collate_fn(batch)
+
     def _evaluate_step_end(self, inputs, outputs, **kwargs):
 
         with torch.no_grad():
@@ -227,10 +279,10 @@ class BiaffineNERTask(TokenClassificationTask):
             logits = torch.nn.functional.softmax(logits, dim=-1)
             self.evaluate_logs['eval_loss'] += loss.item()
 
-        self.evaluate_logs['labels'].append(inputs['label_ids'].cpu())
+        self.evaluate_logs['labels'].append(inputs['label_ids'].to_dense().cpu())
         self.evaluate_logs['logits'].append(logits.cpu())
 
-        self.evaluate_logs['eval_example'] += len(inputs['label_ids'])
+        self.evaluate_logs['eval_example'] += len(inputs['input_ids'])
         self.evaluate_logs['eval_step'] += 1
 
     def _on_evaluate_epoch_end(
@@ -247,8 +299,8 @@ class BiaffineNERTask(TokenClassificationTask):
 
         biaffine_metric = BiaffineSpanMetrics()
 
-        preds_ = torch.cat(self.evaluate_logs['logits'], dim=0)
-        labels_ = torch.cat(self.evaluate_logs['labels'], dim=0)
+        preds_ = DataUtils.pad_and_concat(self.evaluate_logs['logits'])
+        labels_ = DataUtils.pad_and_concat(self.evaluate_logs['labels'])
 
         with torch.no_grad():
             recall, precise, span_f1 = biaffine_metric(preds_, labels_)
@@ -290,6 +342,12 @@ class GlobalPointerNERTask(TokenClassificationTask):
 
         return loss
 
+    def _train_collate_fn(self, batch):
+        return span_label_collate_fn(batch, self.class_num)
+
+    def _evaluate_collate_fn(self, batch):
+        return span_label_collate_fn(batch, self.class_num)
+
     def _evaluate_begin_record(self, **kwargs):
 
         self.evaluate_logs['eval_loss'] = 0
@@ -311,13 +369,13 @@ class GlobalPointerNERTask(TokenClassificationTask):
             logits, loss = self._get_evaluate_loss(inputs, outputs, **kwargs)
 
             numerate, denominator = conlleval.global_pointer_f1_score(
-                inputs['label_ids'].cpu(),
+                inputs['label_ids'].to_dense().cpu(),
                 logits.cpu()
             )
             self.evaluate_logs['numerate'] += numerate
             self.evaluate_logs['denominator'] += denominator
 
-        self.evaluate_logs['eval_example'] += len(inputs['label_ids'])
+        self.evaluate_logs['eval_example'] += len(inputs['input_ids'])
         self.evaluate_logs['eval_step'] += 1
         self.evaluate_logs['eval_loss'] += loss.item()
 
@@ -4,6 +4,7 @@ from weathon.utils.gpu_utils import GPUUtils                    # GPU相关操
 from weathon.utils.file_utils import FileUtils                  # 文件工具类
 from weathon.utils.file_utils import FileDecomposeUtils         # 文件解压缩工具类
 from weathon.utils.union_find import UnionFind                  # 并查集
+from weathon.utils.union_find import ArrayUnionFind             # 基于数组的并查集：批量合并
 from weathon.utils.ip_utils import IpUtils                      # IP相关操作工具类
 from weathon.utils.email_utils import EmailUtils                # 邮件相关操作工具类：发邮件
 from weathon.utils.pdf_utils import PDFUtils                    # pdf 相关操作工具类
@@ -12,10 +13,13 @@ from weathon.utils.pdf_utils import PDFUtils                    # pdf 相关操
 from weathon.utils.dictionary import Dictionary  # 词库
 from weathon.utils.number_utils import NumberUtils  # 字符数值处理工具类
 from weathon.utils.aho_corasick import AhoCorasick  # AC自动机:多模式匹配中的经典算法
+from weathon.utils.aho_corasick import CompiledAhoCorasick  # 基于数组、可mmap加载的AC自动机
 from weathon.utils.minjoin import MinJoin  # 文本召回方案
+from weathon.utils.lsh import LSHIndex  # MinHash/SimHash 近似重复检索索引
 from weathon.utils.encrypt_utils import EncryptUtils  # 字符串加密工具类
 from weathon.utils.char_utils import CharUtils  # 字符处理
 from weathon.utils.string_utils import StringUtils  # 字符串处理工具类
+from weathon.utils.string_utils import TextCleaner  # 预编译的文本清洗流水线：批量清洗
 
 # --------------------------------------------- deep learning ---------------------------------------------
 # transformers 下载、权重转换相关
@@ -24,6 +28,8 @@ from weathon.utils.transformer_utils import TransformerUtils
 # 模型训练相关
 from weathon.utils.environment_utils import EnvironmentUtils  # 训练环境设置
 from weathon.utils.sampler import ImbalancedDatasetSampler  # 模型采样
+from weathon.utils.sampler import LengthBucketBatchSampler  # 按长度分桶的batch采样
+from weathon.utils.data_utils import DataUtils  # 数据集切分、动态padding
 from weathon.utils.optimizer_utils import OptimizerUtils  # 优化器
 from weathon.utils.schedule_utils import ScheduleUtils  # 优化器 scheduler
 from weathon.utils.loss_utils import LossUtils  # 损失函数
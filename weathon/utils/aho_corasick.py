@@ -9,10 +9,14 @@
 # 2. [AC自动机](https://blog.csdn.net/weixin_40317006/article/details/81327188)
 
 
+import json
+import multiprocessing
+import numpy as np
+from pathlib import Path
+from typing import Union, List, Iterator, Tuple
 from collections import defaultdict
 
 
-
 class Node(object):
     """
     node
@@ -43,14 +47,127 @@ class Node(object):
         return self.__repr__()
 
 
-class AhoCorasick(object):
+# search_many在子进程中使用的自动机，fork时由子进程直接继承，不需要序列化
+_SHARED_AUTOMATON = None
+
+
+def _init_shared_automaton(automaton):
+    global _SHARED_AUTOMATON
+    _SHARED_AUTOMATON = automaton
+
+
+def _search_shared(args):
+    content, with_index = args
+    return _SHARED_AUTOMATON.search(content, with_index)
+
+
+class AhoCorasickSearchMixin(object):
+    """
+    AC自动机的流式匹配与批量检索，子类需要实现_iter_matches、word和word_length
+    """
+
+    def _iter_matches(self, content: str) -> Iterator[Tuple[int, int]]:
+        raise NotImplementedError("_iter_matches method not implement")
+
+    def word(self, word_id: int) -> str:
+        raise NotImplementedError("word method not implement")
+
+    def word_length(self, word_id: int) -> int:
+        return len(self.word(word_id))
+
+    @property
+    def max_word_length(self) -> int:
+        raise NotImplementedError("max_word_length method not implement")
+
+    def finditer(self, content: str, overlap: bool = True, longest: bool = False) -> Iterator[Tuple[int, int, int]]:
+        """
+        流式返回匹配结果(start, end, keyword_id)，end不含，同一关键词的重复出现都会返回
+
+        Args:
+            content (:obj:`string`): 文本
+            overlap (:obj:`bool`, optional, defaults to True): 是否返回相互重叠的匹配，为True时按结束位置顺序返回全部匹配
+            longest (:obj:`bool`, optional, defaults to False):
+                仅在overlap为False时生效，为True时使用最左最长匹配，否则在结束位置最早的匹配中取最长的
+        """  # noqa: ignore flake8"
+
+        if overlap:
+            for end, word_id in self._iter_matches(content):
+                yield end - self.word_length(word_id), end, word_id
+        elif not longest:
+            last_end = 0
+            for end, word_id in self._iter_matches(content):
+                start = end - self.word_length(word_id)
+                # 同一结束位置的匹配按词长从长到短返回，第一个不重叠的即为最长
+                if start >= last_end:
+                    yield start, end, word_id
+                    last_end = end
+        else:
+            yield from self._iter_leftmost_longest(content)
+
+    def _iter_leftmost_longest(self, content: str) -> Iterator[Tuple[int, int, int]]:
+        max_word_length = self.max_word_length
+        last_end = 0
+        candidates = []
+
+        def best(matches):
+            return min(matches, key=lambda x: (x[0], -x[1]))
+
+        for end, word_id in self._iter_matches(content):
+            start = end - self.word_length(word_id)
+            if start < last_end:
+                continue
+            candidates.append((start, end, word_id))
+
+            # 之后的匹配结束位置大于end，起点不早于end + 1 - max_word_length，早于该位置起始的候选已经确定
+            while candidates:
+                start_, end_, word_id_ = best(candidates)
+                if start_ >= end + 1 - max_word_length:
+                    break
+                yield start_, end_, word_id_
+                last_end = end_
+                candidates = [candidate for candidate in candidates if candidate[0] >= last_end]
+
+        while candidates:
+            start_, end_, word_id_ = best(candidates)
+            yield start_, end_, word_id_
+            candidates = [candidate for candidate in candidates if candidate[0] >= end_]
+
+    def search_many(self, docs: List[str], with_index: bool = False, n_jobs: int = 1, chunksize: int = 1000):
+        """
+        批量检索多篇文本，结果与逐篇调用search一致
+
+        Args:
+            docs (:obj:`list`): 文本列表
+            with_index (:obj:`bool`, optional, defaults to False): 是否返回匹配位置
+            n_jobs (:obj:`int`, optional, defaults to 1): 进程数，大于1时使用进程池，支持fork的系统上子进程直接共享已构建的自动机
+            chunksize (:obj:`int`, optional, defaults to 1000): 每次分发给子进程的文本数
+        """  # noqa: ignore flake8"
+
+        if n_jobs <= 1:
+            return [self.search(doc, with_index) for doc in docs]
+
+        tasks = ((doc, with_index) for doc in docs)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _init_shared_automaton(self)
+            try:
+                with multiprocessing.get_context('fork').Pool(n_jobs) as pool:
+                    return pool.map(_search_shared, tasks, chunksize=chunksize)
+            finally:
+                _init_shared_automaton(None)
+
+        with multiprocessing.Pool(n_jobs, initializer=_init_shared_automaton, initargs=(self,)) as pool:
+            return pool.map(_search_shared, tasks, chunksize=chunksize)
+
+
+class AhoCorasick(AhoCorasickSearchMixin):
     """
     Ac object
     """
 
     def __init__(self, *words):
         self.words = list(set(words))
-        self.words.sort(key=lambda x: len(x))
+        self.words.sort(key=lambda x: (len(x), x))
+        self._word2id = {word: idx for idx, word in enumerate(self.words)}
         self._root = Node(is_root=True)
         self._node_meta = defaultdict(set)  # 存放的是以字符结尾的词，以及词的长度
         self._node_all = [(0, self._root)]  # 记录字符的层级信息
@@ -133,6 +250,254 @@ class AhoCorasick(object):
             index += 1
         return result
 
+    def word(self, word_id: int) -> str:
+        return self.words[word_id]
+
+    @property
+    def max_word_length(self) -> int:
+        return len(self.words[-1]) if self.words else 0
+
+    def _iter_matches(self, content: str):
+        """按文本顺序返回所有匹配(结束位置(不含), 词编号)，同一结束位置按词长从长到短"""
+        node = self._root
+        for index, char in enumerate(content):
+            while 1:
+                if char not in node:
+                    if node == self._root:
+                        break
+                    else:
+                        node = node.fail
+                else:
+                    node = node[char]
+                    matches = sorted(self._node_meta.get(id(node), set()), key=lambda x: -x[1])
+                    for keyword, _ in matches:
+                        yield index + 1, self._word2id[keyword]
+                    break
+
+    def compile(self) -> 'CompiledAhoCorasick':
+        """
+        转换成基于数组的CompiledAhoCorasick
+        """
+        return CompiledAhoCorasick(*self.words)
+
+
+class CompiledAhoCorasick(AhoCorasickSearchMixin):
+    """
+    基于扁平数组的AC自动机，检索结果与AhoCorasick.search一致
+
+    节点按BFS顺序编号(根节点为0)，所有转移边按(父节点, 字符)排序后编码为 父节点 * 字符表大小 + 字符 存放在有序数组keys中，
+    第e条边指向节点e+1，构建时状态转移通过二分查找完成，检索时使用首次检索生成的转移字典；fail指针、节点对应的词以及输出链(dict_link)均为按节点编号的数组。
+    构建时逐层对所有词做向量化处理，不需要为每个字符创建Python对象；save/load以npy文件存储，加载时使用mmap并按meta.json校验，不需要重建
+
+    Args:
+        *words: 关键词
+
+    Examples::
+
+        >>> ac = CompiledAhoCorasick('阿鼻', '阿鼻地狱', 'df')
+        >>> ac.save('./ac_model')
+        >>> ac = CompiledAhoCorasick.load('./ac_model')
+        >>> ac.search('阿鼻地狱bdf', with_index=True)
+    """
+
+    _array_names = ('keys', 'fail', 'dict_link', 'node_word', 'chars', 'word_lengths', 'word_offsets', 'word_bytes')
+
+    def __init__(self, *words):
+        words = sorted(set(words), key=lambda x: (len(x), x))
+        assert all(len(word) > 0 for word in words), "keyword length is zero"
+
+        self._word_cache = {}
+        self._search_tables = None
+        self._build(words)
+
+    def _build(self, words):
+        word_lengths = np.asarray([len(word) for word in words], dtype=np.int64)
+        word_starts = np.concatenate(([0], np.cumsum(word_lengths)[:-1])).astype(np.int64)
+        codes = np.frombuffer(''.join(words).encode('utf-32-le'), dtype=np.uint32)
+
+        # 字符表：0号预留给不在字符表中的字符
+        self.chars = np.unique(codes)
+        alphabet_size = len(self.chars) + 1
+        alpha = np.searchsorted(self.chars, codes).astype(np.int64) + 1
+
+        # 逐层建trie：同一层的(父节点, 字符)去重后依次编号，因此keys整体有序且节点编号即BFS顺序
+        word_state = np.zeros(len(words), dtype=np.int64)
+        level_keys = []
+        level_bounds = [1]
+        node_num = 1
+        depth = 0
+        while True:
+            active = np.flatnonzero(word_lengths > depth)
+            if len(active) == 0:
+                break
+            keys_ = word_state[active] * alphabet_size + alpha[word_starts[active] + depth]
+            unique_keys_, inverse_ = np.unique(keys_, return_inverse=True)
+            word_state[active] = node_num + inverse_.reshape(-1)
+            level_keys.append(unique_keys_)
+            node_num += len(unique_keys_)
+            level_bounds.append(node_num)
+            depth += 1
+
+        self.keys = np.concatenate(level_keys) if level_keys else np.zeros(0, dtype=np.int64)
+
+        self.node_word = np.full(node_num, -1, dtype=np.int32)
+        self.node_word[word_state] = np.arange(len(words), dtype=np.int32)
+
+        # fail指针与输出链按层计算，只依赖更浅层的结果
+        self.fail = np.zeros(node_num, dtype=np.int32)
+        self.dict_link = np.zeros(node_num, dtype=np.int32)
+        for level_ in range(1, len(level_bounds) - 1):
+            nodes_ = np.arange(level_bounds[level_], level_bounds[level_ + 1])
+            parents_ = self.keys[nodes_ - 1] // alphabet_size
+            labels_ = self.keys[nodes_ - 1] % alphabet_size
+
+            candidates_ = self.fail[parents_].astype(np.int64)
+            fails_ = np.zeros(len(nodes_), dtype=np.int64)
+            pending_ = np.arange(len(nodes_))
+            while len(pending_):
+                targets_ = self._goto_many(candidates_[pending_], labels_[pending_], alphabet_size)
+                found_ = targets_ > 0
+                fails_[pending_[found_]] = targets_[found_]
+                pending_ = pending_[~found_]
+                # 已回退到根节点仍无法转移的，fail指向根节点
+                pending_ = pending_[candidates_[pending_] != 0]
+                candidates_[pending_] = self.fail[candidates_[pending_]]
+
+            self.fail[nodes_] = fails_
+            self.dict_link[nodes_] = np.where(self.node_word[fails_] >= 0, fails_, self.dict_link[fails_])
+
+        word_bytes = [word.encode('utf-8') for word in words]
+        self.word_lengths = word_lengths.astype(np.int32)
+        self.word_offsets = np.concatenate(([0], np.cumsum([len(b) for b in word_bytes]))).astype(np.int64)
+        self.word_bytes = np.frombuffer(b''.join(word_bytes), dtype=np.uint8)
+
+    @property
+    def alphabet_size(self) -> int:
+        return len(self.chars) + 1
+
+    def __len__(self):
+        return len(self.word_lengths)
+
+    def _goto_many(self, states, labels, alphabet_size=None):
+        """批量状态转移，无法转移时返回0"""
+        alphabet_size = self.alphabet_size if alphabet_size is None else alphabet_size
+        targets = np.asarray(states, dtype=np.int64) * alphabet_size + labels
+        index = np.searchsorted(self.keys, targets)
+        index_ = np.minimum(index, len(self.keys) - 1)
+        found = (index < len(self.keys)) & (self.keys[index_] == targets)
+        return np.where(found, index_ + 1, 0)
+
+    def _encode(self, content: str) -> np.ndarray:
+        """将文本转换为字符表中的编号，不在字符表中的字符为0"""
+        codes = np.frombuffer(content.encode('utf-32-le'), dtype=np.uint32)
+        index = np.searchsorted(self.chars, codes)
+        index_ = np.minimum(index, len(self.chars) - 1)
+        return np.where(self.chars[index_] == codes, index_ + 1, 0)
+
+    def word_length(self, word_id: int) -> int:
+        return int(self.word_lengths[word_id])
+
+    @property
+    def max_word_length(self) -> int:
+        return int(self.word_lengths.max()) if len(self.word_lengths) else 0
+
+    def word(self, word_id: int) -> str:
+        """根据词编号获取关键词"""
+        if word_id not in self._word_cache:
+            start, end = self.word_offsets[word_id], self.word_offsets[word_id + 1]
+            self._word_cache[word_id] = self.word_bytes[start:end].tobytes().decode('utf-8')
+        return self._word_cache[word_id]
+
+    def _get_search_tables(self):
+        """
+        检索用的查找表，首次检索时由数组生成并缓存：
+        非根节点的转移边 (父节点 * 字符表大小 + 字符) -> 子节点 的字典，以及fail、node_word、dict_link的列表，
+        避免逐字符对keys做二分查找和读取numpy标量
+        """
+        if self._search_tables is None:
+            root_edge_num = int(np.searchsorted(self.keys, self.alphabet_size))
+            goto = dict(zip(self.keys[root_edge_num:].tolist(), range(root_edge_num + 1, len(self.keys) + 1)))
+            self._search_tables = (goto, self.fail.tolist(), self.node_word.tolist(), self.dict_link.tolist())
+        return self._search_tables
+
+    def _iter_matches(self, content: str):
+        """按文本顺序返回所有匹配(结束位置(不含), 词编号)，同一结束位置按词长从长到短"""
+        if len(self.keys) == 0:
+            return
+
+        goto, fail, node_word, dict_link = self._get_search_tables()
+        alphabet_size = self.alphabet_size
+
+        # 整段文本一次性完成字符编号和根节点的转移，逐字符只处理非根节点的转移
+        labels = self._encode(content)
+        root_targets = self._goto_many(np.zeros(len(labels), dtype=np.int64), labels, alphabet_size)
+
+        state = 0
+        for index, (label, root_target) in enumerate(zip(labels.tolist(), root_targets.tolist())):
+            while state:
+                target = goto.get(state * alphabet_size + label)
+                if target is not None:
+                    state = target
+                    break
+                state = fail[state]
+            else:
+                state = root_target
+
+            node = state if node_word[state] >= 0 else dict_link[state]
+            while node > 0:
+                yield index + 1, node_word[node]
+                node = dict_link[node]
+
+    def search(self, content, with_index=False):
+        result = set()
+        for end, word_id in self._iter_matches(content):
+            keyword = self.word(word_id)
+            if not with_index:
+                result.add(keyword)
+            else:
+                result.add((keyword, (end - len(keyword), end)))
+        return result
+
+    def save(self, path: Union[str, Path]):
+        """
+        保存到目录，每个数组一个npy文件
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存目录
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self._array_names:
+            np.save(path / f'{name}.npy', np.ascontiguousarray(getattr(self, name)))
+        meta = {'word_num': len(self), 'node_num': len(self.fail), 'edge_num': len(self.keys)}
+        (path / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> 'CompiledAhoCorasick':
+        """
+        从目录加载
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存目录
+            mmap (:obj:`bool`, optional, defaults to True): 是否以内存映射的方式加载数组
+        """
+        path = Path(path)
+        automaton = cls.__new__(cls)
+        automaton._word_cache = {}
+        automaton._search_tables = None
+        for name in cls._array_names:
+            setattr(automaton, name, np.load(path / f'{name}.npy', mmap_mode='r' if mmap else None))
+
+        # 校验各数组与保存时一致，避免混用不同自动机的npy文件
+        meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+        if (meta['word_num'], meta['node_num'], meta['edge_num']) != (
+                len(automaton.word_lengths), len(automaton.fail), len(automaton.keys)):
+            raise ValueError(f"arrays in {path} do not match meta.json")
+        if not (len(automaton.node_word) == len(automaton.dict_link) == len(automaton.fail) == len(automaton.keys) + 1
+                and len(automaton.word_offsets) == len(automaton.word_lengths) + 1):
+            raise ValueError(f"arrays in {path} are inconsistent")
+        return automaton
+
 
 if __name__ == '__main__':
     ac = AhoCorasick("阿傍",
@@ -5,7 +5,9 @@
 # @github  : https://github.com/Lizhen0628
 # @Description:
 
-from typing import Tuple
+import torch
+import numpy as np
+from typing import Tuple, List, Dict
 from torch.utils.data import random_split
 
 
@@ -31,3 +33,81 @@ class DataUtils:
         train_dataset.dataset = t_dataset
         valid_dataset.dataset = v_dataset
         return train_dataset, valid_dataset
+
+    # 动态padding时截断的特征列 -> 序列维度，只截断这些列中维数一致、且对应维度长度等于max_seq_len的特征
+    DYNAMIC_PADDING_COLS = {
+        'input_ids': (0,),
+        'attention_mask': (0,),
+        'token_type_ids': (0,),
+        'position_ids': (0,),
+        'label_ids': (0,),
+        'start_label_ids': (0,),
+        'end_label_ids': (0,),
+        'corres_tags': (0, 1),
+    }
+
+    @staticmethod
+    def dynamic_padding(batch: List[Dict], mask_col: str = 'attention_mask',
+                        padding_cols: Dict[str, Tuple[int, ...]] = None) -> List[Dict]:
+        """
+        动态padding：将batch内按max_seq_len填充的特征截断到batch内最长的有效长度
+        只截断padding_cols中列出的序列特征和max_seq_len × max_seq_len的二维网格特征，
+        其他列(如(type, start, end)形式的实体标签)保持不变，稀疏tensor截断后仍为稀疏tensor
+        Args:
+            batch: 样本特征字典组成的batch
+            mask_col: 用于计算有效长度的mask列名
+            padding_cols: 特征列 -> 需要截断的维度，默认为DataUtils.DYNAMIC_PADDING_COLS
+        Returns
+            截断后的batch，稠密特征为原数组的切片视图
+        """
+        if len(batch) == 0 or mask_col not in batch[0]:
+            return batch
+
+        padding_cols = DataUtils.DYNAMIC_PADDING_COLS if padding_cols is None else padding_cols
+
+        padded_len = len(batch[0][mask_col])
+        batch_seq_len = max(int(np.count_nonzero(feature_[mask_col])) for feature_ in batch)
+        if batch_seq_len == padded_len:
+            return batch
+
+        trimmed_batch = []
+        for feature_ in batch:
+            trimmed_feature = dict(feature_)
+            for col_, axes_ in padding_cols.items():
+                value_ = feature_.get(col_)
+                if (not isinstance(value_, (np.ndarray, torch.Tensor)) or value_.ndim != len(axes_)
+                        or any(value_.shape[axis_] != padded_len for axis_ in axes_)):
+                    continue
+                if isinstance(value_, torch.Tensor) and value_.is_sparse:
+                    for axis_ in axes_:
+                        value_ = value_.narrow_copy(axis_, 0, batch_seq_len)
+                else:
+                    value_ = value_[tuple(slice(0, batch_seq_len) if dim_ in axes_ else slice(None)
+                                          for dim_ in range(value_.ndim))]
+                trimmed_feature[col_] = value_
+            trimmed_batch.append(trimmed_feature)
+
+        return trimmed_batch
+
+    @staticmethod
+    def pad_and_concat(tensors: List[torch.Tensor], pad_value=0) -> torch.Tensor:
+        """
+        将第一维以外形状不同的张量填充到相同形状后在第一维拼接，
+        用于拼接动态padding下各batch长度不同的logits、labels，以及Biaffine等L × L的二维网格
+        Args:
+            tensors: 待拼接的张量列表
+            pad_value: 填充值
+        Returns
+            拼接后的张量
+        """
+        max_shape = [max(tensor_.shape[dim_] for tensor_ in tensors) for dim_ in range(1, tensors[0].dim())]
+
+        padded = []
+        for tensor_ in tensors:
+            if list(tensor_.shape[1:]) != max_shape:
+                padded_ = tensor_.new_full([tensor_.shape[0]] + max_shape, pad_value)
+                padded_[tuple(slice(0, dim_) for dim_ in tensor_.shape)] = tensor_
+                tensor_ = padded_
+            padded.append(tensor_)
+
+        return torch.cat(padded, dim=0)
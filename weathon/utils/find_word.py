@@ -172,6 +172,117 @@ def indexOfSortedSuffix(doc, max_word_len):
     return sorted(indexes, key=lambda i_j: doc[i_j[0]:i_j[1]])
 
 
+_SEPARATOR_PATTERN = re.compile('[\\s,.<>/?:;\'\"[\\]{}()\\|~!@#$%^&*\\-_=+a-zA-Z，。《》、？：；“”‘’｛｝【】（）…￥！—┄－]+')
+_HASH_BASE = 0x100000001B3
+_MAX_CODE = 0x110000
+
+
+def _ngram_hashes(columns, starts, length):
+    """按列计算以starts开头、长度为length的n-gram的多项式哈希(mod 2^64)"""
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    for k in range(length):
+        hashes = hashes * np.uint64(_HASH_BASE) + columns[k][starts].astype(np.uint64)
+    return hashes
+
+
+def _word_hashes(words, length):
+    codes = np.frombuffer(''.join(words).encode('utf-32-le'), dtype=np.uint32).astype(np.int64).reshape(-1, length)
+    return _ngram_hashes(codes.T, np.arange(len(words)), length)
+
+
+def ngramStatistics(doc, max_word_len, min_count=None, candidates=None):
+    """
+    Count all n-grams (without spaces) of doc up to max_word_len and their left/right neighbors
+    with a suffix array truncated to max_word_len characters. Suffixes sharing the same first L characters
+    are adjacent in the suffix array, so every n-gram is a run of ranks with LCP >= L, and its right
+    neighbors are the (L+1)-th characters of the run.
+    @param doc the cleaned document
+    @param max_word_len max length of n-grams
+    @param min_count keep n-grams whose count > min_count, None for no limit
+    @param candidates dict length -> sorted hashes, keep n-grams whose hash is in it, None for no limit
+    @return words, counts, (left word index, left char, count), (right word index, right char, count)
+    """
+    codes = np.frombuffer(doc.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    n = len(codes)
+    words, counts, lefts, rights = [], [], [], []
+
+    if n > 0:
+        padded = np.concatenate((codes, np.full(max_word_len + 1, -1, dtype=np.int64)))
+        # -1 排在所有字符前，与字符串比较时短串在前一致
+        suffix_array = np.lexsort([padded[k:k + n] for k in range(max_word_len - 1, -1, -1)])
+        columns = [padded[k:k + n][suffix_array] for k in range(max_word_len + 1)]
+        left_codes = np.concatenate(([-1], codes[:-1]))[suffix_array]
+
+        lcp = np.zeros(n, dtype=np.int64)
+        same = np.ones(n - 1, dtype=bool)
+        for k in range(max_word_len):
+            same &= (columns[k][1:] == columns[k][:-1]) & (columns[k][1:] >= 0)
+            lcp[1:] += same
+
+        # 从每个位置起不含空格的最大长度
+        breaks = np.where(codes == ord(' '), np.arange(n), n)
+        next_break = np.minimum.accumulate(breaks[::-1])[::-1]
+        valid_len = np.minimum(next_break - np.arange(n), max_word_len)[suffix_array]
+
+    for length in range(1, max_word_len + 1 if n > 0 else 1):
+        starts = np.flatnonzero(np.concatenate(([True], lcp[1:] < length)))
+        sizes = np.diff(np.append(starts, n))
+
+        keep = valid_len[starts] >= length
+        if min_count is not None:
+            keep &= sizes > min_count
+        if candidates is not None:
+            keep[keep] = np.isin(_ngram_hashes(columns, starts[keep], length),
+                                 candidates.get(length, np.zeros(0, dtype=np.uint64)))
+        starts, sizes = starts[keep], sizes[keep]
+        if len(starts) == 0:
+            continue
+
+        word_index = np.repeat(np.arange(len(counts), len(counts) + len(starts)), sizes)
+        members = np.arange(len(word_index)) - np.repeat(np.cumsum(sizes) - sizes - starts, sizes)
+        for side_codes, side in ((left_codes, lefts), (columns[length], rights)):
+            neighbors = side_codes[members]
+            has_neighbor = neighbors >= 0
+            pairs, pair_counts = np.unique(word_index[has_neighbor] * _MAX_CODE + neighbors[has_neighbor],
+                                           return_counts=True)
+            side.append((pairs // _MAX_CODE, pairs % _MAX_CODE, pair_counts))
+
+        words.extend(doc[p:p + length] for p in suffix_array[starts].tolist())
+        counts.extend(sizes.tolist())
+
+    def concat(side):
+        if not side:
+            return tuple(np.zeros(0, dtype=np.int64) for _ in range(3))
+        return tuple(np.concatenate(column) for column in zip(*side))
+
+    return words, np.asarray(counts, dtype=np.int64), concat(lefts), concat(rights)
+
+
+def entropyOfPairs(word_index, pair_counts, word_count):
+    """
+    Compute the neighbor entropy of every word from (word index, neighbor count) pairs
+    """
+    totals = np.bincount(word_index, weights=pair_counts, minlength=word_count)
+    probs = pair_counts / totals[word_index]
+    return np.bincount(word_index, weights=-probs * np.log(probs), minlength=word_count)
+
+
+def iterFileChunks(input_file, chunk_size, encoding='utf-8'):
+    """
+    Read a file by chunks of about chunk_size characters, chunks always end at line boundaries
+    """
+    lines, size = [], 0
+    with open(input_file, 'r', encoding=encoding) as fin:
+        for line in fin:
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield ''.join(lines)
+                lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
 class WordInfo(object):
     """
     Store information of each word, including its freqency, left neighbors and right neighbors
@@ -216,13 +327,21 @@ class WordInfo(object):
 
 class WordDiscoverer(object):
     def __init__(self, doc, max_word_len=5, min_freq=0.00005, min_entropy=2.0, min_aggregation:float=50,
-                 ent_threshold="both", mem_saving=False):
+                 ent_threshold="both", mem_saving=False, engine="suffix_array"):
         super(WordDiscoverer, self).__init__()
         self.max_word_len = max_word_len
         self.min_freq = min_freq
         self.min_entropy = min_entropy
         self.min_aggregation = min_aggregation
 
+        if engine == "suffix_array":
+            # 后缀数组引擎：结果与python引擎一致，mem_saving只决定结果的排序方式
+            self.word_infos = self.genWordsSuffixArray(lambda: [doc], ent_threshold, mem_saving)
+            self.computeAverages()
+            return
+        elif engine != "python":
+            raise ValueError("engine invalid, please use 'suffix_array' or 'python'")
+
         if mem_saving:
             self.word_infos = self.genWords(doc)
             # Filter out the results satisfy all the requirements
@@ -242,6 +361,28 @@ class WordDiscoverer(object):
             else:
                 filter_func = lambda v: (v.left + v.right) / 2.0 > self.min_entropy
         self.word_infos = list(filter(filter_func, self.word_infos))
+        self.computeAverages()
+
+    @classmethod
+    def from_file(cls, input_file, chunk_size=10000000, max_word_len=5, min_freq=0.00005, min_entropy=2.0,
+                  min_aggregation: float = 50, ent_threshold="both", mem_saving=False, encoding='utf-8'):
+        """
+        Discover words from a corpus file larger than memory, the file is processed by chunks with the suffix
+        array engine, only one chunk is kept in memory at a time
+        @param input_file path of the corpus
+        @param chunk_size number of characters of each chunk
+        """
+        discoverer = cls.__new__(cls)
+        discoverer.max_word_len = max_word_len
+        discoverer.min_freq = min_freq
+        discoverer.min_entropy = min_entropy
+        discoverer.min_aggregation = min_aggregation
+        discoverer.word_infos = discoverer.genWordsSuffixArray(
+            lambda: iterFileChunks(input_file, chunk_size, encoding), ent_threshold, mem_saving)
+        discoverer.computeAverages()
+        return discoverer
+
+    def computeAverages(self):
         self.word_with_freq = [(w.text, w.freq) for w in self.word_infos]
         self.words = [w[0] for w in self.word_with_freq]
         # Result infomations, i.e., average data of all words
@@ -333,6 +474,96 @@ class WordDiscoverer(object):
             v.right = entropyOfList(v.right)
         return values
 
+    def genWordsSuffixArray(self, chunks, ent_threshold="both", mem_saving=False):
+        """
+        Generate the filtered words with the suffix array engine
+        @param chunks function returning an iterator of document chunks, it is called twice for multiple chunks
+        @param ent_threshold "both" or "avg"
+        @param mem_saving sort results by length as genWords does, otherwise by text as genWords2 does
+        """
+        # 第一遍：每个分块中相对频率超过min_freq的n-gram。全局相对频率超过min_freq的词至少在一个分块中超过min_freq，
+        # 词的所有子串频率不低于词本身，计算凝固度需要的子串也都在其中
+        candidates = {}
+        statistics = None
+        length = 0
+        chunk_num = 0
+        for chunk in chunks():
+            chunk = self._cleanChunk(chunk, chunk_num)
+            # 非第一个分块开头的空格与上一个分块结尾(换行)的空格在整篇文档中是同一个
+            length += len(chunk) - (1 if chunk_num > 0 else 0)
+            chunk_num += 1
+            statistics = ngramStatistics(chunk, self.max_word_len, min_count=self.min_freq * len(chunk) * (1 - 1e-9))
+            for word in statistics[0]:
+                candidates.setdefault(len(word), set()).add(word)
+
+        if chunk_num > 1:
+            # 第二遍：只统计候选词在全部分块中的频数和左右邻字
+            candidate_hashes = {
+                length_: np.unique(_word_hashes(sorted(words_), length_)) for length_, words_ in candidates.items()
+            }
+            word2index, counts, lefts, rights = {}, [], [], []
+            for index_, chunk in enumerate(chunks()):
+                words, chunk_counts, left, right = ngramStatistics(
+                    self._cleanChunk(chunk, index_), self.max_word_len, candidates=candidate_hashes)
+                indexes = np.asarray([word2index.setdefault(word_, len(word2index)) for word_ in words], dtype=np.int64)
+                counts.append((indexes, chunk_counts))
+                lefts.append((indexes[left[0]], left[1], left[2]))
+                rights.append((indexes[right[0]], right[1], right[2]))
+
+            words = list(word2index)
+            indexes, chunk_counts = (np.concatenate(column) for column in zip(*counts))
+            word_counts = np.bincount(indexes, weights=chunk_counts, minlength=len(words))
+
+            def merge(side):
+                word_index, codes, pair_counts = (np.concatenate(column) for column in zip(*side))
+                pairs, inverse = np.unique(word_index * _MAX_CODE + codes, return_inverse=True)
+                return pairs // _MAX_CODE, pairs % _MAX_CODE, np.bincount(inverse, weights=pair_counts)
+
+            statistics = words, word_counts, merge(lefts), merge(rights)
+        elif statistics is None:
+            statistics = ngramStatistics('', self.max_word_len)
+
+        self.length = length
+        return self._wordInfosFromStatistics(*statistics, ent_threshold=ent_threshold, mem_saving=mem_saving)
+
+    @staticmethod
+    def _cleanChunk(chunk, index):
+        chunk = re.sub(_SEPARATOR_PATTERN, ' ', chunk)
+        # 分块在行边界切分，非第一个分块左侧补空格，与整篇文档中左邻字为换行(清洗后为空格)一致
+        if index > 0 and not chunk.startswith(' '):
+            chunk = ' ' + chunk
+        return chunk
+
+    def _wordInfosFromStatistics(self, words, counts, left, right, ent_threshold="both", mem_saving=False):
+        freqs = (np.asarray(counts, dtype=np.float64) / self.length).tolist() if self.length else []
+        word_freq = dict(zip(words, freqs))
+        left_entropy = entropyOfPairs(left[0], left[2], len(words)).tolist()
+        right_entropy = entropyOfPairs(right[0], right[2], len(words)).tolist()
+
+        word_infos = []
+        for index_, word in enumerate(words):
+            if len(word) < 2 or not word_freq[word] > self.min_freq:
+                continue
+            aggregation = min(word_freq[word] / word_freq[p1] / word_freq[p2] for p1, p2 in genSubparts(word))
+            if not aggregation > self.min_aggregation:
+                continue
+
+            info = WordInfo(word)
+            info.freq = word_freq[word]
+            info.left = left_entropy[index_]
+            info.right = right_entropy[index_]
+            info.aggregation = aggregation
+            if ent_threshold == "both":
+                if not (info.left > self.min_entropy and info.right > self.min_entropy):
+                    continue
+            elif not (info.left + info.right) / 2.0 > self.min_entropy:
+                continue
+            word_infos.append(info)
+
+        if mem_saving:
+            return sorted(word_infos, key=lambda x: (len(x.text), x.text))
+        return sorted(word_infos, key=lambda x: x.text)
+
     def get_df_info(self, ex_mentions, exclude_number=True):
         info = {"text": [], "freq": [], "left_ent": [], "right_ent": [], "agg": []}
         for w in self.word_infos:
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2022/10/3 10:08
+# @Author  : LiZhen
+# @FileName: lsh.py
+# @github  : https://github.com/Lizhen0628
+# @Description:
+# 参考资料：
+# 1. [Mining of Massive Datasets, Chapter 3](http://www.mmds.org/)
+# 2. [Detecting Near-Duplicates for Web Crawling](https://research.google/pubs/pub33026/)
+
+import pickle
+import numpy as np
+from pathlib import Path
+from collections import Counter
+from typing import Union, List, Set, Tuple, Hashable
+
+from weathon.utils.minjoin import Mmh3
+from weathon.utils.union_find import UnionFind
+
+_MERSENNE_PRIME = 4294967291  # 小于2^32的最大质数
+_UINT32_MASK = 0xFFFFFFFF
+
+
+class LSHIndex(object):
+    """
+    增量式近似重复检索索引：长文本使用MinHash + banding，短文本使用SimHash + 分块(鸽巢原理)，
+    新文档只需add到索引中，不需要像MinJoin一样对全量语料重新计算
+
+    每篇文档同时计算MinHash签名和SimHash指纹，查询时长度小于short_text_length的文本使用SimHash，否则使用MinHash，
+    MinHash的相似度为签名的一致率(Jaccard估计)，SimHash的相似度为 1 - 汉明距离 / 64
+
+    Args:
+        num_perm (:obj:`int`, optional, defaults to 128): MinHash置换数
+        bands (:obj:`int`, optional, defaults to 32): banding的band数，需要整除num_perm
+        ngram (:obj:`int`, optional, defaults to 3): 字符n-gram长度
+        threshold (:obj:`float`, optional, defaults to 0.8): 默认的相似度阈值
+        short_text_length (:obj:`int`, optional, defaults to 32): 短文本长度，小于该长度的文本使用SimHash检索
+        simhash_distance (:obj:`int`, optional, defaults to 3): SimHash可检索的最大汉明距离，指纹被分为simhash_distance + 1块
+        seed (:obj:`int`, optional, defaults to 1): 随机种子
+
+    Examples::
+
+        >>> index = LSHIndex()
+        >>> index.add('a', '福建琯溪蜜柚新鲜现摘水果2-3斤/个 微甜')
+        >>> index.query('福建琯溪蜜柚新鲜现摘水果2-3斤/个', threshold=0.8)
+        >>> index.save('./lsh_index.pkl')
+        >>> index = LSHIndex.load('./lsh_index.pkl')
+        >>> index.clusters()
+    """  # noqa: ignore flake8"
+
+    def __init__(
+            self,
+            num_perm: int = 128,
+            bands: int = 32,
+            ngram: int = 3,
+            threshold: float = 0.8,
+            short_text_length: int = 32,
+            simhash_distance: int = 3,
+            seed: int = 1
+    ):
+        if num_perm % bands != 0:
+            raise ValueError('num_perm {} is not divisible by bands {}'.format(num_perm, bands))
+        if simhash_distance + 1 > 64:
+            raise ValueError('simhash_distance should be less than 64')
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.threshold = threshold
+        self.short_text_length = short_text_length
+        self.simhash_distance = simhash_distance
+
+        self._hash_fn = Mmh3(seed)
+        self._simhash_fns = (Mmh3(seed + 1), Mmh3(seed + 2))
+
+        generator = np.random.RandomState(seed)
+        self._perm_a = generator.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._perm_b = generator.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+        # SimHash分块：每块的起始bit和掩码
+        bounds = np.linspace(0, 64, simhash_distance + 2).astype(int)
+        self._simhash_blocks = [(int(start), (1 << int(end - start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])]
+        self._simhash_bits = np.arange(64, dtype=np.uint64)
+
+        self.ids = []
+        self._id2index = {}
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._simhashes = np.zeros(0, dtype=np.uint64)
+        self._short = np.zeros(0, dtype=bool)
+        self._band_tables = [{} for _ in range(bands)]
+        self._simhash_tables = [{} for _ in range(simhash_distance + 1)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._id2index
+
+    def _shingles(self, text: str) -> Counter:
+        if len(text) <= self.ngram:
+            return Counter([text])
+        return Counter(text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1))
+
+    def minhash(self, shingles) -> np.ndarray:
+        """
+        计算MinHash签名
+
+        Args:
+            shingles: 文本的n-gram集合
+        """  # noqa: ignore flake8"
+
+        hashes = np.asarray([self._hash_fn(shingle_) & _UINT32_MASK for shingle_ in shingles], dtype=np.uint64)
+        # (a * h + b) mod p，a < 2^31、h < 2^32，乘积不会溢出uint64
+        permuted = (np.outer(hashes, self._perm_a) + self._perm_b) % np.uint64(_MERSENNE_PRIME)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def simhash(self, shingles: Counter) -> int:
+        """
+        计算64位SimHash指纹，每个n-gram按出现次数加权
+
+        Args:
+            shingles (:obj:`Counter`): 文本的n-gram及出现次数
+        """  # noqa: ignore flake8"
+
+        high_fn, low_fn = self._simhash_fns
+        hashes = np.asarray([((high_fn(shingle_) & _UINT32_MASK) << 32) | (low_fn(shingle_) & _UINT32_MASK)
+                             for shingle_ in shingles], dtype=np.uint64)
+        weights = np.asarray(list(shingles.values()), dtype=np.int64)
+
+        bits = ((hashes[:, None] >> self._simhash_bits) & np.uint64(1)).astype(np.int64)
+        votes = (weights[:, None] * (2 * bits - 1)).sum(axis=0)
+        return int(np.sum(np.uint64(1) << self._simhash_bits[votes > 0], dtype=np.uint64))
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band_.tobytes() for band_ in signature.reshape(self.bands, self.rows)]
+
+    def _simhash_keys(self, simhash: int) -> List[int]:
+        return [(simhash >> start_) & mask_ for start_, mask_ in self._simhash_blocks]
+
+    def _is_short(self, text: str) -> bool:
+        return len(text) < self.short_text_length
+
+    def add(self, doc_id: Hashable, text: str) -> None:
+        """
+        添加文档
+
+        Args:
+            doc_id: 文档id
+            text (:obj:`string`): 文档内容
+
+        Raise ValueError:
+            If the given id already exists.
+        """  # noqa: ignore flake8"
+
+        if doc_id in self._id2index:
+            raise ValueError('{} already exists'.format(doc_id))
+
+        shingles = self._shingles(text)
+        signature = self.minhash(shingles)
+        simhash = self.simhash(shingles)
+
+        index = len(self.ids)
+        if index == len(self._signatures):
+            # 按倍数扩容，避免每次添加都复制全部签名
+            capacity = max(1024, 2 * index)
+            self._signatures = np.concatenate((self._signatures, np.zeros((capacity - index, self.num_perm), dtype=np.uint32)))
+            self._simhashes = np.concatenate((self._simhashes, np.zeros(capacity - index, dtype=np.uint64)))
+            self._short = np.concatenate((self._short, np.zeros(capacity - index, dtype=bool)))
+
+        self._signatures[index] = signature
+        self._simhashes[index] = simhash
+        self._short[index] = self._is_short(text)
+        self.ids.append(doc_id)
+        self._id2index[doc_id] = index
+
+        for table_, key_ in zip(self._band_tables, self._band_keys(signature)):
+            table_.setdefault(key_, []).append(index)
+        for table_, key_ in zip(self._simhash_tables, self._simhash_keys(simhash)):
+            table_.setdefault(key_, []).append(index)
+
+    def _query(self, signature, simhash, is_short, threshold) -> List[Tuple[int, float]]:
+        candidates = set()
+        if is_short:
+            for table_, key_ in zip(self._simhash_tables, self._simhash_keys(simhash)):
+                candidates.update(table_.get(key_, ()))
+        else:
+            for table_, key_ in zip(self._band_tables, self._band_keys(signature)):
+                candidates.update(table_.get(key_, ()))
+
+        if not candidates:
+            return []
+
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        if is_short:
+            distances = np.asarray([bin(int(value_) ^ simhash).count('1') for value_ in self._simhashes[candidates]])
+            similarities = 1 - distances / 64
+            keep = (similarities >= threshold) & (distances <= self.simhash_distance)
+        else:
+            similarities = (self._signatures[candidates] == signature).mean(axis=1)
+            keep = similarities >= threshold
+
+        order = np.argsort(-similarities[keep], kind='stable')
+        return list(zip(candidates[keep][order].tolist(), similarities[keep][order].tolist()))
+
+    def query(self, text: str, threshold: float = None) -> List[Tuple[Hashable, float]]:
+        """
+        查询与文本近似重复的文档
+
+        Args:
+            text (:obj:`string`): 查询文本
+            threshold (:obj:`float`, optional, defaults to None): 相似度阈值，为None时使用初始化时的threshold，
+                短文本的结果同时受simhash_distance限制
+        Returns:
+            (文档id, 相似度)列表，按相似度降序排列
+        """  # noqa: ignore flake8"
+
+        threshold = self.threshold if threshold is None else threshold
+        shingles = self._shingles(text)
+        is_short = self._is_short(text)
+        signature = None if is_short else self.minhash(shingles)
+        simhash = self.simhash(shingles) if is_short else None
+
+        return [(self.ids[index_], similarity_)
+                for index_, similarity_ in self._query(signature, simhash, is_short, threshold)]
+
+    def connected_pairs(self, threshold: float = None) -> Set[Tuple[int, int]]:
+        """
+        索引内所有近似重复的文档对(文档下标)，使用已存储的签名，不需要重新计算
+
+        Args:
+            threshold (:obj:`float`, optional, defaults to None): 相似度阈值
+        """  # noqa: ignore flake8"
+
+        threshold = self.threshold if threshold is None else threshold
+
+        pairs = set()
+        for index_ in range(len(self.ids)):
+            for other_, _ in self._query(self._signatures[index_], int(self._simhashes[index_]),
+                                         bool(self._short[index_]), threshold):
+                if other_ != index_:
+                    pairs.add((min(index_, other_), max(index_, other_)))
+        return pairs
+
+    def clusters(self, threshold: float = None) -> List[Set]:
+        """
+        将近似重复的文档对交给并查集，返回聚类结果
+
+        Args:
+            threshold (:obj:`float`, optional, defaults to None): 相似度阈值
+        """  # noqa: ignore flake8"
+
+        uf = UnionFind(self.ids)
+        for left_, right_ in self.connected_pairs(threshold):
+            uf.union(self.ids[left_], self.ids[right_])
+        return uf.components()
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        保存索引
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存路径
+        """  # noqa: ignore flake8"
+
+        state = self.__dict__.copy()
+        state['_signatures'] = self._signatures[:len(self.ids)]
+        state['_simhashes'] = self._simhashes[:len(self.ids)]
+        state['_short'] = self._short[:len(self.ids)]
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'LSHIndex':
+        """
+        加载索引
+
+        Args:
+            path (:obj:`string` or :obj:`Path`): 保存路径
+        """  # noqa: ignore flake8"
+
+        index = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
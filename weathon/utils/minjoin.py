@@ -6,9 +6,21 @@
 # @Description:
 
 import mmh3
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
 from typing import *
+from pathlib import Path
 import Levenshtein
 
+_UINT64_MASK = (1 << 64) - 1
+_HASH_BASE = 0x100000001B3
+_HASH_BASE_INV = pow(_HASH_BASE, -1, 1 << 64)
+
+# 外存模式下sub_tables每条记录的格式
+_PART_DTYPE = np.dtype([('key', np.uint64), ('sid', np.int64), ('start', np.int64)])
+
 
 class Mmh3:
     def __init__(self, seed: int):
@@ -72,6 +84,227 @@ class Patitioner(object):
         return self._find_part(s, anchors)
 
 
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64，将uint64哈希值打散"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _unique_rows(rows: np.ndarray) -> np.ndarray:
+    """按行去重并按行排序，比np.unique(axis=0)快得多"""
+    if len(rows) == 0:
+        return rows
+    rows = rows[np.lexsort(rows.T[::-1])]
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]).any(axis=1)
+    return rows[keep]
+
+
+def _powers(base: int, n: int) -> np.ndarray:
+    powers = np.full(n, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+class RollingHashPartitioner(Patitioner):
+    """
+    向量化的分块器，对一批文本一次性计算所有w-gram的多项式滚动哈希(mod 2^64)并查找anchor，
+    anchor的判定与Patitioner一致(w-gram哈希在前后z个位置内严格最小)，只是哈希函数由逐个子串调用mmh3换成了按seed打散的滚动哈希
+
+    Args:
+        seg (:obj:`int`): 分段数
+        w (:obj:`int`): gram长度
+        seeds (:obj:`list`): 哈希种子，每个种子对应一组anchor
+        part_size_rate (:obj:`float`, optional, defaults to 0.5): 分块的最小长度比例
+    """  # noqa: ignore flake8"
+
+    def __init__(self, seg: int, w: int, seeds: List[int], part_size_rate: float = 0.5):
+        super(RollingHashPartitioner, self).__init__(seg, w, [], part_size_rate)
+        self.seeds = seeds
+
+    def partition_batch(self, contents: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量分块
+
+        Args:
+            contents (:obj:`list`): 文本列表
+        Returns:
+            keys: 每个分块子串的64位哈希，相同子串的哈希相同
+            sids: 分块所属文本在contents中的下标
+            starts: 分块在文本中的起点
+            ends: 分块在文本中的终点(不含)
+        """  # noqa: ignore flake8"
+
+        lengths = np.asarray([len(s) for s in contents], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        codes = np.frombuffer(''.join(contents).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+        # prefix[x] = sum(codes[y] * base^-y)，子串[a, b)的哈希为 (prefix[b] - prefix[a]) * base^a，与子串所在位置无关
+        power = _powers(_HASH_BASE, len(codes) + 1)
+        prefix = np.zeros(len(codes) + 1, dtype=np.uint64)
+        prefix[1:] = np.cumsum(codes * _powers(_HASH_BASE_INV, len(codes)), dtype=np.uint64)
+
+        def substring_hash(starts, ends):
+            return (prefix[ends] - prefix[starts]) * power[starts]
+
+        gram_nums = np.maximum(lengths - self.w + 1, 0)
+        gram_sids = np.repeat(np.arange(len(contents)), gram_nums)
+        gram_offsets = np.concatenate(([0], np.cumsum(gram_nums))).astype(np.int64)
+        gram_local = np.arange(len(gram_sids)) - gram_offsets[gram_sids]
+        gram_positions = offsets[gram_sids] + gram_local
+        gram_hashes = substring_hash(gram_positions, gram_positions + self.w)
+
+        z = np.maximum(1, (lengths // self.seg) // 2)
+        gram_z = z[gram_sids]
+        gram_right = gram_nums[gram_sids] - gram_local - 1
+        thresholds = (lengths * self.rate / self.seg).astype(np.int64)
+
+        parts = []
+        for seed in self.seeds:
+            h = _mix64(gram_hashes ^ _mix64(np.asarray([seed & _UINT64_MASK], dtype=np.uint64)))
+
+            anchor = np.ones(len(h), dtype=bool)
+            for d in range(1, int(gram_z.max()) + 1 if len(h) else 1):
+                right = np.ones(len(h), dtype=bool)
+                right[:-d] = h[:-d] < h[d:]
+                left = np.ones(len(h), dtype=bool)
+                left[d:] = h[d:] < h[:-d]
+                ok = (right | (gram_right < d)) & (left | (gram_local < d))
+                anchor &= (gram_z < d) | ok
+
+            # 每个文本的切分点：0、anchor、文本长度
+            sids = np.concatenate((np.arange(len(contents)), gram_sids[anchor], np.arange(len(contents))))
+            positions = np.concatenate((np.zeros(len(contents), dtype=np.int64), gram_local[anchor], lengths))
+            order = np.lexsort((positions, sids))
+            sids, positions = sids[order], positions[order]
+
+            keep = (sids[:-1] == sids[1:]) & (positions[1:] - positions[:-1] > thresholds[sids[:-1]])
+            parts.append(np.stack((sids[:-1][keep], positions[:-1][keep], positions[1:][keep]), axis=1))
+
+        parts = _unique_rows(np.concatenate(parts)) if parts else np.zeros((0, 3), dtype=np.int64)
+        sids, starts, ends = parts[:, 0], parts[:, 1], parts[:, 2]
+        hashes = substring_hash(offsets[sids] + starts, offsets[sids] + ends)
+        keys = _mix64(hashes ^ _mix64(ends.astype(np.uint64) - starts.astype(np.uint64)))
+
+        return keys, sids, starts, ends
+
+
+def candidate_pairs(keys: np.ndarray, sids: np.ndarray, starts: np.ndarray, lengths: np.ndarray, sim: float) -> np.ndarray:
+    """
+    从sub_tables中生成候选文本对：同一子串下按文本长度排序，只比较长度差和分块位置差都在阈值内的文本
+
+    Args:
+        keys (:obj:`np.ndarray`): 分块子串哈希
+        sids (:obj:`np.ndarray`): 分块所属文本下标
+        starts (:obj:`np.ndarray`): 分块起点
+        lengths (:obj:`np.ndarray`): 文本长度，按文本下标索引
+        sim (:obj:`float`): 相似度阈值
+    Returns:
+        去重后的候选文本对，shape为(pair_num, 2)，每行前一个下标小于后一个
+    """  # noqa: ignore flake8"
+
+    entry_lengths = lengths[sids]
+    order = np.lexsort((entry_lengths, keys))
+    keys, sids, starts, entry_lengths = keys[order], sids[order], starts[order], entry_lengths[order]
+
+    pairs = []
+    left = np.arange(len(keys) - 1)
+    offset = 1
+    while len(left):
+        right = left + offset
+        left, right = left[right < len(keys)], right[right < len(keys)]
+
+        # 同一组内长度升序，长度差超过阈值后该left之后的文本都不再满足，直接淘汰
+        thresh = (1 - sim) * entry_lengths[right]
+        alive = (keys[left] == keys[right]) & (entry_lengths[right] - entry_lengths[left] <= thresh)
+        left, right, thresh = left[alive], right[alive], thresh[alive]
+
+        left_index, right_index = starts[left], starts[right]
+        shift = np.abs(left_index - right_index) + \
+            np.abs(entry_lengths[left] - left_index - entry_lengths[right] + right_index)
+        matched = (shift <= thresh) & (sids[left] != sids[right])
+        pairs.append(np.stack((sids[left][matched], sids[right][matched]), axis=1))
+        offset += 1
+
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    return _unique_rows(np.sort(np.concatenate(pairs), axis=1))
+
+
+def banded_distance_within(left: str, right: str, sim: float) -> bool:
+    """
+    判断编辑距离是否不超过 (1 - sim) * 较长文本长度，使用带截断的编辑距离，超过阈值后提前结束
+
+    Args:
+        left (:obj:`string`): 文本
+        right (:obj:`string`): 文本
+        sim (:obj:`float`): 相似度阈值
+    """  # noqa: ignore flake8"
+
+    thresh = (1 - sim) * max(len(left), len(right))
+    if abs(len(left) - len(right)) > thresh:
+        return False
+    return Levenshtein.distance(left, right, score_cutoff=int(thresh)) <= thresh
+
+
+# 进程池中使用的共享状态，fork时由子进程直接继承，不需要序列化
+_SHARED_STATE = None
+
+
+def _init_shared_state(state):
+    global _SHARED_STATE
+    _SHARED_STATE = state
+
+
+def _pool_map(func, tasks, n_jobs, state):
+    if n_jobs <= 1:
+        _init_shared_state(state)
+        try:
+            return [func(task) for task in tasks]
+        finally:
+            _init_shared_state(None)
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _init_shared_state(state)
+        try:
+            with multiprocessing.get_context('fork').Pool(n_jobs) as pool:
+                return pool.map(func, tasks, chunksize=1)
+        finally:
+            _init_shared_state(None)
+
+    with multiprocessing.Pool(n_jobs, initializer=_init_shared_state, initargs=(state,)) as pool:
+        return pool.map(func, tasks, chunksize=1)
+
+
+def _partition_shard(args):
+    start, end, shard_dir, num_buckets = args
+    contents, partitioner = _SHARED_STATE['contents'], _SHARED_STATE['partitioner']
+    keys, sids, starts, _ = partitioner.partition_batch(contents[start:end])
+    sids = sids + start
+
+    if shard_dir is None:
+        return keys, sids, starts
+
+    # 外存模式：按子串哈希分桶写入磁盘，同一子串的记录一定在同一个桶中
+    records = np.empty(len(keys), dtype=_PART_DTYPE)
+    records['key'], records['sid'], records['start'] = keys, sids, starts
+    buckets = (keys % np.uint64(num_buckets)).astype(np.int64)
+    order = np.argsort(buckets, kind='stable')
+    bounds = np.searchsorted(buckets[order], np.arange(num_buckets + 1))
+    for bucket_ in range(num_buckets):
+        records[order[bounds[bucket_]:bounds[bucket_ + 1]]].tofile(Path(shard_dir) / f'bucket-{bucket_}-{start}.bin')
+    return None
+
+
+def _verify_shard(pairs):
+    contents, sim = _SHARED_STATE['contents'], _SHARED_STATE['sim']
+    return np.asarray([banded_distance_within(contents[left_], contents[right_], sim)
+                       for left_, right_ in pairs.tolist()], dtype=bool)
+
+
 class MinJoin(object):
 
     def __init__(self, seeds: List[int], max_length: int, sim: float, ngram: int):
@@ -89,6 +322,7 @@ class MinJoin(object):
                 sub_tables.setdefault(sub, []).append((s, index))
 
         res: Dict[str, List[str]] = {}
+        matched: Set[Tuple[str, str]] = set()
         for _, values in sub_tables.items():
             values.sort(key=lambda x: len(x[0]))
 
@@ -97,7 +331,7 @@ class MinJoin(object):
                 left_n = len(left)
                 for j in range(i + 1, len(values)):
                     right, right_index = values[j]
-                    if right == left or right in res.get(left, []):
+                    if right == left or (left, right) in matched:
                         continue
                     right_n = len(right)
                     # length = max(left_n,right_n)
@@ -109,13 +343,85 @@ class MinJoin(object):
                         continue
                     if Levenshtein.distance(left, right) > thresh:
                         continue
+                    matched.add((left, right))
+                    matched.add((right, left))
                     res.setdefault(left, []).append(right)
                     res.setdefault(right, []).append(left)
         return res
 
+    def process_scalable(
+            self,
+            contents: List[str],
+            n_jobs: int = 1,
+            chunk_size: int = 100000,
+            tmp_dir: Optional[str] = None,
+            num_buckets: int = 64
+    ) -> Dict[str, List[str]]:
+        """
+        面向大规模数据的MinJoin：向量化滚动哈希批量查找anchor，分块按文本分片在多进程中计算，
+        候选对去重后使用带截断的编辑距离校验；指定tmp_dir时sub_tables按子串哈希分桶写入磁盘，逐桶生成候选对
+
+        与process的区别在于anchor使用的哈希函数不同，因此分块结果不完全相同，返回格式与process一致
+
+        Args:
+            contents (:obj:`list`): 文本列表
+            n_jobs (:obj:`int`, optional, defaults to 1): 进程数
+            chunk_size (:obj:`int`, optional, defaults to 100000): 每个分片的文本数
+            tmp_dir (:obj:`string`, optional, defaults to None): 外存目录，为None时sub_tables保存在内存中
+            num_buckets (:obj:`int`, optional, defaults to 64): 外存模式下的分桶数
+        """  # noqa: ignore flake8"
+
+        contents = list(dict.fromkeys(contents))
+        lengths = np.asarray([len(s) for s in contents], dtype=np.int64)
+        partitioner = RollingHashPartitioner(self.seg, self.ngram, self.seeds)
+        state = {'contents': contents, 'partitioner': partitioner, 'sim': self.sim}
+
+        shard_dir = None if tmp_dir is None else tempfile.mkdtemp(dir=tmp_dir)
+        try:
+            tasks = [(start_, min(start_ + chunk_size, len(contents)), shard_dir, num_buckets)
+                     for start_ in range(0, len(contents), chunk_size)]
+            shards = _pool_map(_partition_shard, tasks, n_jobs, state)
+
+            pairs = []
+            if shard_dir is None:
+                if shards:
+                    keys, sids, starts = (np.concatenate(column) for column in zip(*shards))
+                    pairs.append(candidate_pairs(keys, sids, starts, lengths, self.sim))
+            else:
+                for bucket_ in range(num_buckets):
+                    records = [np.fromfile(file_, dtype=_PART_DTYPE)
+                               for file_ in sorted(Path(shard_dir).glob(f'bucket-{bucket_}-*.bin'))]
+                    if not records:
+                        continue
+                    records = np.concatenate(records)
+                    pairs.append(candidate_pairs(records['key'], records['sid'], records['start'], lengths, self.sim))
+        finally:
+            if shard_dir is not None:
+                shutil.rmtree(shard_dir, ignore_errors=True)
+
+        pairs = _unique_rows(np.concatenate(pairs)) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+        verify_size = max(1, -(-len(pairs) // max(n_jobs * 4, 1)))
+        verified = _pool_map(_verify_shard,
+                             [pairs[start_:start_ + verify_size] for start_ in range(0, len(pairs), verify_size)],
+                             n_jobs,
+                             state)
+        if verified:
+            pairs = pairs[np.concatenate(verified)]
+
+        res: Dict[str, List[str]] = {}
+        for left_, right_ in pairs.tolist():
+            res.setdefault(contents[left_], []).append(contents[right_])
+            res.setdefault(contents[right_], []).append(contents[left_])
+        return res
+
 
-def generate_edges(text_ids_mapping: Dict[str, Set[str]], min_join: MinJoin) -> Set[Tuple[str, str]]:
-    res = min_join.process(list(text_ids_mapping.keys()))
+def generate_edges(text_ids_mapping: Dict[str, Set[str]], min_join: MinJoin, scalable: bool = False,
+                   **kwargs) -> Set[Tuple[str, str]]:
+    if scalable:
+        res = min_join.process_scalable(list(text_ids_mapping.keys()), **kwargs)
+    else:
+        res = min_join.process(list(text_ids_mapping.keys()))
     edges = set()
 
     for key, value_list in res.items():
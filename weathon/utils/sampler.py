@@ -1,4 +1,5 @@
 import torch
+import numpy as np
 import torch.utils.data
 
 
@@ -61,3 +62,71 @@ class ImbalancedDatasetSampler(torch.utils.data.sampler.Sampler):
 
     def __len__(self):
         return self.num_samples
+
+
+class LengthBucketBatchSampler(torch.utils.data.sampler.Sampler):
+    """
+    按样本有效长度分桶的batch采样器：先打乱样本，再在每个大小为batch_size * bucket_size_multiplier的桶内按长度排序并切分batch，
+    最后打乱batch的顺序。与动态padding配合使用时，batch内样本长度相近，可以大幅减少padding部分的无效计算
+
+    Args:
+        dataset (:obj:`ark_nlp dataset`): batch文本
+        batch_size (:obj:`int`): batch大小
+        shuffle (:obj:`bool`, optional, defaults to True): 是否打乱样本和batch的顺序
+        drop_last (:obj:`bool`, optional, defaults to False): 是否丢弃桶内不足batch_size的batch
+        bucket_size_multiplier (:obj:`int`, optional, defaults to 100): 每个桶包含的batch数
+        callback_get_length (:obj:`function`, optional, defaults to None): 自定义获取样本长度的函数
+
+    Examples::
+
+        >>> train_generator = DataLoader(train_data, batch_sampler=LengthBucketBatchSampler(train_data, batch_size=32))
+    """
+
+    def __init__(self, dataset, batch_size, shuffle=True, drop_last=False, bucket_size_multiplier=100,
+                 callback_get_length=None):
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.bucket_size = batch_size * bucket_size_multiplier
+
+        # define custom callback
+        self.callback_get_length = callback_get_length
+
+        self.lengths = [self._get_length(dataset, idx) for idx in range(len(dataset))]
+
+    def _get_length(self, dataset, idx):
+        if self.callback_get_length:
+            return self.callback_get_length(dataset, idx)
+
+        row = dataset[idx]
+        if 'attention_mask' in row:
+            return int(np.count_nonzero(row['attention_mask']))
+        elif 'input_lengths' in row:
+            return int(row['input_lengths'])
+        else:
+            return len(row['input_ids'])
+
+    def __iter__(self):
+        indices = torch.randperm(len(self.lengths)).tolist() if self.shuffle else list(range(len(self.lengths)))
+
+        batches = []
+        for bucket_start in range(0, len(indices), self.bucket_size):
+            bucket = sorted(indices[bucket_start:bucket_start + self.bucket_size], key=lambda idx: self.lengths[idx])
+            for batch_start in range(0, len(bucket), self.batch_size):
+                batch = bucket[batch_start:batch_start + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch)
+
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches)).tolist()]
+
+        return iter(batches)
+
+    def __len__(self):
+        full_bucket_num, rest_size = divmod(len(self.lengths), self.bucket_size)
+        batch_num = full_bucket_num * (self.bucket_size // self.batch_size)
+        if self.drop_last:
+            return batch_num + rest_size // self.batch_size
+        return batch_num + (rest_size + self.batch_size - 1) // self.batch_size
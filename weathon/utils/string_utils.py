@@ -6,14 +6,17 @@
 # @Description:
 
 import os
+import re as std_re
 import html
+import multiprocessing
 import pypinyin
 import regex as re
 import unicodedata
 import urllib
 import urllib.parse
 import w3lib.html
-from typing import List, Union
+from functools import lru_cache
+from typing import List, Union, Iterable
 from opencc import OpenCC
 from weathon.utils.char_utils import CharUtils
 from weathon.utils.dictionary import Dictionary
@@ -24,6 +27,60 @@ def add_curr_dir(name):
     return os.path.join(os.path.dirname(__file__), name)
 
 
+@lru_cache(maxsize=None)
+def get_opencc(convert_type: str) -> OpenCC:
+    """按转换类型缓存OpenCC对象，构建OpenCC需要加载词典，耗时远大于一次转换"""
+    return OpenCC(convert_type)
+
+
+# 全角转半角：全角空格转为半角空格，其余全角字符 = 半角字符 + 0xfee0
+_Q2B_TABLE = {0x3000: 0x0020, **{code_ + 0xfee0: code_ for code_ in range(0x0020, 0x007f)}}
+# unicode不可见字符(未转义)
+_ZERO_WIDTH_TABLE = dict.fromkeys(range(0x200b, 0x200e))
+_PUNC_PATTERNS = (
+    re.compile("[。，！？、；：“”‘’（）【】\{\}『』「」〔〕——……—\-～·《》〈〉﹏___\.]"),
+    re.compile(
+        "[,\.\":\)\(\-!\?\|;'\$&/\[\]>%=#\*\+\\•~@£·_\{\}©\^®`<→°€™›♥←×§″′Â█½à…“★”–●â►−¢²¬░¶↑±¿▾═¦║―¥▓—‹─▒：¼⊕▼▪†■’▀¨▄♫☆é¯♦¤▲è¸¾Ã⋅‘∞∙）↓、│（»，♪╩╚³・╦╣╔╗▬❤ïØ¹≤‡√]"),
+)
+
+
+class MultiPatternReplacer:
+    """
+    多模式串替换：所有模式串编译为一个按长度降序排列的正则分支，一次扫描完成全部替换，
+    同一位置优先匹配最长的模式串，与AC自动机的最左最长匹配一致
+
+    Args:
+        mapping (:obj:`dict`): 模式串 -> 替换后的文本
+
+    Examples::
+
+        >>> replacer = MultiPatternReplacer({'/::~': '撇嘴', '转发微博': ''})
+        >>> replacer.replace('转发微博/::~')
+    """  # noqa: ignore flake8"
+
+    def __init__(self, mapping: dict):
+        self.mapping = {key_: value_ for key_, value_ in mapping.items() if key_}
+        keys = sorted(self.mapping, key=len, reverse=True)
+        # 模式串均为普通字符串，标准库re对纯文本分支的匹配比regex更快
+        self._pattern = std_re.compile("|".join(std_re.escape(key_) for key_ in keys)) if keys else None
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def _lookup(self, match) -> str:
+        return self.mapping[match.group()]
+
+    def replace(self, text: str) -> str:
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(self._lookup, text)
+
+
+@lru_cache(maxsize=None)
+def _wechat_expression_replacer() -> MultiPatternReplacer:
+    return MultiPatternReplacer(Dictionary.wechat_expression())
+
+
 class StringUtils:
 
     @staticmethod
@@ -92,81 +149,17 @@ class StringUtils:
         Returns: 清洗后的文本
         """
 
-        text = StringUtils.as_text(text)
-        # unicode不可见字符
-        # 未转义
-        text = re.sub(r"[\u200b-\u200d]", "", text)
-        # 已转义
-        text = re.sub(r"(\\u200b|\\u200c|\\u200d)", "", text)
-        # 反向的矛盾设置
-        if norm_url and to_url:
-            raise Exception("norm_url和to_url是矛盾的设置")
-        if norm_html:
-            text = html.unescape(text)
-        if to_url:
-            text = urllib.parse.quote(text)
-        if remove_tags:
-            text = w3lib.html.remove_tags(text)
-        if remove_url:
-            try:
-                URL_REGEX = re.compile(
-                    r'(?i)http[s]?://(?:[a-zA-Z]|[0-9]|[#$%*-;=?&@~.&+]|[!*,])+',
-                    re.IGNORECASE)
-                text = re.sub(URL_REGEX, "", text)
-            except:
-                # sometimes lead to "catastrophic backtracking"
-                zh_puncts1 = "，；、。！？（）《》【】"
-                URL_REGEX = re.compile(
-                    r'(?i)((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>' + zh_puncts1 + ']+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:\'".,<>?«»“”‘’' + zh_puncts1 + ']))',
-                    re.IGNORECASE)
-                text = re.sub(URL_REGEX, "", text)
-        if norm_url:
-            text = urllib.parse.unquote(text)
-        if email:
-            EMAIL_REGEX = re.compile(r"[-a-z0-9_.]+@(?:[-a-z0-9]+\.)+[a-z]{2,6}", re.IGNORECASE)
-            text = re.sub(EMAIL_REGEX, "", text)
-        if weibo_at:
-            text = re.sub(r"(回复)?(//)?\s*@\S*?\s*(:|：| |$)", " ", text)  # 去除正文中的@和回复/转发中的用户名
-        if wx_emoji2word:
-            text = StringUtils.wechat_expression_2_word(text)
-        if emoji:
-            # 去除括号包围的表情符号
-            # ? lazy match避免把两个表情中间的部分去除掉
-            if type(expression_len) in {tuple, list} and len(expression_len) == 2:
-                # 设置长度范围避免误伤人用的中括号内容，如[加上特别番外荞麦花开时共五册]
-                lb, rb = expression_len
-                text = re.sub(r"\[\S{" + str(lb) + r"," + str(rb) + r"}?\]", "", text)
-            else:
-                text = re.sub(r"\[\S+?\]", "", text)
-            # text = re.sub(r"\[\S+\]", "", text)
-            # 去除真,图标式emoji
-            emoji_pattern = re.compile("["
-                                       u"\U0001F600-\U0001F64F"  # emoticons
-                                       u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                                       u"\U0001F680-\U0001F6FF"  # transport & map symbols
-                                       u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                                       u"\U00002702-\U000027B0"
-                                       "]+", flags=re.UNICODE)
-            text = emoji_pattern.sub(r'', text)
-        if weibo_topic:
-            text = re.sub(r"#\S+#", "", text)  # 去除话题内容
-        if linesep2space:
-            text = text.replace("\n", " ")  # 不需要换行的时候变成1行
-        if deduplicate_space:
-            text = re.sub(r"(\s)+", r"\1", text)  # 合并正文中过多的空格
-        if t2s:
-            text = StringUtils.traditional2simple(text)
-        assert hasattr(stop_terms, "__iter__"), Exception("去除的词语必须是一个可迭代对象")
-        if type(stop_terms) == str:
-            text = text.replace(stop_terms, "")
-        else:
-            for x in stop_terms:
-                text = text.replace(x, "")
-        if remove_puncts:
-            text = StringUtils.remove_string_punc(text)
-        if q2b:
-            text = StringUtils.Q2B(text)
-        return text.strip()
+        # 相同参数的清洗器只构建一次，批量清洗请直接使用TextCleaner.clean_many
+        cleaner = _get_text_cleaner(
+            remove_url=remove_url, email=email, weibo_at=weibo_at,
+            stop_terms=stop_terms if isinstance(stop_terms, str) or not hasattr(stop_terms, "__iter__") else tuple(stop_terms),
+            emoji=emoji, weibo_topic=weibo_topic, deduplicate_space=deduplicate_space,
+            norm_url=norm_url, norm_html=norm_html, to_url=to_url,
+            remove_puncts=remove_puncts, remove_tags=remove_tags, t2s=t2s, q2b=q2b, wx_emoji2word=wx_emoji2word,
+            expression_len=tuple(expression_len) if type(expression_len) in {tuple, list} else expression_len,
+            linesep2space=linesep2space
+        )
+        return cleaner.clean(text)
 
     @staticmethod
     def cut_sentences(sentence: str) -> List[str]:
@@ -238,7 +231,7 @@ class StringUtils:
 
         Returns:转化后字符串
         """
-        return "".join([CharUtils.Q2B(c) for c in text])
+        return text.translate(_Q2B_TABLE)
 
     @staticmethod
     def as_text(text: str) -> Union[str, None]:
@@ -259,24 +252,21 @@ class StringUtils:
     @staticmethod
     def wechat_expression_2_word(text: str) -> str:
         """将文本中的微信表情代码转化成文字"""
-        code_expression = Dictionary.wechat_expression()
-        for key, value in code_expression.items():
-            text = text.replace(key, value)
-        return text
+        return _wechat_expression_replacer().replace(text)
 
     @staticmethod
     def traditional2japanese(text: str) -> str:
         """
         日文新字体 转化 为繁体
         """
-        return OpenCC("jp2t").convert(text)
+        return get_opencc("jp2t").convert(text)
 
     @staticmethod
     def Japanese2traditional(text: str) -> str:
         """
         繁體（OpenCC 標準，舊字體）到日文新字體  繁体转化为日文新字体
         """
-        return OpenCC("t2jp").convert(text)
+        return get_opencc("t2jp").convert(text)
 
     @staticmethod
     def traditional2traditional(text: str, convert_type=""):
@@ -291,7 +281,7 @@ class StringUtils:
         Returns:
         """
         assert len(convert_type) != 0, "convert_type is none, must be in ['t2tw','hk2t','t2hk','tw2t']"
-        return OpenCC(convert_type).convert(text)
+        return get_opencc(convert_type).convert(text)
 
     @staticmethod
     def traditional2simple(text: str, convert_type="t2s") -> str:
@@ -307,7 +297,7 @@ class StringUtils:
         """
         # word_map = Dictionary.traditional2simple_dic()
         # return Converter(ConvertMap(word_map)).convert(text)
-        return OpenCC(convert_type).convert(text)
+        return get_opencc(convert_type).convert(text)
 
     @staticmethod
     def simple2traditional(text: str, convert_type="s2t") -> str:
@@ -323,7 +313,7 @@ class StringUtils:
         """
         # word_map = Dictionary.simple2traditional_dic()
         # return Converter(ConvertMap(word_map)).convert(text)
-        return OpenCC(convert_type).convert(text)
+        return get_opencc(convert_type).convert(text)
 
     @staticmethod
     def text2pinyin(text: str, with_tone: bool = False) -> List[str]:
@@ -350,13 +340,208 @@ class StringUtils:
     @staticmethod
     def remove_string_punc(s: str) -> str:
         """去除字符串中的标点符号"""
-        s = re.compile("[。，！？、；：“”‘’（）【】\{\}『』「」〔〕——……—\-～·《》〈〉﹏___\.]").sub("", s)
-        s = re.compile(
-            "[,\.\":\)\(\-!\?\|;'\$&/\[\]>%=#\*\+\\•~@£·_\{\}©\^®`<→°€™›♥←×§″′Â█½à…“★”–●â►−¢²¬░¶↑±¿▾═¦║―¥▓—‹─▒：¼⊕▼▪†■’▀¨▄♫☆é¯♦¤▲è¸¾Ã⋅‘∞∙）↓、│（»，♪╩╚³・╦╣╔╗▬❤ïØ¹≤‡√]").sub(
-            "", s)
+        for pattern_ in _PUNC_PATTERNS:
+            s = pattern_.sub("", s)
         return s
 
 
+# clean_many在子进程中使用的清洗器，fork时由子进程直接继承，不需要序列化
+_SHARED_CLEANER = None
+
+
+def _init_shared_cleaner(cleaner):
+    global _SHARED_CLEANER
+    _SHARED_CLEANER = cleaner
+
+
+def _clean_shared(text):
+    return _SHARED_CLEANER.clean(text)
+
+
+class TextCleaner:
+    """
+    预编译的文本清洗流水线，清洗结果与StringUtils.clean_text一致：
+    构建时根据选项编译好全部正则、缓存OpenCC转换器，微信表情替换使用一次扫描的多模式串替换，
+    每次清洗只执行选中的步骤
+
+    Args:
+        参数含义与StringUtils.clean_text一致
+
+    Examples::
+
+        >>> cleaner = TextCleaner(emoji=True, remove_url=True)
+        >>> cleaner.clean('各位大神们🙏求教一下这是什么动物呀！[疑问] http://t.cn/A6bXIC44')
+        >>> cleaner.clean_many(texts, n_jobs=4)
+
+    Raise Exception:
+        If both norm_url and to_url are set.
+    """  # noqa: ignore flake8"
+
+    _URL_PATTERN = r'(?i)http[s]?://(?:[a-zA-Z]|[0-9]|[#$%*-;=?&@~.&+]|[!*,])+'
+    # 上面的正则有时会出现"catastrophic backtracking"，出错时使用该正则
+    _ZH_PUNCTS = "，；、。！？（）《》【】"
+    _URL_FALLBACK_PATTERN = r'(?i)((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>' + _ZH_PUNCTS + ']+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:\'".,<>?«»“”‘’' + _ZH_PUNCTS + ']))'
+    _EMOJI_PATTERN = ("["
+                      u"\U0001F600-\U0001F64F"  # emoticons
+                      u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+                      u"\U0001F680-\U0001F6FF"  # transport & map symbols
+                      u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+                      u"\U00002702-\U000027B0"
+                      "]+")
+
+    def __init__(self, remove_url=False, email=False, weibo_at=False, stop_terms=("转发微博",),
+                 emoji=False, weibo_topic=False, deduplicate_space=True,
+                 norm_url=False, norm_html=False, to_url=False,
+                 remove_puncts=False, remove_tags=True, t2s=True, q2b=True, wx_emoji2word=True,
+                 expression_len=(1, 6), linesep2space=False):
+        # 反向的矛盾设置
+        if norm_url and to_url:
+            raise Exception("norm_url和to_url是矛盾的设置")
+        assert hasattr(stop_terms, "__iter__"), Exception("去除的词语必须是一个可迭代对象")
+
+        self.options = dict(
+            remove_url=remove_url, email=email, weibo_at=weibo_at, stop_terms=stop_terms,
+            emoji=emoji, weibo_topic=weibo_topic, deduplicate_space=deduplicate_space,
+            norm_url=norm_url, norm_html=norm_html, to_url=to_url,
+            remove_puncts=remove_puncts, remove_tags=remove_tags, t2s=t2s, q2b=q2b, wx_emoji2word=wx_emoji2word,
+            expression_len=expression_len, linesep2space=linesep2space
+        )
+
+        # 按clean_text中的顺序组装清洗步骤
+        steps = [self._remove_zero_width]
+        if norm_html:
+            steps.append(html.unescape)
+        if to_url:
+            steps.append(urllib.parse.quote)
+        if remove_tags:
+            steps.append(w3lib.html.remove_tags)
+        if remove_url:
+            self._url_regex = re.compile(self._URL_PATTERN, re.IGNORECASE)
+            self._url_fallback_regex = re.compile(self._URL_FALLBACK_PATTERN, re.IGNORECASE)
+            steps.append(self._remove_url)
+        if norm_url:
+            steps.append(urllib.parse.unquote)
+        if email:
+            steps.append(self._sub_step(re.compile(r"[-a-z0-9_.]+@(?:[-a-z0-9]+\.)+[a-z]{2,6}", re.IGNORECASE), ""))
+        if weibo_at:
+            # 去除正文中的@和回复/转发中的用户名
+            steps.append(self._sub_step(re.compile(r"(回复)?(//)?\s*@\S*?\s*(:|：| |$)"), " "))
+        if wx_emoji2word:
+            steps.append(_wechat_expression_replacer().replace)
+        if emoji:
+            # ? lazy match避免把两个表情中间的部分去除掉，设置长度范围避免误伤人用的中括号内容
+            if type(expression_len) in {tuple, list} and len(expression_len) == 2:
+                lb, rb = expression_len
+                steps.append(self._sub_step(re.compile(r"\[\S{" + str(lb) + r"," + str(rb) + r"}?\]"), ""))
+            else:
+                steps.append(self._sub_step(re.compile(r"\[\S+?\]"), ""))
+            steps.append(self._sub_step(re.compile(self._EMOJI_PATTERN, flags=re.UNICODE), ""))
+        if weibo_topic:
+            steps.append(self._sub_step(re.compile(r"#\S+#"), ""))
+        if linesep2space:
+            steps.append(self._linesep2space)
+        if deduplicate_space:
+            steps.append(self._sub_step(re.compile(r"(\s)+"), r"\1"))
+        if t2s:
+            steps.append(get_opencc("t2s").convert)
+
+        # 停用词按给定顺序依次删除，前一个词删除后拼接出的新词也会被后面的词删除，与clean_text一致
+        self._stop_terms = tuple(term_ for term_ in ((stop_terms,) if isinstance(stop_terms, str) else stop_terms)
+                                 if term_)
+        if self._stop_terms:
+            steps.append(self._remove_stop_terms)
+
+        if remove_puncts:
+            steps.append(StringUtils.remove_string_punc)
+        if q2b:
+            steps.append(StringUtils.Q2B)
+        self._steps = steps
+
+    def __getstate__(self):
+        # 正则与OpenCC对象无法序列化，子进程中根据选项重新构建
+        return self.options
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @staticmethod
+    def _sub_step(pattern, repl):
+        def sub(text):
+            return pattern.sub(repl, text)
+
+        return sub
+
+    @staticmethod
+    def _remove_zero_width(text):
+        # 未转义
+        text = text.translate(_ZERO_WIDTH_TABLE)
+        # 已转义
+        if "\\u200" in text:
+            text = text.replace("\\u200b", "").replace("\\u200c", "").replace("\\u200d", "")
+        return text
+
+    @staticmethod
+    def _linesep2space(text):
+        # 不需要换行的时候变成1行
+        return text.replace("\n", " ")
+
+    def _remove_url(self, text):
+        try:
+            return self._url_regex.sub("", text)
+        except Exception:
+            return self._url_fallback_regex.sub("", text)
+
+    def _remove_stop_terms(self, text):
+        for term_ in self._stop_terms:
+            text = text.replace(term_, "")
+        return text
+
+    def clean(self, text) -> str:
+        """
+        清洗单条文本
+
+        Args:
+            text (:obj:`string` or :obj:`bytes`): 输入文本
+        """  # noqa: ignore flake8"
+
+        text = StringUtils.as_text(text)
+        for step_ in self._steps:
+            text = step_(text)
+        return text.strip()
+
+    def __call__(self, text) -> str:
+        return self.clean(text)
+
+    def clean_many(self, texts: Iterable, n_jobs: int = 1, chunksize: int = 1000) -> List[str]:
+        """
+        批量清洗文本，结果与逐条调用clean一致
+
+        Args:
+            texts (:obj:`list`): 文本列表
+            n_jobs (:obj:`int`, optional, defaults to 1): 进程数，大于1时使用进程池，支持fork的系统上子进程直接共享已编译的清洗器
+            chunksize (:obj:`int`, optional, defaults to 1000): 每次分发给子进程的文本数
+        """  # noqa: ignore flake8"
+
+        if n_jobs <= 1:
+            return [self.clean(text_) for text_ in texts]
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _init_shared_cleaner(self)
+            try:
+                with multiprocessing.get_context('fork').Pool(n_jobs) as pool:
+                    return pool.map(_clean_shared, texts, chunksize=chunksize)
+            finally:
+                _init_shared_cleaner(None)
+
+        with multiprocessing.Pool(n_jobs, initializer=_init_shared_cleaner, initargs=(self,)) as pool:
+            return pool.map(_clean_shared, texts, chunksize=chunksize)
+
+
+@lru_cache(maxsize=32)
+def _get_text_cleaner(**options) -> TextCleaner:
+    return TextCleaner(**options)
+
+
 if __name__ == '__main__':
     # print(StringUtils.simple2traditional(
     #     "现代社会，很多人都想有个红颜知己，也就是异性朋友，在自己孤独寂寞时，可以有个出口。只是异性朋友在一起，难免会引人遐想，或许你只是单纯地认为，有个这样的朋友，能让自己可以放心诉说心事，还能够保持单纯的朋友关系。"))
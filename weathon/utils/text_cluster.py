@@ -6,9 +6,15 @@
 # @Description:
 import math
 import random
+import itertools
 
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
 from collections import Counter, OrderedDict
 
+from weathon.utils.minjoin import Mmh3
+
 
 class TextCluster:
 
@@ -81,8 +87,56 @@ class TextCluster:
 
         return features, vocab
 
+    def sparse_features(self, corpus, tokenizer=list, features_method='tfidf'):
+        """一次遍历语料构建稀疏的词频或 tfidf 特征，词表顺序与 count_features/tfidf_features 一致
+
+        :param corpus: list of str
+        :param tokenizer: function for tokenize, default is `list`
+        :param features_method: str
+            提取文本特征的方法，目前支持 tfidf 和 count 两种。
+        :return:
+            features: scipy.sparse.csr_matrix, [n_samples, n_features]
+            names: list of str
+        """
+        if features_method not in ('tfidf', 'count'):
+            raise ValueError('features_method error')
+
+        word2id = {}
+        indptr, indices, data = [0], [], []
+        for doc in corpus:
+            counter = Counter(tokenizer(doc))
+            for word_, count_ in counter.items():
+                indices.append(word2id.setdefault(word_, len(word2id)))
+                data.append(count_)
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int64)
+        data = np.asarray(data, dtype=np.float64)
+        indptr = np.asarray(indptr, dtype=np.int64)
+
+        # 词表按总词频降序排列，词频相同时保持首次出现的顺序，与Counter.most_common一致
+        totals = np.bincount(indices, weights=data, minlength=len(word2id))
+        order = np.argsort(-totals, kind='stable')
+        new_ids = np.empty(len(word2id), dtype=np.int64)
+        new_ids[order] = np.arange(len(word2id))
+        indices = new_ids[indices]
+        words = list(word2id)
+        names = [words[index_] for index_ in order.tolist()]
+
+        if features_method == 'tfidf':
+            total_doc = len(corpus)
+            doc_freqs = np.bincount(indices, minlength=len(word2id))
+            idf = np.where(doc_freqs == total_doc, 0.0, np.log(total_doc / (doc_freqs + 1)))
+            doc_lengths = np.bincount(np.repeat(np.arange(total_doc), np.diff(indptr)), weights=data,
+                                      minlength=total_doc)
+            data = data / np.maximum(np.repeat(doc_lengths, np.diff(indptr)), 1) * idf[indices]
+
+        features = sp.csr_matrix((data, indices, indptr), shape=(len(corpus), len(word2id)))
+        features.sort_indices()
+        return features, names
+
     def text_cluster(self, docs, features_method='tfidf', method="dbscan",
-                     k=3, max_iter=100, eps=0.5, min_pts=2, tokenizer=list):
+                     k=3, max_iter=100, eps=0.5, min_pts=2, tokenizer=list, engine='numpy', batch_size=None):
         """文本聚类，目前支持 K-Means 和 DBSCAN 两种方法
 
         :param features_method: str
@@ -99,9 +153,19 @@ class TextCluster:
             dbscan 参数，邻域距离
         :param min_pts:
             dbscan 参数，核心对象中的最少样本数量
+        :param engine: str
+            计算引擎，'numpy' 使用稀疏特征和向量化的 SparseKMeans/SparseDBSCAN，'python' 使用纯 Python 实现
+        :param batch_size: int
+            k-means 参数，仅在 engine='numpy' 时生效，不为 None 时使用 mini-batch k-means
         :return: dict
             聚类结果
         """
+        if engine == 'numpy':
+            return self._sparse_text_cluster(docs, features_method, method, k, max_iter, eps, min_pts, tokenizer,
+                                             batch_size)
+        elif engine != 'python':
+            raise ValueError("engine invalid, please use 'numpy' or 'python'")
+
         if features_method == 'tfidf':
             features, names = self.tfidf_features(docs, tokenizer)
         elif features_method == 'count':
@@ -135,6 +199,494 @@ class TextCluster:
 
         return clusters_out
 
+    def _sparse_text_cluster(self, docs, features_method, method, k, max_iter, eps, min_pts, tokenizer, batch_size):
+        features, _ = self.sparse_features(docs, tokenizer, features_method)
+
+        if method == 'k-means':
+            labels = SparseKMeans(k=k, max_iter=max_iter, batch_size=batch_size).fit_predict(features)
+
+        elif method == 'dbscan':
+            labels = SparseDBSCAN(eps=eps, min_pts=min_pts).fit_predict(features)
+
+        else:
+            raise ValueError("method invalid, please use 'k-means' or 'dbscan'")
+
+        # 按文档下标还原每个类簇的文本，噪声点(label为-1)不属于任何类簇
+        clusters_out = {}
+        for doc, label in zip(docs, labels.tolist()):
+            if label < 0:
+                continue
+            clusters_out.setdefault(label, {})[doc] = None
+
+        return {label: list(c_docs) for label, c_docs in clusters_out.items()}
+
+
+def _as_features(X):
+    if sp.issparse(X):
+        return sp.csr_matrix(X, dtype=np.float64)
+    return np.asarray(X, dtype=np.float64)
+
+
+def _squared_norms(X):
+    if sp.issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    return np.einsum('ij,ij->i', X, X)
+
+
+def _dense(X):
+    return X.toarray() if sp.issparse(X) else np.asarray(X)
+
+
+def _squared_distances(X, X_norms, Y, Y_norms):
+    """按 |x|^2 - 2xy + |y|^2 批量计算X每行与Y每行的欧氏距离平方"""
+    distances = X_norms[:, None] - 2 * _dense(X @ Y.T) + Y_norms[None, :]
+    return np.maximum(distances, 0)
+
+
+class SparseKMeans(object):
+    def __init__(self, k, max_iter=100, tol=0.00001, batch_size=None, chunk_size=4096, random_state=None):
+        """向量化的 KMeans，支持 scipy 稀疏矩阵输入，距离按块批量计算
+
+        :param k: int
+            类簇数量，如 k=5
+        :param max_iter: int
+            最大迭代次数，默认值为 max_iter=100
+        :param tol: float
+            簇内距离之和(mini-batch 时为中心的最大移动距离平方)的变化小于 tol 时停止迭代
+        :param batch_size: int
+            不为 None 时使用 mini-batch k-means，每次迭代只用 batch_size 个样本更新中心
+        :param chunk_size: int
+            计算距离矩阵时每块的样本数，用于限制内存
+        :param random_state: int
+            随机种子
+        """
+        self.k = k
+        self.max_iter = max_iter
+        self.tol = tol
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+        self.centroids = None  # np.ndarray, [k, n_features]
+        self.labels = None  # np.ndarray, [n_samples]
+
+    def _assign(self, X, X_norms):
+        """将每个样本分配到最近的中心，返回类簇下标和距离平方"""
+        centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        labels = np.empty(X.shape[0], dtype=np.int64)
+        distances = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], self.chunk_size):
+            end = start + self.chunk_size
+            chunk_distances = _squared_distances(X[start:end], X_norms[start:end], self.centroids, centroid_norms)
+            labels[start:end] = chunk_distances.argmin(axis=1)
+            distances[start:end] = chunk_distances[np.arange(len(chunk_distances)), labels[start:end]]
+        return labels, distances
+
+    def _cluster_sums(self, X, labels):
+        indicator = sp.csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))),
+                                  shape=(self.k, len(labels)))
+        return _dense(indicator @ X), np.bincount(labels, minlength=self.k)
+
+    def _fit_full(self, X, X_norms):
+        current_dist = None
+        for _ in range(self.max_iter + 1):
+            labels, distances = self._assign(X, X_norms)
+            old_dist, current_dist = current_dist, np.sqrt(distances).sum()
+            if old_dist is not None and abs(current_dist - old_dist) < self.tol:
+                break
+
+            sums, counts = self._cluster_sums(X, labels)
+            # 空簇保持原来的中心
+            nonempty = counts > 0
+            self.centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+    def _fit_mini_batch(self, X, X_norms, rng):
+        counts = np.zeros(self.k, dtype=np.float64)
+        for _ in range(self.max_iter):
+            batch = rng.choice(X.shape[0], min(self.batch_size, X.shape[0]), replace=False)
+            labels, _ = self._assign(X[batch], X_norms[batch])
+            sums, batch_counts = self._cluster_sums(X[batch], labels)
+
+            # 每个中心是其见过的所有样本的均值，等价于学习率为 1 / count 的逐样本更新
+            updated = batch_counts > 0
+            new_counts = counts[updated] + batch_counts[updated]
+            old_centroids = self.centroids[updated]
+            self.centroids[updated] = (old_centroids * counts[updated, None] + sums[updated]) / new_counts[:, None]
+            counts[updated] = new_counts
+
+            if np.square(self.centroids[updated] - old_centroids).sum(axis=1).max() < self.tol:
+                break
+
+    def fit_predict(self, X):
+        """输入数据，完成 KMeans 聚类
+
+        :param X: np.ndarray or scipy.sparse matrix
+            输入数据特征，[n_samples, n_features]
+        :return: np.ndarray
+            每个样本的类簇下标
+        """
+        X = _as_features(X)
+        X_norms = _squared_norms(X)
+        rng = np.random.RandomState(self.random_state)
+
+        # 随机选择 k 个 example 作为初始类簇均值向量
+        self.k = min(self.k, X.shape[0])
+        self.centroids = _dense(X[rng.choice(X.shape[0], self.k, replace=False)]).astype(np.float64)
+
+        if self.batch_size is None:
+            self._fit_full(X, X_norms)
+        else:
+            self._fit_mini_batch(X, X_norms, rng)
+
+        self.labels, _ = self._assign(X, X_norms)
+        return self.labels
+
+
+class SparseDBSCAN(object):
+    def __init__(self, eps, min_pts, block_size=256, max_dense_size=2 ** 25):
+        """基于邻居索引的 DBSCAN，支持 scipy 稀疏矩阵输入
+
+        :param eps: float
+            邻域距离
+        :param min_pts: int
+            核心对象中的最少样本数量(包含自身)
+        :param block_size: int
+            构建邻居索引时每块的样本数，用于限制内存
+        :param max_dense_size: int
+            稀疏特征的元素数(n_samples * n_features)不超过该值时转为稠密矩阵计算
+        """
+        self.eps = eps
+        self.min_pts = min_pts
+        self.block_size = block_size
+        self.max_dense_size = max_dense_size
+
+    def neighbor_graph(self, X):
+        """分块计算距离矩阵，构建 eps 邻域的稀疏邻接矩阵(包含自身)
+
+        :param X: np.ndarray or scipy.sparse matrix
+        :return: scipy.sparse.csr_matrix, [n_samples, n_samples]
+        """
+        X = _as_features(X)
+        X_norms = _squared_norms(X)
+        squared_eps = self.eps ** 2
+
+        # 特征维度较小时转为稠密矩阵，使用矩阵乘法计算完整的距离块
+        if sp.issparse(X) and X.shape[0] * X.shape[1] <= self.max_dense_size:
+            X = X.toarray()
+
+        if not sp.issparse(X):
+            # 样本按范数排序，由 ||a| - |b|| <= |a - b| 每块只需与范数相差不超过 eps 的样本计算距离
+            norm_order = np.argsort(X_norms, kind='stable')
+            X, X_norms = X[norm_order], X_norms[norm_order]
+            norms = np.sqrt(X_norms)
+            rows, cols = [], []
+            for start in range(0, X.shape[0], self.block_size):
+                end = min(start + self.block_size, X.shape[0])
+                low = np.searchsorted(norms, norms[start] - self.eps, side='left')
+                high = np.searchsorted(norms, norms[end - 1] + self.eps, side='right')
+                distances = _squared_distances(X[start:end], X_norms[start:end], X[low:high], X_norms[low:high])
+                row_, col_ = np.nonzero(distances <= squared_eps)
+                rows.append(norm_order[row_ + start])
+                cols.append(norm_order[col_ + low])
+        else:
+            # 稀疏特征只计算有公共特征(内积非零)的样本对；内积为零的样本对距离平方为 |a|^2 + |b|^2，按范数排序后二分查找
+            norm_order = np.argsort(X_norms, kind='stable')
+            sorted_norms = X_norms[norm_order]
+            X_T = X.T.tocsr()
+            rows, cols = [], []
+            for start in range(0, X.shape[0], self.block_size):
+                end = min(start + self.block_size, X.shape[0])
+                products = (X[start:end] @ X_T).tocoo()
+                distances = X_norms[products.row + start] + X_norms[products.col] - 2 * products.data
+                keep = distances <= squared_eps
+                rows.append(products.row[keep] + start)
+                cols.append(products.col[keep])
+
+                block_rows = np.arange(start, end)
+                counts = np.searchsorted(sorted_norms, squared_eps - X_norms[block_rows], side='right')
+                rows.append(np.repeat(block_rows, counts))
+                cols.append(norm_order[np.concatenate([np.arange(count_) for count_ in counts.tolist()])]
+                            if counts.sum() else np.zeros(0, dtype=np.int64))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        return sp.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(X.shape[0], X.shape[0]))
+
+    def fit_predict(self, X):
+        """输入数据，完成 DBSCAN 聚类
+
+        :param X: np.ndarray or scipy.sparse matrix
+            输入数据特征，[n_samples, n_features]
+        :return: np.ndarray
+            每个样本的类簇下标，噪声点为 -1
+        """
+        graph = self.neighbor_graph(X)
+        cores = np.flatnonzero(np.diff(graph.indptr) >= self.min_pts)
+
+        # 核心对象之间密度直达的连通分量即为类簇
+        labels = np.full(graph.shape[0], -1, dtype=np.int64)
+        _, core_labels = connected_components(graph[cores][:, cores], directed=False)
+        labels[cores] = core_labels
+
+        # 非核心对象归入其邻域内第一个核心对象所在的类簇
+        core_neighbors = graph[:, cores]
+        borders = np.flatnonzero((labels < 0) & (np.diff(core_neighbors.indptr) > 0))
+        first_cores = core_neighbors.indices[core_neighbors.indptr[borders]]
+        labels[borders] = core_labels[first_cores]
+
+        return labels
+
+
+class StreamingTextCluster(object):
+    def __init__(self, threshold=0.5, tokenizer=list, n_features=2 ** 18, sketch_size=256, max_clusters=10000,
+                 seed=0):
+        """单遍增量文本聚类：每篇新文本与已有类簇中心计算 tfidf 余弦相似度，超过阈值则归入最相似的类簇，否则新建类簇
+
+        词通过哈希映射到固定的 n_features 维，文档频率(IDF)随文本到达持续累计；每个类簇中心只保留权重最高的
+        sketch_size 个词，类簇数超过 max_clusters 时淘汰最久未更新的类簇，内存占用与数据量无关
+
+        词到类簇槽位的倒排索引只对与文本有公共词的类簇计算相似度；idf = A - log(1 + df)，A = log(1 + N) + 1，
+        因此类簇中心的范数平方可以由每个槽位缓存的 sum(w^2)、sum(w^2 * log(1 + df))、sum(w^2 * log(1 + df)^2) 得到，
+        文档频率变化时只更新包含这些词的槽位
+
+        :param threshold: float
+            余弦相似度阈值
+        :param tokenizer: function for tokenize, default is `list`
+        :param n_features: int
+            哈希特征维度
+        :param sketch_size: int
+            每个类簇中心保留的词数
+        :param max_clusters: int
+            同时保留的最大类簇数
+        :param seed: int
+            哈希种子
+        """
+        self.threshold = threshold
+        self.tokenizer = tokenizer
+        self.n_features = n_features
+        self.sketch_size = sketch_size
+        self.max_clusters = max_clusters
+        self.seed = seed
+        self._hash_fn = Mmh3(seed)
+
+        self.num_docs = 0
+        self.doc_freqs = np.zeros(n_features, dtype=np.int64)
+
+        # 类簇按槽位存放，槽位中的词和权重按权重截断，不足 sketch_size 的部分权重为 0
+        self.num_clusters = 0
+        self._terms = np.zeros((max_clusters, sketch_size), dtype=np.int64)
+        self._weights = np.zeros((max_clusters, sketch_size), dtype=np.float64)
+        self._sizes = np.zeros(max_clusters, dtype=np.int64)
+        self._cluster_ids = np.full(max_clusters, -1, dtype=np.int64)
+        self._last_seen = np.zeros(max_clusters, dtype=np.int64)
+        self._next_id = 0
+
+        self._build_index()
+
+    # 由类簇槽位推导出的索引，不包含在 snapshot 中，restore 时重建
+    _index_attrs = ('_postings', '_keys', '_norm_sums')
+
+    def _build_index(self):
+        """重建倒排索引、槽位内的有序检索键以及范数缓存"""
+        # 倒排索引：词 -> 包含该词的类簇槽位
+        self._postings = {}
+        # 槽位 * n_features + 词，补齐部分为槽位内最大的键，整体有序，用于查找 (槽位, 词) 的权重
+        self._keys = np.arange(self.max_clusters, dtype=np.int64)[:, None] * self.n_features + (self.n_features - 1)
+        self._keys = np.repeat(self._keys, self.sketch_size, axis=1)
+        self._norm_sums = np.zeros((self.max_clusters, 3), dtype=np.float64)
+        for slot_ in range(self.num_clusters):
+            self._index_slot(slot_)
+
+    def _index_slot(self, slot):
+        kept = self._weights[slot] > 0
+        terms, weights = self._terms[slot][kept], self._weights[slot][kept]
+
+        for term_ in terms.tolist():
+            self._postings.setdefault(term_, set()).add(slot)
+
+        self._keys[slot] = slot * self.n_features + self.n_features - 1
+        self._keys[slot, :len(terms)] = slot * self.n_features + terms
+
+        log_df = np.log1p(self.doc_freqs[terms])
+        squared = weights ** 2
+        self._norm_sums[slot] = squared.sum(), (squared * log_df).sum(), (squared * log_df ** 2).sum()
+
+    def _unindex_slot(self, slot):
+        for term_ in self._terms[slot][self._weights[slot] > 0].tolist():
+            postings_ = self._postings[term_]
+            postings_.discard(slot)
+            if not postings_:
+                del self._postings[term_]
+
+    def _vectorize(self, doc):
+        """文本的哈希词频向量，返回升序的词下标和归一化的词频"""
+        counter = Counter(self.tokenizer(doc))
+        if not counter:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        hashed = np.asarray([self._hash_fn(word_) % self.n_features for word_ in counter], dtype=np.int64)
+        terms, inverse = np.unique(hashed, return_inverse=True)
+        tf = np.bincount(inverse, weights=np.asarray(list(counter.values()), dtype=np.float64))
+        return terms, tf / tf.sum()
+
+    def _idf(self, terms):
+        return np.log((1 + self.num_docs) / (1 + self.doc_freqs[terms])) + 1
+
+    def _matches(self, terms):
+        """通过倒排索引找出包含文本中的词的 (槽位, 文本中词的下标, 该词在类簇中心的权重)"""
+        postings = [self._postings.get(term_, ()) for term_ in terms.tolist()]
+        counts = [len(postings_) for postings_ in postings]
+        slots = np.fromiter(itertools.chain.from_iterable(postings), dtype=np.int64, count=sum(counts))
+        term_index = np.repeat(np.arange(len(terms)), counts)
+
+        positions = np.searchsorted(self._keys.ravel(), slots * self.n_features + terms[term_index])
+        return slots, term_index, self._weights.ravel()[positions]
+
+    def _similarities(self, terms, tf, matches=None):
+        """文本与所有类簇中心的 tfidf 余弦相似度，使用当前的 IDF，没有公共词的类簇相似度为 0"""
+        slots, term_index, weights = self._matches(terms) if matches is None else matches
+
+        idf = self._idf(terms)
+        query = tf * idf
+        query_norm = np.linalg.norm(query)
+        dots = np.bincount(slots, weights=weights * (query * idf)[term_index], minlength=self.num_clusters)
+
+        a = np.log(1 + self.num_docs) + 1
+        sum_w, sum_wb, sum_wbb = self._norm_sums[:self.num_clusters].T
+        cluster_norms = np.sqrt(np.maximum(a * a * sum_w - 2 * a * sum_wb + sum_wbb, 0))
+        return dots / np.maximum(query_norm * cluster_norms, 1e-12)
+
+    def _nearest(self, terms, tf, matches=None):
+        if self.num_clusters == 0 or len(terms) == 0:
+            return -1
+        similarities = self._similarities(terms, tf, matches)
+        slot = int(similarities.argmax())
+        return slot if similarities[slot] >= self.threshold else -1
+
+    def _new_slot(self):
+        if self.num_clusters < self.max_clusters:
+            slot = self.num_clusters
+            self.num_clusters += 1
+        else:
+            # 淘汰最久未更新的类簇
+            slot = int(self._last_seen.argmin())
+            self._unindex_slot(slot)
+
+        self._terms[slot] = 0
+        self._weights[slot] = 0
+        self._norm_sums[slot] = 0
+        self._sizes[slot] = 0
+        self._cluster_ids[slot] = self._next_id
+        self._next_id += 1
+        return slot
+
+    def _update_centroid(self, slot, terms, tf):
+        """将文本词频累加到类簇中心，只保留权重最高的 sketch_size 个词"""
+        kept = self._weights[slot] > 0
+        merged_terms, inverse = np.unique(np.concatenate((self._terms[slot][kept], terms)), return_inverse=True)
+        merged_weights = np.bincount(inverse, weights=np.concatenate((self._weights[slot][kept], tf)))
+
+        if len(merged_terms) > self.sketch_size:
+            top = np.argpartition(-merged_weights, self.sketch_size - 1)[:self.sketch_size]
+            top.sort()
+            merged_terms, merged_weights = merged_terms[top], merged_weights[top]
+
+        self._unindex_slot(slot)
+        self._terms[slot] = 0
+        self._weights[slot] = 0
+        self._terms[slot, :len(merged_terms)] = merged_terms
+        self._weights[slot, :len(merged_terms)] = merged_weights
+        self._index_slot(slot)
+
+    def _update_doc_freqs(self, terms, matches):
+        """文档频率加一，同时更新包含这些词的槽位的范数缓存"""
+        slots, term_index, weights = matches
+        old_log_df = np.log1p(self.doc_freqs[terms])
+        self.doc_freqs[terms] += 1
+        new_log_df = np.log1p(self.doc_freqs[terms])
+
+        squared = weights ** 2
+        np.add.at(self._norm_sums[:, 1], slots, squared * (new_log_df - old_log_df)[term_index])
+        np.add.at(self._norm_sums[:, 2], slots, squared * (new_log_df ** 2 - old_log_df ** 2)[term_index])
+
+    def partial_fit(self, docs):
+        """逐篇处理新到达的文本并更新类簇
+
+        :param docs: list of str
+        :return: list of int
+            每篇文本所属的类簇 id，空文本为 -1
+        """
+        labels = []
+        for doc in docs:
+            terms, tf = self._vectorize(doc)
+            if len(terms) == 0:
+                labels.append(-1)
+                continue
+
+            matches = self._matches(terms)
+            self.num_docs += 1
+            self._update_doc_freqs(terms, matches)
+
+            slot = self._nearest(terms, tf, matches)
+            if slot < 0:
+                slot = self._new_slot()
+
+            self._update_centroid(slot, terms, tf)
+            self._sizes[slot] += 1
+            self._last_seen[slot] = self.num_docs
+            labels.append(int(self._cluster_ids[slot]))
+
+        return labels
+
+    def predict(self, docs):
+        """预测文本所属的类簇，不更新类簇和 IDF
+
+        :param docs: list of str
+        :return: list of int
+            每篇文本最相似的类簇 id，相似度低于阈值时为 -1
+        """
+        labels = []
+        for doc in docs:
+            slot = self._nearest(*self._vectorize(doc))
+            labels.append(int(self._cluster_ids[slot]) if slot >= 0 else -1)
+        return labels
+
+    def cluster_sizes(self):
+        """当前保留的类簇 id 及其文本数
+
+        :return: dict
+        """
+        return dict(zip(self._cluster_ids[:self.num_clusters].tolist(), self._sizes[:self.num_clusters].tolist()))
+
+    def snapshot(self):
+        """导出当前状态，可直接 pickle 保存，tokenizer 不包含在内
+
+        :return: dict
+        """
+        state = {
+            key: value.copy() if isinstance(value, np.ndarray) else value
+            for key, value in self.__dict__.items()
+            if key not in ('tokenizer', '_hash_fn') + self._index_attrs
+        }
+        return state
+
+    @classmethod
+    def restore(cls, state, tokenizer=list):
+        """从 snapshot 恢复
+
+        :param state: dict
+            snapshot 导出的状态
+        :param tokenizer: function for tokenize, default is `list`
+        :return: StreamingTextCluster
+        """
+        cluster = cls.__new__(cls)
+        cluster.__dict__.update({
+            key: value.copy() if isinstance(value, np.ndarray) else value for key, value in state.items()
+        })
+        cluster.tokenizer = tokenizer
+        cluster._hash_fn = Mmh3(cluster.seed)
+        cluster._build_index()
+        return cluster
+
 
 class KMeans(object):
     def __init__(self, k, max_iter=100):
@@ -6,9 +6,121 @@
 # @Description:
 
 import sys
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
 from collections import defaultdict
 
 
+def pagerank(matrix, d=0.85, max_iter=100, tol=1e-6, groups=None):
+    """
+    稀疏矩阵幂迭代求解TextRank：ws = (1 - d) + d * M (ws / out_sum)，相邻两次迭代的最大变化小于tol时停止
+
+    Args:
+        matrix (:obj:`scipy.sparse.csr_matrix`): 对称的边权重矩阵
+        d (:obj:`float`, optional, defaults to 0.85): 阻尼系数
+        max_iter (:obj:`int`, optional, defaults to 100): 最大迭代次数
+        tol (:obj:`float`, optional, defaults to 1e-6): 收敛阈值
+        groups (:obj:`np.ndarray`, optional, defaults to None):
+            每个节点所属的图(升序)，多个图拼接为分块对角矩阵时使用，每个图按自身节点数初始化
+    """  # noqa: ignore flake8"
+
+    node_num = matrix.shape[0]
+    out_sum = np.asarray(matrix.sum(axis=1)).ravel()
+    out_sum[out_sum == 0] = 1
+
+    if groups is None:
+        ws = np.full(node_num, 1.0 / (node_num or 1.0))
+    else:
+        ws = 1.0 / np.bincount(groups)[groups]
+
+    for _ in range(max_iter):
+        new_ws = (1 - d) + d * (matrix @ (ws / out_sum))
+        converged = np.abs(new_ws - ws).max(initial=0) < tol
+        ws = new_ws
+        if converged:
+            break
+    return ws
+
+
+def _normalize(ws, groups, group_num):
+    """与TextRank.rank一致的归一化：(w - min / 10) / (max - min / 10)，按图分别计算"""
+    min_rank = np.full(group_num, sys.float_info[0])
+    max_rank = np.full(group_num, float(sys.float_info[3]))
+    np.minimum.at(min_rank, groups, ws)
+    np.maximum.at(max_rank, groups, ws)
+    return (ws - min_rank[groups] / 10.0) / (max_rank[groups] - min_rank[groups] / 10.0)
+
+
+def _keywords_batch(docs, tokenizer, window, topk, stopwords, min_word_len, with_weight, d, max_iter, tol):
+    """对一批文档一次性构建共现图并求解，所有文档的图拼接为一个分块对角的稀疏矩阵"""
+    doc_words, word_docs, sequence, sequence_docs = [], [], [], []
+    for doc_index_, doc_ in enumerate(docs):
+        local_ = {}
+        for word_ in tokenizer(doc_):
+            word_ = word_.strip()
+            if len(word_) < min_word_len or word_ in stopwords:
+                # 过滤掉的词仍占据窗口中的位置
+                sequence.append(-1)
+            else:
+                if word_ not in local_:
+                    local_[word_] = len(doc_words) + len(local_)
+                sequence.append(local_[word_])
+            sequence_docs.append(doc_index_)
+        doc_words.extend(local_)
+        word_docs.extend([doc_index_] * len(local_))
+
+    sequence = np.asarray(sequence, dtype=np.int64)
+    sequence_docs = np.asarray(sequence_docs, dtype=np.int64)
+    word_docs = np.asarray(word_docs, dtype=np.int64)
+
+    # 同一文档内距离小于window的词对构成无向边，边权为共现次数
+    rows, cols = [], []
+    for offset_ in range(1, window):
+        left_, right_ = sequence[:-offset_], sequence[offset_:]
+        keep_ = (left_ >= 0) & (right_ >= 0) & (sequence_docs[:-offset_] == sequence_docs[offset_:])
+        rows.extend((left_[keep_], right_[keep_]))
+        cols.extend((right_[keep_], left_[keep_]))
+
+    results = [[] for _ in docs]
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    if len(rows) == 0:
+        return results
+
+    # 只保留有边的词作为图节点
+    nodes, inverse = np.unique(np.concatenate((rows, cols)), return_inverse=True)
+    rows, cols = inverse[:len(rows)], inverse[len(rows):]
+    matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(nodes), len(nodes)))
+    groups = word_docs[nodes]
+
+    ws = pagerank(matrix, d=d, max_iter=max_iter, tol=tol, groups=groups)
+    ws = _normalize(ws, groups, len(docs))
+
+    order = np.lexsort((-ws, groups))
+    group_starts = np.searchsorted(groups[order], np.arange(len(docs)))
+    group_ends = np.searchsorted(groups[order], np.arange(len(docs)), side='right')
+    for doc_index_ in range(len(docs)):
+        top_ = order[group_starts[doc_index_]:min(group_ends[doc_index_], group_starts[doc_index_] + topk)]
+        for node_ in top_.tolist():
+            word_ = doc_words[nodes[node_]]
+            results[doc_index_].append((word_, float(ws[node_])) if with_weight else word_)
+    return results
+
+
+# keywords在子进程中使用的参数，fork时由子进程直接继承，不需要序列化
+_SHARED_KEYWORDS_ARGS = None
+
+
+def _init_shared_keywords_args(args):
+    global _SHARED_KEYWORDS_ARGS
+    _SHARED_KEYWORDS_ARGS = args
+
+
+def _keywords_shared(docs):
+    return _keywords_batch(docs, **_SHARED_KEYWORDS_ARGS)
+
+
 class TextRank:
     d = 0.85
 
@@ -19,7 +131,22 @@ class TextRank:
         self.graph[start].append((start, end, weight))
         self.graph[end].append((end, start, weight))
 
-    def rank(self):
+    def rank(self, backend='python', max_iter=100, tol=1e-6):
+        """
+        计算图中每个节点的TextRank值
+
+        Args:
+            backend (:obj:`string`, optional, defaults to 'python'):
+                'python'为10轮Gauss-Seidel迭代，'sparse'为稀疏矩阵幂迭代，收敛或达到max_iter时停止
+            max_iter (:obj:`int`, optional, defaults to 100): 最大迭代次数，仅backend为'sparse'时生效
+            tol (:obj:`float`, optional, defaults to 1e-6): 收敛阈值，仅backend为'sparse'时生效
+        """  # noqa: ignore flake8"
+
+        if backend == 'sparse':
+            return self._rank_sparse(max_iter, tol)
+        elif backend != 'python':
+            raise ValueError("backend invalid, please use 'python' or 'sparse'")
+
         ws = defaultdict(float)
         out_sum = defaultdict(float)
 
@@ -47,3 +174,73 @@ class TextRank:
             ws[n] = (w - min_rank / 10.0) / (max_rank - min_rank / 10.0)
 
         return ws
+
+    def _rank_sparse(self, max_iter, tol):
+        nodes = sorted(self.graph.keys())
+        node2id = {node_: index_ for index_, node_ in enumerate(nodes)}
+
+        rows, cols, weights = [], [], []
+        for node_, out_ in self.graph.items():
+            for _, end_, weight_ in out_:
+                rows.append(node2id[node_])
+                cols.append(node2id[end_])
+                weights.append(weight_)
+        matrix = sp.csr_matrix((np.asarray(weights, dtype=np.float64), (rows, cols)), shape=(len(nodes), len(nodes)))
+
+        ws = pagerank(matrix, d=self.d, max_iter=max_iter, tol=tol)
+        ws = _normalize(ws, np.zeros(len(nodes), dtype=np.int64), 1)
+
+        result = defaultdict(float)
+        result.update(zip(nodes, ws.tolist()))
+        return result
+
+    def keywords(self, docs, window=5, topk=20, tokenizer=None, stopwords=None, min_word_len=2, with_weight=False,
+                 max_iter=100, tol=1e-6, batch_size=1000, n_jobs=1):
+        """
+        批量抽取关键词：每批文档的共现图拼接为一个分块对角的稀疏矩阵，一次幂迭代求解整批文档
+
+        Args:
+            docs (:obj:`list`): 文档列表
+            window (:obj:`int`, optional, defaults to 5): 共现窗口大小
+            topk (:obj:`int`, optional, defaults to 20): 每篇文档返回的关键词数
+            tokenizer (:obj:`callable`, optional, defaults to None): 分词函数，为None时使用jieba.lcut
+            stopwords (:obj:`set`, optional, defaults to None): 停用词
+            min_word_len (:obj:`int`, optional, defaults to 2): 关键词的最短长度
+            with_weight (:obj:`bool`, optional, defaults to False): 是否同时返回权重
+            max_iter (:obj:`int`, optional, defaults to 100): 最大迭代次数
+            tol (:obj:`float`, optional, defaults to 1e-6): 收敛阈值
+            batch_size (:obj:`int`, optional, defaults to 1000): 每批文档数，也是分发给子进程的文档数
+            n_jobs (:obj:`int`, optional, defaults to 1): 进程数，大于1时使用进程池，支持fork的系统上子进程直接共享分词器
+        """  # noqa: ignore flake8"
+
+        if tokenizer is None:
+            import jieba
+            tokenizer = jieba.lcut
+
+        args = {
+            'tokenizer': tokenizer,
+            'window': window,
+            'topk': topk,
+            'stopwords': stopwords or set(),
+            'min_word_len': min_word_len,
+            'with_weight': with_weight,
+            'd': self.d,
+            'max_iter': max_iter,
+            'tol': tol
+        }
+        batches = [docs[index_:index_ + batch_size] for index_ in range(0, len(docs), batch_size)]
+
+        if n_jobs <= 1:
+            results = [_keywords_batch(batch_, **args) for batch_ in batches]
+        elif 'fork' in multiprocessing.get_all_start_methods():
+            _init_shared_keywords_args(args)
+            try:
+                with multiprocessing.get_context('fork').Pool(n_jobs) as pool:
+                    results = pool.map(_keywords_shared, batches, chunksize=1)
+            finally:
+                _init_shared_keywords_args(None)
+        else:
+            with multiprocessing.Pool(n_jobs, initializer=_init_shared_keywords_args, initargs=(args,)) as pool:
+                results = pool.map(_keywords_shared, batches, chunksize=1)
+
+        return [keywords_ for batch_ in results for keywords_ in batch_]
@@ -5,6 +5,7 @@
 # @github  : https://github.com/Lizhen0628
 # @Description:
 
+import numpy as np
 from typing import Set, List, Dict
 
 
@@ -224,6 +225,189 @@ class UnionFind(object):
         return mapping
 
 
+class ArrayUnionFind(object):
+    """基于NumPy数组的并查集，元素为 0 ~ n-1 的整数id
+
+    与UnionFind相比不维护元素到下标的字典，支持批量合并：
+    1. union_many: 对一批边同时做路径减半的查找(边数较多时整体压平)，并将较大的根挂到较小的根上，直到所有边的两端连通。
+    2. labels: 指针跳跃将所有节点直接指向根，一次得到每个元素的连通分量编号。
+    3. groups: 按连通分量编号argsort得到每个连通分量的元素。
+
+    合并时总是把较大的根挂到较小的根上，因此每个连通分量的根为其中最小的id。
+
+    Parameters
+    ----------
+    n : int, optional, default: 0
+        The initial number of elements.
+
+    Attributes
+    ----------
+    num_components : int
+        Number of distjoint sets or components.
+
+    Examples::
+
+        >>> uf = ArrayUnionFind(10)
+        >>> uf.union_many(np.array([4, 3, 6]), np.array([3, 8, 5]))
+        >>> uf.labels()
+        >>> uf.groups()
+    """
+
+    def __init__(self, n: int = 0):
+        self._parent = np.arange(n, dtype=np.int64)
+        self.num_components = n
+
+    def __repr__(self):
+        return '<ArrayUnionFind: num_elements={}, num_components={}>'.format(len(self), self.num_components)
+
+    def __len__(self):
+        return len(self._parent)
+
+    def __contains__(self, x):
+        return 0 <= x < len(self._parent)
+
+    def _ensure_size(self, n: int) -> None:
+        if n > len(self._parent):
+            self.num_components += n - len(self._parent)
+            self._parent = np.concatenate((self._parent, np.arange(len(self._parent), n, dtype=np.int64)))
+
+    def find_many(self, elems) -> np.ndarray:
+        """Find the roots of the given elements with vectorized path halving.
+        Args:
+            elems: array of element ids
+        Returns:
+            The roots of the given elements.
+        """
+        parent = self._parent
+        roots = np.array(elems, dtype=np.int64)
+        active = np.flatnonzero(parent[roots] != roots)
+        while len(active):
+            nodes = roots[active]
+            grandparents = parent[parent[nodes]]
+            # path halving: 每个节点指向祖父节点
+            parent[nodes] = grandparents
+            roots[active] = grandparents
+            active = active[parent[grandparents] != grandparents]
+        return roots
+
+    def find(self, elem) -> int:
+        """Find the root of the disjoint set containing the given element.
+        Args:
+            elem:
+        Returns:
+            The root.
+
+        Raise ValueError:
+            If the given element is not found.
+        """
+        if elem not in self:
+            raise ValueError('{} is not an element'.format(elem))
+        return int(self.find_many([elem])[0])
+
+    def connected(self, x, y) -> bool:
+        """
+        Return whether the two given elements belong to the same component.
+        Args:
+            x:
+            y:
+        Returns:
+            True if x and y are connected, false otherwise.
+        """
+        return self.find(x) == self.find(y)
+
+    def union(self, x, y) -> None:
+        """
+        Merge the components of the two given elements into one.
+        Args:
+            x:
+            y:
+        Returns:
+        """
+        self.union_many([x], [y])
+
+    def union_many(self, src, dst) -> None:
+        """
+        Merge the components of every (src[i], dst[i]) pair, ids beyond the current size are added automatically.
+        Args:
+            src: array of element ids
+            dst: array of element ids
+        Returns:
+        """
+        src = np.asarray(src, dtype=np.int64).ravel()
+        dst = np.asarray(dst, dtype=np.int64).ravel()
+        if len(src) != len(dst):
+            raise ValueError('src and dst should have the same length')
+        if len(src) == 0:
+            return
+        if min(src.min(), dst.min()) < 0:
+            raise ValueError('element ids should be non-negative')
+        self._ensure_size(int(max(src.max(), dst.max())) + 1)
+
+        while len(src):
+            if 2 * len(src) >= len(self._parent):
+                # 边数与元素数同量级时，整体指针跳跃压平所有树比逐条路径减半更快
+                roots = self.roots()
+                src_roots, dst_roots = roots[src], roots[dst]
+            else:
+                src_roots, dst_roots = self.find_many(src), self.find_many(dst)
+            unmerged = src_roots != dst_roots
+            if not unmerged.any():
+                break
+            src, dst = src[unmerged], dst[unmerged]
+            high = np.maximum(src_roots[unmerged], dst_roots[unmerged])
+            low = np.minimum(src_roots[unmerged], dst_roots[unmerged])
+            # 同一个根可能同时出现在多条边中，取其中最小的邻居根，星形图也能在一轮内合并
+            np.minimum.at(self._parent, high, low)
+
+        self.num_components = int(np.count_nonzero(self._parent == np.arange(len(self._parent))))
+
+    def roots(self) -> np.ndarray:
+        """
+        Return the root of every element, all trees are flattened by pointer jumping.
+        Returns:
+            An array with the semantics: `elt -> root of elt`.
+        """
+        parent = self._parent
+        while True:
+            grandparents = parent[parent]
+            if np.array_equal(grandparents, parent):
+                break
+            parent = grandparents
+        self._parent = parent
+        return parent.copy()
+
+    def labels(self) -> np.ndarray:
+        """
+        Return the component label of every element, labels are 0 ~ num_components-1 ordered by the smallest element.
+        Returns:
+            An array with the semantics: `elt -> label of the component containing elt`.
+        """
+        roots = self.roots()
+        is_root = roots == np.arange(len(roots))
+        root_labels = np.cumsum(is_root) - 1
+        return root_labels[roots]
+
+    def groups(self) -> List[np.ndarray]:
+        """
+        Return the list of connected components.
+        Returns:
+            A list of arrays, each array holds the sorted element ids of a component.
+        """
+        if len(self) == 0:
+            return []
+        labels = self.labels()
+        order = np.argsort(labels, kind='stable')
+        bounds = np.cumsum(np.bincount(labels, minlength=self.num_components))[:-1]
+        return np.split(order, bounds)
+
+    def components(self) -> List[Set]:
+        """
+        Return the list of connected components.
+        Returns:A list of sets.
+        """
+        return [set(group_.tolist()) for group_ in self.groups()]
+
+
 if __name__ == '__main__':
     uf = UnionFind(list('abcdefghij'))
     uf.union('e', 'd')